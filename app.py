@@ -1,48 +1,1346 @@
 import os
-from flask import Flask, render_template, request, send_file, jsonify, url_for, make_response
-import pandas as pd
+from flask import Flask, render_template, request, send_file, jsonify, url_for, Response, stream_with_context
 from werkzeug.utils import secure_filename
+from werkzeug.http import parse_content_range_header
 import zipfile
-from docx import Document
 import tempfile
-from docx2pdf import convert
 import shutil
 import time
 import io
 import uuid
-from datetime import datetime, timedelta
 import platform
+import re
+import json
+import csv
+import codecs
+import importlib.util
+import struct
+import zlib
+from xml.sax.saxutils import escape as xml_escape
+import hashlib
+import base64
+from xml.etree import ElementTree
+import threading
+import functools
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from itertools import chain, islice
+import sqlite3
+import queue
+import subprocess
+import multiprocessing
+import contextvars
+import cProfile
+import logging
+import tracemalloc
+
+class LazyModule:
+    """Stand-in for a module that is only imported on first use. The first
+    attribute lookup imports it and puts the real module in its place among
+    this module's globals, so later lookups cost nothing extra."""
+
+    def __init__(self, name, alias=None):
+        self._name = name
+        self._alias = alias or name
+
+    def __getattr__(self, attr):
+        module = importlib.import_module(self._name)
+        globals()[self._alias] = module
+        return getattr(module, attr)
+
+# The data and document libraries take most of the start-up time, and pages
+# that only render a template need none of them
+np = LazyModule('numpy', 'np')
+pd = LazyModule('pandas', 'pd')
+openpyxl = LazyModule('openpyxl')
+docx = LazyModule('docx')
+
+HAS_PYARROW = importlib.util.find_spec('pyarrow') is not None  # optional, enables the Parquet cache format
+pyarrow = LazyModule('pyarrow')
+pa_csv = LazyModule('pyarrow.csv', 'pa_csv')  # and multi-threaded CSV parsing
+pa_parquet = LazyModule('pyarrow.parquet', 'pa_parquet')  # and reading cached sheets a row group at a time
+
+HAS_XLSXWRITER = importlib.util.find_spec('xlsxwriter') is not None  # optional, constant-memory .xlsx writing
+xlsxwriter = LazyModule('xlsxwriter')
 
 app = Flask(__name__)
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['GENERATED_FILES'] = 'generated_files'  # New folder for generated files
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+app.config['CACHE_FOLDER'] = 'cache'  # Parsed workbooks, keyed by content hash
+app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max request size; larger files go through /uploads
+app.config['UPLOAD_MAX_SIZE'] = int(os.environ.get('UPLOAD_MAX_SIZE', 1024 * 1024 * 1024))  # 1GB max chunked upload
+app.config['UPLOAD_CHUNK_SIZE'] = 8 * 1024 * 1024  # Bytes per chunk of a chunked upload, under MAX_CONTENT_LENGTH
+app.config['WORKBOOK_CACHE_ENTRIES'] = 16  # Parsed sheets kept in memory
+app.config['WORKBOOK_CACHE_MEMORY'] = 512 * 1024 * 1024  # 512MB of DataFrames in memory
+app.config['WORKBOOK_CACHE_DISK'] = 2 * 1024 * 1024 * 1024  # 2GB of cached sheets on disk
+app.config['WORKBOOK_CACHE_ROW_GROUP'] = 10000  # Rows per Parquet row group, the unit /preview reads from disk
+app.config['COLUMN_VALUES_LIMIT'] = 1000  # Most frequent values returned by /column-values
+app.config['PREVIEW_PAGE_ROWS'] = 50  # Rows per /preview page when the client does not ask for a size
+app.config['PREVIEW_MAX_ROWS'] = 1000  # Most rows one /preview page may hold
+app.config['PREVIEW_SAMPLES'] = 5  # Sample values per column in /preview/stats
+app.config['MERGE_WORKERS'] = os.cpu_count() or 1  # Processes rendering mail merge documents
+app.config['MERGE_CHUNK_SIZE'] = 25  # Rows handed to a merge worker at a time
+app.config['MERGE_COMPILED_TEMPLATE'] = True  # Render rows by XML patching instead of python-docx
+app.config['MERGE_CACHE_FOLDER'] = 'merge_cache'  # Rendered mail merge documents, keyed by content hash
+app.config['MERGE_CACHE_DISK'] = 2 * 1024 * 1024 * 1024  # 2GB of rendered documents; 0 renders every row each run
+app.config['PDF_CONVERTERS'] = 2  # Long-lived LibreOffice instances for PDF export
+app.config['PDF_CONVERT_QUEUE'] = 8  # Conversion batches waiting for a free instance
+app.config['PDF_CONVERT_TIMEOUT'] = 60  # Seconds per document before an instance is restarted
+app.config['JOBS_DATABASE'] = os.path.join(app.config['GENERATED_FILES'], 'jobs.sqlite3')
+app.config['JOB_WORKERS'] = 2  # Background jobs running at the same time
+app.config['JOB_QUEUE_LIMIT'] = 20  # Running plus waiting jobs before new ones are refused
+app.config['HEAVY_REQUEST_SLOTS'] = int(os.environ.get('HEAVY_REQUEST_SLOTS', 2))  # Heavy requests run at once per process
+app.config['HEAVY_REQUEST_WAIT'] = int(os.environ.get('HEAVY_REQUEST_WAIT', 30))  # Seconds a heavy request waits for a slot
+app.config['RESULT_TTL'] = 60 * 60  # Seconds a generated file, cached merge document or manifest is kept
+app.config['CLEANUP_INTERVAL'] = 5 * 60  # Seconds between cleanup runs
+app.config['SPLIT_WORKERS'] = 4  # Threads writing split parts
+app.config['COMPARE_MEMORY_BUDGET'] = 1024 * 1024 * 1024  # Above this, compare spills partitions to disk
+app.config['JOIN_MEMORY_BUDGET'] = 1024 * 1024 * 1024  # Above this, join spills partitions to disk
+app.config['CELL_MEMORY_ESTIMATE'] = 64  # Bytes per parsed cell, to size inputs against those budgets unread
+app.config['SQL_BATCH_SIZE'] = 500  # Rows per multi-row SQL statement
+app.config['FILTER_CHUNK_ROWS'] = 10000  # Rows read and tested at a time by the filter
+app.config['OUTPUT_STREAM_ROWS'] = 50000  # Above this many rows, .xlsx outputs use the streaming writer
+app.config['ARCHIVE_COMPRESSLEVEL'] = 6  # Deflate level for ZIP downloads, 0 stores everything
+app.config['ARCHIVE_STORED_EXTENSIONS'] = ('.pdf', '.docx', '.xlsx', '.zip')  # Already compressed
+app.config['METRICS_ENABLED'] = os.environ.get('METRICS_ENABLED') == '1'  # Per-stage timings at /metrics
+app.config['METRICS_TRACE_MEMORY'] = os.environ.get('METRICS_TRACE_MEMORY') == '1'  # Peak allocations per stage (slow)
+app.config['SERVER_TIMING'] = os.environ.get('SERVER_TIMING') == '1'  # Server-Timing header with the request's stages
+app.config['PROFILE_REQUESTS'] = os.environ.get('PROFILE_REQUESTS') == '1'  # Allow profile=1 to save a cProfile capture
 
 # Ensure directories exist
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 os.makedirs(app.config['GENERATED_FILES'], exist_ok=True)
+os.makedirs(app.config['CACHE_FOLDER'], exist_ok=True)
+
+logger = logging.getLogger('excel_tools')
+
+# Upper bounds of the stage duration histogram, in seconds
+_STAGE_BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300)
+
+class ProcessLocal:
+    """An object made by factory() on first use in each process. gunicorn
+    imports the app in its master and forks the workers from it (see
+    gunicorn.conf.py); a lock, executor or thread made at import would be
+    copied into every worker in whatever state it was in, or, for threads,
+    not at all, so each process makes its own when it needs it."""
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._objects = {}  # pid -> object
+        self._locks = {}  # pid -> lock guarding the factory call
+
+    def get(self):
+        pid = os.getpid()
+        if pid not in self._objects:
+            # setdefault is atomic, so racing threads agree on one lock
+            with self._locks.setdefault(pid, threading.Lock()):
+                if pid not in self._objects:
+                    self._objects[pid] = self._factory()
+        return self._objects[pid]
+
+class StageMetrics:
+    """Per-stage timings and allocations of this process, in the Prometheus
+    text format. Each worker process keeps its own counts."""
+
+    def __init__(self):
+        self._stages = {}  # stage -> [count, seconds, allocated bytes, bucket counts]
+        self._requests = {}  # (endpoint, status) -> [count, seconds]
+        self._lock = ProcessLocal(threading.Lock)
+
+    def observe(self, stage, seconds, allocated=0):
+        with self._lock.get():
+            totals = self._stages.setdefault(stage, [0, 0.0, 0, [0] * len(_STAGE_BUCKETS)])
+            totals[0] += 1
+            totals[1] += seconds
+            totals[2] += allocated
+            for i, bound in enumerate(_STAGE_BUCKETS):
+                if seconds <= bound:
+                    totals[3][i] += 1
+
+    def observe_request(self, endpoint, status, seconds):
+        with self._lock.get():
+            totals = self._requests.setdefault((endpoint, status), [0, 0.0])
+            totals[0] += 1
+            totals[1] += seconds
+
+    def render(self):
+        lines = ['# HELP excel_tools_stage_seconds Time spent in each processing stage',
+                 '# TYPE excel_tools_stage_seconds histogram']
+        with self._lock.get():
+            stages = {name: (count, seconds, allocated, buckets[:])
+                      for name, (count, seconds, allocated, buckets) in self._stages.items()}
+            requests = dict(self._requests)
+        for name, (count, seconds, _, buckets) in sorted(stages.items()):
+            for bound, hits in zip(_STAGE_BUCKETS, buckets):
+                lines.append(f'excel_tools_stage_seconds_bucket{{stage="{name}",le="{bound}"}} {hits}')
+            lines.append(f'excel_tools_stage_seconds_bucket{{stage="{name}",le="+Inf"}} {count}')
+            lines.append(f'excel_tools_stage_seconds_sum{{stage="{name}"}} {seconds:.6f}')
+            lines.append(f'excel_tools_stage_seconds_count{{stage="{name}"}} {count}')
+        lines += ['# HELP excel_tools_stage_allocated_bytes_total Peak memory allocated in each stage',
+                  '# TYPE excel_tools_stage_allocated_bytes_total counter']
+        lines += [f'excel_tools_stage_allocated_bytes_total{{stage="{name}"}} {allocated}'
+                  for name, (_, _, allocated, _) in sorted(stages.items())]
+        lines += ['# HELP excel_tools_request_seconds Time spent handling requests',
+                  '# TYPE excel_tools_request_seconds summary']
+        for (endpoint, status), (count, seconds) in sorted(requests.items()):
+            labels = f'endpoint="{endpoint}",status="{status}"'
+            lines.append(f'excel_tools_request_seconds_sum{{{labels}}} {seconds:.6f}')
+            lines.append(f'excel_tools_request_seconds_count{{{labels}}} {count}')
+        return '\n'.join(lines) + '\n'
+
+stage_metrics = StageMetrics()
+# Stages recorded during the current request or job, if anything is collecting them
+_collected_stages = contextvars.ContextVar('collected_stages', default=None)
+# ID of the background job running in this thread, if any
+_current_job = contextvars.ContextVar('current_job', default=None)
+_memory_frames = threading.local()
+
+if app.config['METRICS_TRACE_MEMORY']:
+    tracemalloc.start()
+
+def record_stage(name, seconds, allocated=0):
+    stage_metrics.observe(name, seconds, allocated)
+    collected = _collected_stages.get()
+    if collected is not None:
+        collected.append((name, seconds, allocated))
+
+@contextmanager
+def collect_stages():
+    """Collect the stages run inside the block into the yielded list"""
+    collected = []
+    token = _collected_stages.set(collected)
+    try:
+        yield collected
+    finally:
+        _collected_stages.reset(token)
+
+@contextmanager
+def stage(name):
+    """Time a processing stage (and its peak allocations when memory tracing
+    is on) when METRICS_ENABLED is set"""
+    if not app.config['METRICS_ENABLED']:
+        yield
+        return
+
+    frames = None
+    if tracemalloc.is_tracing():
+        # Nested stages reset the peak, so each frame keeps the highest peak
+        # seen by its children. Approximate when threads overlap.
+        frames = _memory_frames.__dict__.setdefault('frames', [])
+        current, peak = tracemalloc.get_traced_memory()
+        if frames:
+            frames[-1][1] = max(frames[-1][1], peak)
+        tracemalloc.reset_peak()
+        frames.append([current, 0])
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        allocated = 0
+        if frames:
+            start_memory, child_peak = frames.pop()
+            _, peak = tracemalloc.get_traced_memory()
+            peak = max(peak, child_peak)
+            if frames:
+                frames[-1][1] = max(frames[-1][1], peak)
+            allocated = max(peak - start_memory, 0)
+        record_stage(name, seconds, allocated)
 
-# Store generated files with their IDs and creation time
-generated_files = {}
+def stage_totals(stages):
+    """Sum collected (name, seconds, allocated) stages by name"""
+    totals = {}
+    for name, seconds, _ in stages:
+        totals[name] = totals.get(name, 0) + seconds
+    return totals
+
+def _format_stage_totals(stages):
+    return ' '.join(f'{name}={seconds:.3f}s' for name, seconds in stage_totals(stages).items())
+
+def save_profile(profiler, folder):
+    """Write a cProfile capture as profile.prof in folder and return its path"""
+    path = os.path.join(folder, 'profile.prof')
+    profiler.dump_stats(path)
+    return path
+
+def _profiling_requested():
+    if not app.config['PROFILE_REQUESTS']:
+        return False
+    flag = request.args.get('profile') or request.form.get('profile')
+    if flag is None and request.is_json:
+        flag = (request.get_json(silent=True) or {}).get('profile')
+    return bool(flag) and flag not in ('0', 'false')
+
+@app.before_request
+def _start_request_instrumentation():
+    request.environ['excel_tools.start'] = time.perf_counter()
+    if app.config['METRICS_ENABLED']:
+        request.environ['excel_tools.stages'] = []
+        _collected_stages.set(request.environ['excel_tools.stages'])
+    if _profiling_requested():
+        profiler = cProfile.Profile()
+        request.environ['excel_tools.profiler'] = profiler
+        profiler.enable()
+
+@app.after_request
+def _finish_request_instrumentation(response):
+    profiler = request.environ.pop('excel_tools.profiler', None)
+    if profiler is not None:
+        profiler.disable()
+        path = save_profile(profiler, workspaces.create())
+        response.headers['X-Profile-URL'] = url_for('download_file', file_id=workspaces.register(
+            path, f'profile_{request.endpoint}.prof'))
+
+    if not app.config['METRICS_ENABLED']:
+        return response
+    seconds = time.perf_counter() - request.environ['excel_tools.start']
+    stage_metrics.observe_request(request.endpoint or 'unknown', response.status_code, seconds)
+    stages = request.environ.get('excel_tools.stages') or []
+    if app.config['SERVER_TIMING']:
+        # Stages of a streamed body run after the headers are sent and are not included
+        response.headers['Server-Timing'] = ', '.join(
+            [f'{name};dur={total * 1000:.1f}' for name, total in stage_totals(stages).items()]
+            + [f'total;dur={seconds * 1000:.1f}'])
+    logger.info('%s %s %s %.3fs %s', request.method, request.path, response.status_code, seconds,
+                _format_stage_totals(stages))
+    return response
+
+@app.teardown_request
+def _reset_request_stages(exc):
+    _collected_stages.set(None)
 
 def cleanup_old_files():
-    """Clean up files older than 1 hour"""
-    current_time = datetime.now()
-    files_to_remove = []
-    
-    for file_id, file_info in generated_files.items():
-        if current_time - file_info['created_at'] > timedelta(hours=1):
+    """Remove uploads, workspaces, results, jobs and cached merges older than
+    RESULT_TTL seconds"""
+    cutoff = time.time() - app.config['RESULT_TTL']
+    job_store.delete_finished_before(cutoff)
+    workspaces.sweep(cutoff)
+    merge_cache.sweep(cutoff)
+
+def _cleanup_scheduler():
+    while True:
+        time.sleep(app.config['CLEANUP_INTERVAL'])
+        try:
+            cleanup_old_files()
+        except Exception:
+            pass
+
+def _start_cleanup_scheduler():
+    thread = threading.Thread(target=_cleanup_scheduler, daemon=True)
+    thread.start()
+    return thread
+
+# Expire generated files in the background, from a thread each worker
+# starts with its first request
+_cleanup_thread = ProcessLocal(_start_cleanup_scheduler)
+
+@app.before_request
+def _start_cleanup_thread():
+    _cleanup_thread.get()
+
+class JobStore:
+    """SQLite-backed state of background jobs, shared by all worker processes"""
+
+    def __init__(self, path):
+        self.path = path
+        with self._connect() as db:
+            db.execute("""CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY, kind TEXT, status TEXT,
+                done INTEGER DEFAULT 0, total INTEGER DEFAULT 0,
+                created_at REAL, started_at REAL, finished_at REAL,
+                error TEXT, result_path TEXT, result_name TEXT, profile_path TEXT, summary TEXT)""")
+            # Stores created by earlier versions lack the newer columns
+            columns = {row['name'] for row in db.execute('PRAGMA table_info(jobs)')}
+            for column in ('profile_path', 'summary'):
+                if column not in columns:
+                    db.execute(f'ALTER TABLE jobs ADD COLUMN {column} TEXT')
+            db.execute("""CREATE TABLE IF NOT EXISTS job_workspaces (job_id TEXT, workspace TEXT)""")
+
+    @contextmanager
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=30)
+        db.row_factory = sqlite3.Row
+        try:
+            with db:  # Commit on success
+                yield db
+        finally:
+            db.close()
+
+    def create(self, kind):
+        job_id = uuid.uuid4().hex
+        with self._connect() as db:
+            db.execute('INSERT INTO jobs (id, kind, status, created_at) VALUES (?, ?, ?, ?)',
+                       (job_id, kind, 'queued', time.time()))
+        return job_id
+
+    def update(self, job_id, **fields):
+        assignments = ', '.join(f'{name} = ?' for name in fields)
+        with self._connect() as db:
+            db.execute(f'UPDATE jobs SET {assignments} WHERE id = ?', (*fields.values(), job_id))
+
+    def get(self, job_id):
+        with self._connect() as db:
+            row = db.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def delete_finished_before(self, cutoff):
+        """Forget jobs finished before cutoff. Their results are removed with
+        their workspaces."""
+        with self._connect() as db:
+            db.execute('DELETE FROM job_workspaces WHERE job_id IN '
+                       '(SELECT id FROM jobs WHERE finished_at < ?)', (cutoff,))
+            db.execute('DELETE FROM jobs WHERE finished_at < ?', (cutoff,))
+
+    def add_workspace(self, job_id, workspace):
+        """Record a working directory the job writes into"""
+        with self._connect() as db:
+            db.execute('INSERT INTO job_workspaces VALUES (?, ?)', (job_id, workspace))
+
+    def active_workspaces(self):
+        """Names of the working directories of queued and running jobs"""
+        with self._connect() as db:
+            return {row['workspace'] for row in db.execute(
+                "SELECT w.workspace FROM job_workspaces w JOIN jobs j ON j.id = w.job_id "
+                "WHERE j.status IN ('queued', 'running')")}
+
+job_store = JobStore(app.config['JOBS_DATABASE'])
+
+class WorkspaceManager:
+    """Isolated working directories for requests and jobs, content-addressed
+    uploads and ID-based result files. The state is kept on disk and in
+    SQLite, so any worker process can serve a download or sweep old files.
+
+    Uploads are stored once per content as <sha256><ext> in `inputs`, and the
+    name doubles as the reference clients send back. Large files arrive in
+    chunks through an upload session, assembled in `inputs`/<id>.upload.
+    Every request or job writes into its own directory under `root`; those
+    of a job are recorded in `jobs` and kept until it ends, however long it
+    runs."""
+
+    _INPUT_NAME = re.compile(r'[0-9a-f]{64}\.[a-z0-9]{1,8}')
+    _SESSION_NAME = re.compile(r'[0-9a-f]{32}\.upload')
+    _WORKSPACE_NAME = re.compile(r'[0-9a-f]{32}')
+
+    def __init__(self, inputs, root, database, jobs):
+        self.inputs = inputs
+        self.root = root
+        self.database = database
+        self.jobs = jobs
+        with self._connect() as db:
+            db.execute("""CREATE TABLE IF NOT EXISTS results (
+                id TEXT PRIMARY KEY, path TEXT, name TEXT, created_at REAL)""")
+            db.execute("""CREATE TABLE IF NOT EXISTS uploads (
+                id TEXT PRIMARY KEY, name TEXT, size INTEGER, sha256 TEXT, created_at REAL)""")
+            db.execute("""CREATE TABLE IF NOT EXISTS upload_chunks (
+                upload_id TEXT, start INTEGER, stop INTEGER)""")
+
+    @contextmanager
+    def _connect(self):
+        db = sqlite3.connect(self.database, timeout=30)
+        db.row_factory = sqlite3.Row
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def store_upload(self, file):
+        """Save an uploaded file under the SHA-256 of its content and return
+        its reference. Identical uploads share one copy. Spreadsheets are
+        stored under the extension of their detected format."""
+        extension = SPREADSHEET_EXTENSIONS.get(spreadsheet_format(file)) or \
+            os.path.splitext(file.filename)[1].lower()
+        sha = hashlib.sha256()
+        fd, temp_path = tempfile.mkstemp(dir=self.inputs, suffix='.part')
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in iter(lambda: file.stream.read(1024 * 1024), b''):
+                sha.update(chunk)
+                f.write(chunk)
+        return self._keep(temp_path, sha.hexdigest() + extension)
+
+    def _keep(self, temp_path, reference):
+        """Move a finished file to its reference, or drop it for an existing copy"""
+        path = os.path.join(self.inputs, reference)
+        if os.path.exists(path):
+            os.remove(temp_path)
+            os.utime(path)  # Restart its TTL
+        else:
+            os.replace(temp_path, path)
+        return reference
+
+    def _session_path(self, upload_id):
+        return os.path.join(self.inputs, f'{upload_id}.upload')
+
+    def start_upload(self, name, size, sha256=None):
+        """Open a chunked upload session for a file of `size` bytes and
+        return its ID. The file is preallocated so chunks can be written in
+        any order, in parallel."""
+        upload_id = uuid.uuid4().hex
+        with open(self._session_path(upload_id), 'wb') as f:
+            f.truncate(size)
+        with self._connect() as db:
+            db.execute('INSERT INTO uploads (id, name, size, sha256, created_at) VALUES (?, ?, ?, ?, ?)',
+                       (upload_id, name, size, sha256.lower() if sha256 else None, time.time()))
+        return upload_id
+
+    def upload_status(self, upload_id):
+        """The session's file name and size and the byte ranges received so
+        far, merged, as [start, stop) pairs. Raises FileNotFoundError for an
+        unknown or expired session."""
+        with self._connect() as db:
+            row = db.execute('SELECT * FROM uploads WHERE id = ?', (upload_id,)).fetchone()
+            chunks = db.execute('SELECT start, stop FROM upload_chunks WHERE upload_id = ? ORDER BY start',
+                                (upload_id,)).fetchall()
+        if row is None or not os.path.exists(self._session_path(upload_id)):
+            raise FileNotFoundError(upload_id)
+        received = []
+        for start, stop in chunks:
+            if received and start <= received[-1][1]:
+                received[-1][1] = max(received[-1][1], stop)
+            else:
+                received.append([start, stop])
+        return {'name': row['name'], 'size': row['size'], 'sha256': row['sha256'], 'received': received}
+
+    def write_chunk(self, upload_id, start, stream, length, digest=None):
+        """Stream `length` bytes from `stream` into the session's file at
+        `start`. When the client sent the chunk's SHA-256, a mismatch raises
+        ValueError and the range is not recorded, so it is sent again."""
+        path = self._session_path(upload_id)
+        sha = hashlib.sha256()
+        with open(path, 'r+b') as f:
+            f.seek(start)
+            remaining = length
+            while remaining:
+                data = stream.read(min(remaining, 1024 * 1024))
+                if not data:
+                    raise ValueError('Η μεταφορά του τμήματος διακόπηκε')
+                sha.update(data)
+                f.write(data)
+                remaining -= len(data)
+        if digest is not None and sha.digest() != digest:
+            raise ValueError('Το άθροισμα ελέγχου του τμήματος δεν ταιριάζει')
+        with self._connect() as db:
+            db.execute('INSERT INTO upload_chunks (upload_id, start, stop) VALUES (?, ?, ?)',
+                       (upload_id, start, start + length))
+
+    def finish_upload(self, upload_id, sha256=None):
+        """Verify that every byte arrived and the file's SHA-256 matches the
+        ones given at the start and here, if any, then store it like a single
+        upload and return its reference. Raises ValueError for a missing range
+        or a checksum mismatch; the session is dropped after a mismatch."""
+        status = self.upload_status(upload_id)
+        if status['received'] != ([[0, status['size']]] if status['size'] else []):
+            raise ValueError('Η μεταφόρτωση δεν έχει ολοκληρωθεί')
+        path = self._session_path(upload_id)
+        digest = file_digest(path)
+        if any(expected and expected.lower() != digest for expected in (status['sha256'], sha256)):
+            self.cancel_upload(upload_id)
+            raise ValueError('Το άθροισμα ελέγχου του αρχείου δεν ταιριάζει')
+        extension = SPREADSHEET_EXTENSIONS.get(spreadsheet_format(path)) or \
+            os.path.splitext(status['name'])[1].lower()
+        reference = self._keep(path, digest + extension)
+        self._forget_upload(upload_id)
+        return reference
+
+    def cancel_upload(self, upload_id):
+        try:
+            os.remove(self._session_path(upload_id))
+        except OSError:
+            pass
+        self._forget_upload(upload_id)
+
+    def _forget_upload(self, upload_id):
+        with self._connect() as db:
+            db.execute('DELETE FROM upload_chunks WHERE upload_id = ?', (upload_id,))
+            db.execute('DELETE FROM uploads WHERE id = ?', (upload_id,))
+
+    def input_path(self, reference):
+        """Path of an upload reference. Raises FileNotFoundError for unknown
+        or malformed references."""
+        if not reference or not self._INPUT_NAME.fullmatch(reference):
+            raise FileNotFoundError(reference)
+        path = os.path.join(self.inputs, reference)
+        os.utime(path)  # In use, so keep it past the TTL
+        return path
+
+    @staticmethod
+    def input_digest(reference):
+        """SHA-256 of an upload's content, which its reference is named after"""
+        return reference.split('.', 1)[0]
+
+    def path_digest(self, path):
+        """input_digest() of the upload stored at path, or None when path is
+        not a stored upload"""
+        name = os.path.basename(path)
+        if self._INPUT_NAME.fullmatch(name) and \
+                os.path.dirname(os.path.abspath(path)) == os.path.abspath(self.inputs):
+            return self.input_digest(name)
+        return None
+
+    def create(self):
+        """A new, empty working directory"""
+        path = os.path.join(self.root, uuid.uuid4().hex)
+        os.makedirs(path)
+        job_id = _current_job.get()
+        if job_id:
+            self.jobs.add_workspace(job_id, os.path.basename(path))
+        return path
+
+    def register(self, path, download_name):
+        """Make a result file downloadable by ID and return the ID"""
+        result_id = uuid.uuid4().hex
+        with self._connect() as db:
+            db.execute('INSERT INTO results (id, path, name, created_at) VALUES (?, ?, ?, ?)',
+                       (result_id, path, download_name, time.time()))
+        return result_id
+
+    def result(self, result_id):
+        with self._connect() as db:
+            row = db.execute('SELECT * FROM results WHERE id = ?', (result_id,)).fetchone()
+        return dict(row) if row else None
+
+    def sweep(self, cutoff):
+        """Delete results, workspaces, uploads and upload sessions last touched
+        before cutoff, except the workspaces of jobs still queued or running"""
+        with self._connect() as db:
+            db.execute('DELETE FROM results WHERE created_at < ?', (cutoff,))
+        active = self.jobs.active_workspaces()
+        for entry in os.scandir(self.inputs):
             try:
-                os.remove(file_info['path'])
-                files_to_remove.append(file_id)
-            except:
+                if self._SESSION_NAME.fullmatch(entry.name) and entry.stat().st_mtime < cutoff:
+                    self.cancel_upload(entry.name[:-len('.upload')])
+            except OSError:
                 pass
-    
-    for file_id in files_to_remove:
-        del generated_files[file_id]
+        for folder, pattern in ((self.root, self._WORKSPACE_NAME), (self.inputs, self._INPUT_NAME)):
+            for entry in os.scandir(folder):
+                try:
+                    if not pattern.fullmatch(entry.name) or entry.stat().st_mtime >= cutoff \
+                            or (folder == self.root and entry.name in active):
+                        continue
+                    if entry.is_dir():
+                        shutil.rmtree(entry.path, ignore_errors=True)
+                    else:
+                        os.remove(entry.path)
+                except OSError:
+                    pass
+
+workspaces = WorkspaceManager(app.config['UPLOAD_FOLDER'], app.config['GENERATED_FILES'],
+                              app.config['JOBS_DATABASE'], job_store)
+job_executor = ProcessLocal(lambda: ThreadPoolExecutor(max_workers=app.config['JOB_WORKERS']))
+_pending_jobs = 0
+_pending_jobs_lock = ProcessLocal(threading.Lock)
+
+def submit_job(kind, func, *args):
+    """Run func(progress, *args) in the background. func returns the path and
+    download name of its result file. Returns the job ID, or None when the
+    queue is full."""
+    global _pending_jobs
+    with _pending_jobs_lock.get():
+        if _pending_jobs >= app.config['JOB_QUEUE_LIMIT']:
+            return None
+        _pending_jobs += 1
+
+    job_id = job_store.create(kind)
+    job_executor.get().submit(_run_job, job_id, kind, func, args, _profiling_requested())
+    return job_id
+
+def _run_job(job_id, kind, func, args, profile=False):
+    global _pending_jobs
+    job_store.update(job_id, status='running', started_at=time.time())
+    # Workspaces created from here on belong to the job
+    job_token = _current_job.set(job_id)
+    last_update = 0
+    path = None
+    profiler = cProfile.Profile() if profile else None
+    start = time.perf_counter()
+
+    def progress(done, total):
+        nonlocal last_update
+        # Throttle writes to the job store
+        if done >= total or time.monotonic() - last_update > 0.5:
+            last_update = time.monotonic()
+            job_store.update(job_id, done=done, total=total)
+
+    try:
+        with app.app_context(), collect_stages() as stages:
+            if profiler:
+                profiler.enable()
+            try:
+                # A job returns its result file and download name, and may add a summary
+                path, download_name, *summary = func(progress, *args)
+            finally:
+                if profiler:
+                    profiler.disable()
+        job_store.update(job_id, status='finished', finished_at=time.time(),
+                         result_path=path, result_name=download_name,
+                         summary=json.dumps(summary[0]) if summary and summary[0] else None)
+        if app.config['METRICS_ENABLED']:
+            stage_metrics.observe_request(f'job:{kind}', 'finished', time.perf_counter() - start)
+            logger.info('job %s %s %.3fs %s', kind, job_id, time.perf_counter() - start,
+                        _format_stage_totals(stages))
+    except Exception as e:
+        logger.exception('job %s %s failed', kind, job_id)
+        job_store.update(job_id, status='failed', finished_at=time.time(), error=str(e))
+    finally:
+        if profiler:
+            # Saved next to the result, or in a workspace of its own if the job failed
+            folder = os.path.dirname(path) if path else workspaces.create()
+            job_store.update(job_id, profile_path=save_profile(profiler, folder))
+        _current_job.reset(job_token)
+        with _pending_jobs_lock.get():
+            _pending_jobs -= 1
+
+def job_response(job_id):
+    """Status of a job as returned to the polling pages"""
+    job = job_store.get(job_id)
+    eta = None
+    if job['status'] == 'running' and job['done'] and job['total']:
+        elapsed = time.time() - job['started_at']
+        eta = round(elapsed / job['done'] * (job['total'] - job['done']), 1)
+    return {
+        'job_id': job_id,
+        'status': job['status'],
+        'done': job['done'],
+        'total': job['total'],
+        'eta_seconds': eta,
+        'error': job['error'],
+        'summary': json.loads(job['summary']) if job['summary'] else None,
+        'status_url': f'/jobs/{job_id}',
+        'result_url': f'/jobs/{job_id}/result' if job['status'] == 'finished' else None,
+        'profile_url': f'/jobs/{job_id}/profile' if job['profile_path'] else None,
+    }
+
+_heavy_slots = ProcessLocal(lambda: threading.BoundedSemaphore(app.config['HEAVY_REQUEST_SLOTS']))
+
+def heavy_route(template=None):
+    """Run a view that parses or writes whole files (compare, join, filter,
+    split, merge, SQL) in one of the HEAVY_REQUEST_SLOTS of this process, so
+    heavy requests cannot occupy every server thread and the quick endpoints
+    the pages call (uploads, column pickers, job status) stay responsive. A
+    request left waiting HEAVY_REQUEST_WAIT seconds is refused with a 503,
+    rendered into `template` for form posts. Responses generated while they
+    stream keep their slot until the stream closes; finished files do not."""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            slots = _heavy_slots.get()
+            with stage('heavy_slot_wait'):
+                acquired = slots.acquire(timeout=app.config['HEAVY_REQUEST_WAIT'])
+            if not acquired:
+                message = 'Ο διακομιστής είναι απασχολημένος, δοκιμάστε αργότερα'
+                if template and not request.is_json and not request.form.get('async'):
+                    return render_template(template, error=message), 503
+                return jsonify({'error': message}), 503
+            try:
+                response = app.make_response(view(*args, **kwargs))
+            except BaseException:
+                slots.release()
+                raise
+            if response.is_streamed and not response.direct_passthrough:
+                response.call_on_close(slots.release)
+            else:
+                slots.release()
+            return response
+        return wrapper
+    return decorator
+
+def job_output_path(extension):
+    """A path for a job's result file in a workspace of its own"""
+    return os.path.join(workspaces.create(), f'result{extension}')
+
+_file_digests = OrderedDict()  # (path, mtime, size) -> SHA-256
+_file_digests_lock = ProcessLocal(threading.Lock)
+
+def file_digest(source):
+    """Return the SHA-256 of a file path or file-like object, leaving streams
+    rewound. Stored uploads are named after their digest, so their content
+    is not read again; other paths are hashed once per (path, mtime, size)."""
+    if isinstance(source, (str, os.PathLike)):
+        digest = workspaces.path_digest(os.fspath(source))
+        if digest:
+            return digest
+        stat = os.stat(source)
+        key = (os.path.abspath(source), stat.st_mtime_ns, stat.st_size)
+        with _file_digests_lock.get():
+            if key in _file_digests:
+                _file_digests.move_to_end(key)
+                return _file_digests[key]
+        sha = hashlib.sha256()
+        with open(source, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                sha.update(chunk)
+        with _file_digests_lock.get():
+            _file_digests[key] = sha.hexdigest()
+            while len(_file_digests) > 256:
+                _file_digests.popitem(last=False)
+    else:
+        sha = hashlib.sha256()
+        stream = getattr(source, 'stream', source)
+        stream.seek(0)
+        for chunk in iter(lambda: stream.read(1024 * 1024), b''):
+            sha.update(chunk)
+        stream.seek(0)
+    return sha.hexdigest()
+
+class WorkbookCache:
+    """Two-level cache of parsed sheets: a bounded in-memory LRU on top of
+    columnar files on disk (Parquet when pyarrow is available, pickle otherwise)"""
+
+    STALE_TEMP_SECONDS = 60 * 60  # A .tmp file this old belongs to a writer that died
+
+    def __init__(self, folder, max_entries, max_memory, max_disk, row_group_rows=None):
+        self.folder = folder
+        self.max_entries = max_entries
+        self.max_memory = max_memory
+        self.max_disk = max_disk
+        self.row_group_rows = row_group_rows
+        self._memory = OrderedDict()  # key -> (DataFrame, size in bytes)
+        self._memory_size = 0
+        self._notes = OrderedDict()  # (key, kind) -> JSON value, e.g. the dtypes of a text file
+        self._lock = ProcessLocal(threading.Lock)
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _paths(self, key):
+        base = os.path.join(self.folder, key)
+        return base + '.parquet', base + '.pkl'
+
+    def get_json(self, key, kind):
+        """A small JSON value derived earlier from an entry, such as the
+        dtypes inferred for a text file ('types') or the column statistics
+        of a sheet ('stats'), or None"""
+        with self._lock.get():
+            if (key, kind) in self._notes:
+                return self._notes[key, kind]
+        try:
+            with open(os.path.join(self.folder, f'{key}.{kind}.json'), encoding='utf-8') as f:
+                value = json.load(f)
+        except (OSError, ValueError):
+            return None
+        with self._lock.get():
+            self._notes[key, kind] = value
+        return value
+
+    def put_json(self, key, kind, value):
+        with self._lock.get():
+            self._notes[key, kind] = value
+            while len(self._notes) > 256:
+                self._notes.popitem(last=False)
+        path = os.path.join(self.folder, f'{key}.{kind}.json')
+        temp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(value, f)
+        os.replace(temp_path, path)
+
+    def get(self, key):
+        with self._lock.get():
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return self._memory[key][0]
+
+        df = None
+        for path in self._paths(key):
+            if not os.path.exists(path):
+                continue
+            try:
+                df = pd.read_parquet(path) if path.endswith('.parquet') else pd.read_pickle(path)
+                os.utime(path)  # Mark as recently used for disk eviction
+                break
+            except Exception:
+                df = None
+
+        with self._lock.get():
+            if df is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+        self._remember(key, df)
+        return df
+
+    def get_window(self, key, start, stop):
+        """(rows start:stop, row count) of a cached sheet, or None when it is
+        not cached. A sheet only on disk as Parquet is memory-mapped and just
+        the row groups holding the window are read, so the cost follows the
+        window, not the sheet."""
+        with self._lock.get():
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                df = self._memory[key][0]
+                return df.iloc[start:stop], len(df)
+
+        parquet_path, _ = self._paths(key)
+        if not HAS_PYARROW or not os.path.exists(parquet_path):
+            return None
+        try:
+            parquet = pa_parquet.ParquetFile(parquet_path, memory_map=True)
+            groups, first, offset = [], 0, 0
+            for i in range(parquet.num_row_groups):
+                rows = parquet.metadata.row_group(i).num_rows
+                if offset + rows <= start:
+                    first = offset + rows
+                elif offset < stop:
+                    groups.append(i)
+                offset += rows
+            table = parquet.read_row_groups(groups) if groups else parquet.schema_arrow.empty_table()
+            df = table.to_pandas()
+            os.utime(parquet_path)  # Mark as recently used for disk eviction
+        except Exception:
+            return None
+        with self._lock.get():
+            self.disk_hits += 1
+        return df.iloc[start - first:stop - first].reset_index(drop=True), parquet.metadata.num_rows
+
+    def put(self, key, df):
+        self._remember(key, df)
+        parquet_path, pickle_path = self._paths(key)
+        # Write under a unique name and rename, so other worker processes
+        # never read a half-written file
+        temp_path = f'{pickle_path}.{uuid.uuid4().hex}.tmp'
+        try:
+            if not HAS_PYARROW:
+                raise ValueError('pyarrow is not installed')
+            df.to_parquet(temp_path, index=False, row_group_size=self.row_group_rows)
+            os.replace(temp_path, parquet_path)
+        except Exception:
+            # Mixed-type or non-string columns cannot be stored as Parquet
+            df.to_pickle(temp_path)
+            os.replace(temp_path, pickle_path)
+        self._evict_disk()
+
+    def _remember(self, key, df):
+        size = int(df.memory_usage(index=True, deep=True).sum())
+        if size > self.max_memory:
+            return
+        with self._lock.get():
+            if key in self._memory:
+                self._memory_size -= self._memory.pop(key)[1]
+            self._memory[key] = (df, size)
+            self._memory_size += size
+            while self._memory and (len(self._memory) > self.max_entries
+                                    or self._memory_size > self.max_memory):
+                _, (_, evicted_size) = self._memory.popitem(last=False)
+                self._memory_size -= evicted_size
+
+    def _evict_disk(self):
+        """Delete the least recently used sheets until the finished .parquet
+        and .pkl files fit in max_disk. Files another process is still
+        writing (.tmp) are left alone unless abandoned long ago, and the small
+        JSON notes stay for the next upload of the same content."""
+        entries = []
+        stale = time.time() - self.STALE_TEMP_SECONDS
+        for name in os.listdir(self.folder):
+            path = os.path.join(self.folder, name)
+            try:
+                stat = os.stat(path)
+                if name.endswith('.tmp'):
+                    if stat.st_mtime < stale:
+                        os.remove(path)
+                    continue
+            except OSError:
+                continue
+            if name.endswith(('.parquet', '.pkl')):
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_disk:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+    def stats(self):
+        with self._lock.get():
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'entries': len(self._memory),
+                'memory_bytes': self._memory_size,
+            }
+
+workbook_cache = WorkbookCache(app.config['CACHE_FOLDER'],
+                               app.config['WORKBOOK_CACHE_ENTRIES'],
+                               app.config['WORKBOOK_CACHE_MEMORY'],
+                               app.config['WORKBOOK_CACHE_DISK'],
+                               app.config['WORKBOOK_CACHE_ROW_GROUP'])
+
+# Sheet selector meaning every sheet of the workbook (Excel forbids * in sheet names)
+ALL_SHEETS = '*'
+# Column naming the source sheet of each row when all sheets are processed together
+SHEET_COLUMN = 'Φύλλο'
+
+_sheet_index = OrderedDict()  # file digest -> sheet names
+_sheet_index_lock = ProcessLocal(threading.Lock)
+
+# Formats told apart by content, and the extension uploads of each are stored under
+SPREADSHEET_EXTENSIONS = {'xlsx': '.xlsx', 'xls': '.xls', 'ods': '.ods', 'csv': '.csv'}
+# pandas engines of the formats openpyxl cannot read, and the package providing each
+EXCEL_ENGINES = {'xlsx': ('openpyxl', 'openpyxl'), 'xls': ('xlrd', 'xlrd'), 'ods': ('odf', 'odfpy')}
+# The single sheet of a CSV file
+CSV_SHEET = 'Sheet1'
+
+_OLE2_SIGNATURE = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+_ODS_MIMETYPE = b'application/vnd.oasis.opendocument.spreadsheet'
+
+def _is_text(sample):
+    """Whether the start of a file looks like UTF-8 or Windows Greek text"""
+    if not sample or b'\x00' in sample:
+        return False
+    try:
+        # A character may be cut at the end of the sample
+        codecs.getincrementaldecoder('utf-8')().decode(sample)
+        return True
+    except UnicodeDecodeError:
+        pass
+    try:
+        sample.decode('cp1253')
+        return True
+    except UnicodeDecodeError:
+        return False
+
+def _sniff_format(f):
+    head = f.read(8192)
+    if head.startswith(b'PK\x03\x04'):
+        f.seek(0)
+        try:
+            with zipfile.ZipFile(f) as archive:
+                names = set(archive.namelist())
+                if 'xl/workbook.xml' in names:
+                    return 'xlsx'
+                if 'mimetype' in names and archive.read('mimetype').strip() == _ODS_MIMETYPE:
+                    return 'ods'
+        except zipfile.BadZipFile:
+            pass
+        return None
+    if head.startswith(_OLE2_SIGNATURE):
+        return 'xls'
+    return 'csv' if _is_text(head) else None
+
+def spreadsheet_format(source):
+    """'xlsx', 'xls', 'ods' or 'csv', detected from the content of a path or
+    an uploaded stream rather than its name, or None for anything else.
+    Streams are left rewound."""
+    if isinstance(source, str):
+        with open(source, 'rb') as f:
+            return _sniff_format(f)
+    stream = getattr(source, 'stream', source)
+    stream.seek(0)
+    try:
+        return _sniff_format(stream)
+    finally:
+        stream.seek(0)
+
+def _is_xlsx(source):
+    return spreadsheet_format(source) == 'xlsx'
+
+def excel_engine(fmt):
+    """pandas engine of a workbook format. Raises ValueError when its
+    optional package is not installed."""
+    module, package = EXCEL_ENGINES[fmt]
+    if importlib.util.find_spec(module) is None:
+        raise ValueError(f'Η ανάγνωση αρχείων {SPREADSHEET_EXTENSIONS[fmt]} απαιτεί το πακέτο {package}')
+    return module
+
+def _input_stream(source):
+    return source if isinstance(source, str) else getattr(source, 'stream', source)
+
+def csv_dialect(source):
+    """(encoding, delimiter) of a CSV file, from its first megabyte: UTF-8
+    (with or without a BOM) when it decodes as such, Windows Greek otherwise"""
+    stream = _input_stream(source)
+    if isinstance(stream, str):
+        with open(stream, 'rb') as f:
+            sample = f.read(1024 * 1024)
+    else:
+        sample = stream.read(1024 * 1024)
+        stream.seek(0)
+    try:
+        codecs.getincrementaldecoder('utf-8')().decode(sample)
+        encoding = 'utf-8-sig'
+    except UnicodeDecodeError:
+        encoding = 'cp1253'
+    lines = sample[:64 * 1024].decode(encoding, errors='ignore').splitlines()[:20]
+    try:
+        delimiter = csv.Sniffer().sniff('\n'.join(lines), delimiters=',;\t|').delimiter
+    except csv.Error:
+        delimiter = ','
+    return encoding, delimiter
+
+def _csv_options(source, header):
+    encoding, delimiter = csv_dialect(source)
+    # Only empty cells are missing, as in a workbook; "NA" or "null" stay text
+    return dict(sep=delimiter, encoding=encoding, encoding_errors='replace', skiprows=header,
+                dtype=str, keep_default_na=False, na_values=[''])
+
+def csv_columns(source, header=0):
+    """Column names of a CSV file, named like pd.read_csv names them"""
+    columns = pd.read_csv(_input_stream(source), nrows=0, **_csv_options(source, header)).columns
+    if not isinstance(source, str):
+        _input_stream(source).seek(0)
+    return columns.tolist()
+
+def _read_csv_text(source, header=0):
+    """A whole CSV file as a frame of strings, with pyarrow's multi-threaded
+    reader when it is installed"""
+    options = _csv_options(source, header)
+    if HAS_PYARROW and isinstance(source, str):
+        columns = csv_columns(source, header)
+        try:
+            table = pa_csv.read_csv(
+                source,
+                read_options=pa_csv.ReadOptions(
+                    use_threads=True, skip_rows=header + 1, column_names=columns,
+                    encoding='utf8' if options['encoding'] == 'utf-8-sig' else options['encoding']),
+                parse_options=pa_csv.ParseOptions(delimiter=options['sep']),
+                convert_options=pa_csv.ConvertOptions(
+                    column_types={column: pyarrow.string() for column in columns},
+                    strings_can_be_null=True, null_values=['']))
+            return table.to_pandas()
+        except pyarrow.ArrowInvalid:
+            pass  # Ragged rows or stray bytes; pandas copes with both
+    df = pd.read_csv(_input_stream(source), **options)
+    if not isinstance(source, str):
+        _input_stream(source).seek(0)
+    return df
+
+def _iter_csv_text(source, header, chunk_rows):
+    with pd.read_csv(_input_stream(source), chunksize=chunk_rows, **_csv_options(source, header)) as chunks:
+        yield from chunks
+
+_INTEGER_TEXT = r'[-+]?\d{1,18}'
+
+def _text_type(values):
+    """Narrowest type every non-blank string of a column parses as: 'int',
+    'float', 'bool', 'datetime', 'str', or 'empty' when all are blank.
+    Numbers with leading zeros are codes (postcodes, tax numbers) and stay text."""
+    values = values.dropna().str.strip()
+    if values.empty:
+        return 'empty'
+    if values.str.fullmatch(r'[-+]?0\d+(\.\d*)?').any():
+        return 'str'
+    tests = (
+        ('int', lambda v: v.str.fullmatch(_INTEGER_TEXT).all()),
+        ('float', lambda v: pd.to_numeric(v, errors='coerce').notna().all()),
+        ('bool', lambda v: v.str.lower().isin(('true', 'false')).all()),
+        ('datetime', lambda v: pd.to_datetime(v, errors='coerce', format='ISO8601').notna().all()),
+    )
+    # Most columns fail on their first rows, so try a sample before the whole column
+    sample = values.head(1000)
+    for kind, test in tests:
+        if test(sample) and test(values):
+            return kind
+    return 'str'
+
+def _merge_text_types(first, second):
+    if first == 'empty' or first == second:
+        return second
+    if second == 'empty':
+        return first
+    if {first, second} == {'int', 'float'}:
+        return 'float'
+    return 'str'
+
+def _text_dtypes(types, missing):
+    """pandas dtypes for inferred text types; like pd.read_excel, integer
+    columns with blanks become float and blank columns float NaN"""
+    dtypes = {}
+    for column, kind in types.items():
+        if kind == 'int':
+            dtypes[column] = 'float64' if column in missing else 'int64'
+        elif kind == 'bool':
+            dtypes[column] = 'object' if column in missing else 'bool'
+        else:
+            dtypes[column] = {'float': 'float64', 'empty': 'float64',
+                              'datetime': 'datetime64[ns]'}.get(kind, 'object')
+    return dtypes
+
+def _infer_dtypes(chunks):
+    """Column dtypes of a text file read as string frames"""
+    types, missing = {}, set()
+    for chunk in chunks:
+        for column in chunk.columns:
+            types[column] = _merge_text_types(types.get(column, 'empty'), _text_type(chunk[column]))
+            if chunk[column].isna().any():
+                missing.add(column)
+    return _text_dtypes(types, missing)
+
+def _apply_dtypes(df, dtypes):
+    """Convert a frame of strings to the given dtypes"""
+    for column, dtype in dtypes.items():
+        if column not in df.columns or dtype == 'object':
+            continue
+        text = df[column].str.strip()
+        if dtype == 'bool':
+            df[column] = text.str.lower().eq('true')
+        elif dtype.startswith('datetime'):
+            df[column] = pd.to_datetime(text, errors='coerce', format='ISO8601')
+        else:
+            df[column] = pd.to_numeric(text, errors='coerce').astype(dtype)
+    return df
+
+def _csv_dtypes(source, header, frame=None, digest=None):
+    """Column dtypes of a CSV file, inferred once per content and header row
+    and cached, so later reads and every chunk of a stream agree on them"""
+    key = f'{digest or file_digest(source)}_h{header}'
+    dtypes = workbook_cache.get_json(key, 'types')
+    if dtypes is None:
+        with stage('infer_types'):
+            if frame is not None:
+                dtypes = _infer_dtypes([frame])
+            else:
+                dtypes = _infer_dtypes(_iter_csv_text(source, header, app.config['FILTER_CHUNK_ROWS']))
+        workbook_cache.put_json(key, 'types', dtypes)
+    return dtypes
+
+def read_csv(source, header=0, digest=None):
+    """A CSV file as a typed frame, like pd.read_excel returns a sheet"""
+    df = _read_csv_text(source, header)
+    return _apply_dtypes(df, _csv_dtypes(source, header, df, digest))
+
+def iter_csv_chunks(source, header=0, chunk_rows=None):
+    """Yield a CSV file as typed frames of at most chunk_rows rows"""
+    chunk_rows = chunk_rows or app.config['FILTER_CHUNK_ROWS']
+    dtypes = _csv_dtypes(source, header)
+    for chunk in _iter_csv_text(source, header, chunk_rows):
+        yield _apply_dtypes(chunk, dtypes)
+
+def _count_lines(source):
+    count = 0
+    stream = _input_stream(source)
+    f = open(stream, 'rb') if isinstance(stream, str) else stream
+    try:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            count += block.count(b'\n')
+    finally:
+        if isinstance(stream, str):
+            f.close()
+        else:
+            f.seek(0)
+    return count
+
+def get_sheet_names(source, digest=None):
+    """Sheet names of a workbook, cached by content. For .xlsx only the small
+    workbook part of the archive is read, not the sheets themselves."""
+    digest = digest or file_digest(source)
+    with _sheet_index_lock.get():
+        if digest in _sheet_index:
+            _sheet_index.move_to_end(digest)
+            return _sheet_index[digest]
+
+    fmt = spreadsheet_format(source)
+    if fmt == 'csv':
+        names = [CSV_SHEET]
+    elif fmt == 'xlsx':
+        stream = source if isinstance(source, str) else getattr(source, 'stream', source)
+        try:
+            with zipfile.ZipFile(stream) as archive:
+                root = ElementTree.fromstring(archive.read('xl/workbook.xml'))
+            names = [sheet.get('name') for sheet in root.iter() if sheet.tag.endswith('}sheet')]
+        finally:
+            if not isinstance(source, str):
+                stream.seek(0)
+    elif fmt is None:
+        raise ValueError('Μη υποστηριζόμενος τύπος αρχείου')
+    else:
+        with pd.ExcelFile(_input_stream(source), engine=excel_engine(fmt)) as workbook:
+            names = list(workbook.sheet_names)
+        if not isinstance(source, str):
+            getattr(source, 'stream', source).seek(0)
+
+    with _sheet_index_lock.get():
+        _sheet_index[digest] = names
+        while len(_sheet_index) > 256:
+            _sheet_index.popitem(last=False)
+    return names
+
+def resolve_sheet(source, sheet, digest=None):
+    """Turn a sheet selector into a sheet name. Accepts a name, a position
+    (int or digit string) or a blank for the first sheet; ALL_SHEETS is
+    passed through. Raises ValueError for a sheet that does not exist."""
+    if sheet == ALL_SHEETS:
+        return sheet
+    names = get_sheet_names(source, digest)
+    if sheet is None or sheet == '':
+        return names[0] if names else 0
+    if sheet in names:
+        return sheet
+    if str(sheet).isdigit() and int(sheet) < len(names):
+        return names[int(sheet)]
+    raise ValueError(f'Το φύλλο "{sheet}" δεν βρέθηκε στο αρχείο')
+
+def header_offset(value):
+    """Rows above the header, from a 1-based header row number (blank = 1)"""
+    try:
+        row = int(value or 1)
+    except (TypeError, ValueError):
+        row = 0
+    if row < 1:
+        raise ValueError('Μη έγκυρη γραμμή επικεφαλίδων')
+    return row - 1
+
+def _sheet_key(digest, sheet_name, header):
+    """Workbook cache key of a sheet, by name, of the file with this digest"""
+    return f'{digest}_{sheet_name}' + (f'_h{header}' if header else '')
+
+def read_workbook(source, sheet_name=0, header=0, digest=None):
+    """Read a sheet like pd.read_excel, parsing each distinct upload only once.
+    Only the requested sheet is parsed, and `header` rows above the header
+    are skipped. Returns a shallow copy, so callers may add or drop columns
+    freely."""
+    digest = digest or file_digest(source)
+    if isinstance(sheet_name, int):
+        # Key sheets by name, so position and name share one cache entry
+        names = get_sheet_names(source, digest)
+        sheet_name = names[sheet_name] if sheet_name < len(names) else sheet_name
+    key = _sheet_key(digest, sheet_name, header)
+    df = workbook_cache.get(key)
+    if df is None:
+        fmt = spreadsheet_format(source)
+        if fmt == 'csv':
+            with stage('read_csv'):
+                df = read_csv(source, header, digest)
+        else:
+            with stage('read_excel'):
+                df = pd.read_excel(_input_stream(source), sheet_name=sheet_name, header=header,
+                                   engine=excel_engine(fmt or 'xlsx'))
+        workbook_cache.put(key, df)
+    return df.copy(deep=False)
+
+def read_all_sheets(source, header=0, column=None):
+    """Read every sheet, in parallel, into one frame with the source sheet
+    in a leading SHEET_COLUMN. Sheets without `column` are left out."""
+    names = get_sheet_names(source)
+    with ThreadPoolExecutor(max_workers=app.config['SPLIT_WORKERS']) as executor:
+        frames = list(executor.map(lambda name: read_workbook(source, name, header), names))
+    frames = [df.assign(**{SHEET_COLUMN: name})[[SHEET_COLUMN, *df.columns.drop(SHEET_COLUMN, errors='ignore')]]
+              for name, df in zip(names, frames)
+              if column in (None, SHEET_COLUMN) or column in df.columns]
+    if not frames:
+        return pd.DataFrame(columns=[SHEET_COLUMN] + ([column] if column not in (None, SHEET_COLUMN) else []))
+    return pd.concat(frames, ignore_index=True)
+
+def sheet_selection(source, values, suffix='', allow_all=False, digest=None):
+    """(sheet, header offset) from the sheet<suffix> and header_row<suffix>
+    fields of a request form or JSON body"""
+    sheet = values.get(f'sheet{suffix}')
+    if sheet == ALL_SHEETS and not allow_all:
+        raise ValueError('Η επιλογή όλων των φύλλων δεν υποστηρίζεται εδώ')
+    return resolve_sheet(source, sheet, digest), header_offset(values.get(f'header_row{suffix}'))
+
+def read_selection(source, sheet_name=0, header=0, column=None):
+    """read_workbook, or read_all_sheets for ALL_SHEETS"""
+    if sheet_name == ALL_SHEETS:
+        return read_all_sheets(source, header, column)
+    return read_workbook(source, sheet_name, header)
 
 def extract_placeholders(doc):
-    import re
     placeholders = set()
     regex = re.compile(r'\{[^{}]+\}')
 
@@ -67,129 +1365,1576 @@ def extract_placeholders(doc):
         for paragraph in section.footer.paragraphs:
             process_element(paragraph)
 
-    return sorted(list(placeholders))
+    return sorted(list(placeholders))
+
+def replace_placeholders(doc, data):
+    def _process_paragraph(paragraph, data):
+        runs = paragraph.runs
+        text = ''.join([run.text for run in runs])
+
+        for ph, val in data.items():
+            if ph not in text:
+                continue
+
+            start_idx = 0
+            while True:
+                start_idx = text.find(ph, start_idx)
+                if start_idx == -1:
+                    break
+
+                current_pos = 0
+                start_run = None
+                end_run = None
+
+                for i, run in enumerate(runs):
+                    run_end = current_pos + len(run.text)
+                    if current_pos <= start_idx < run_end:
+                        start_run = i
+                    if current_pos <= (start_idx + len(ph)) <= run_end:
+                        end_run = i
+                        break
+                    current_pos = run_end
+
+                if start_run is not None and end_run is not None:
+                    merged_text = ''.join(run.text for run in runs[start_run:end_run + 1])
+                    replaced_text = merged_text.replace(ph, str(val))
+                    runs[start_run].text = replaced_text
+                    for run in runs[start_run + 1:end_run + 1]:
+                        run.text = ""
+
+                start_idx += len(ph)
+
+    for paragraph in doc.paragraphs:
+        _process_paragraph(paragraph, data)
+
+    for table in doc.tables:
+        for row in table.rows:
+            for cell in row.cells:
+                for paragraph in cell.paragraphs:
+                    _process_paragraph(paragraph, data)
+
+    for section in doc.sections:
+        for paragraph in section.header.paragraphs:
+            _process_paragraph(paragraph, data)
+        for paragraph in section.footer.paragraphs:
+            _process_paragraph(paragraph, data)
+
+def _header_labels(header, width=None):
+    """Name header cells the way pd.read_excel does"""
+    header = list(header)
+    while header and header[-1] is None:
+        header.pop()
+    # Data rows wider than the header get "Unnamed" columns
+    header += [None] * ((width or 0) - len(header))
+
+    labels = []
+    seen = {}
+    for i, value in enumerate(header):
+        label = f'Unnamed: {i}' if value is None else value
+        if label in seen:
+            seen[label] += 1
+            label = f'{label}.{seen[label]}'
+        seen.setdefault(label, 0)
+        labels.append(label)
+    return labels
+
+@contextmanager
+def read_only_workbook(source):
+    """openpyxl's read-only workbook over a path or an uploaded stream. Paths
+    are opened here and closed on exit, because openpyxl leaves the file open
+    when a row iterator is abandoned halfway; streams are rewound."""
+    handle = open(source, 'rb') if isinstance(source, str) else getattr(source, 'stream', source)
+    workbook = openpyxl.load_workbook(handle, read_only=True, data_only=True)
+    try:
+        yield workbook
+    finally:
+        workbook.close()
+        if isinstance(source, str):
+            handle.close()
+        else:
+            handle.seek(0)
+
+def get_workbook_info(source, sheet_name=0, header=0):
+    """Return the column names, the sheet list and an approximate row count
+    by streaming only the header row (the row count comes from the sheet's
+    <dimension> element, so it is only as accurate as the writing program).
+    For ALL_SHEETS the columns of every sheet are combined, after SHEET_COLUMN."""
+    sheets = get_sheet_names(source)
+    fmt = spreadsheet_format(source)
+    if fmt == 'csv' and sheet_name != ALL_SHEETS:
+        resolve_sheet(source, sheet_name)
+        return {'columns': csv_columns(source, header), 'sheets': sheets,
+                'row_count': max(_count_lines(source) - header - 1, 0)}
+    if fmt != 'xlsx':
+        # Other formats cannot be streamed by openpyxl
+        df = read_selection(source, sheet_name, header)
+        return {'columns': df.columns.tolist(), 'sheets': sheets, 'row_count': len(df)}
+
+    selected = sheets if sheet_name == ALL_SHEETS else [resolve_sheet(source, sheet_name)]
+    columns, row_count = [], 0
+    with read_only_workbook(source) as workbook:
+        for name in selected:
+            worksheet = workbook[name]
+            header_cells = next(worksheet.iter_rows(min_row=header + 1, max_row=header + 1,
+                                                    values_only=True), ())
+            max_row = worksheet.max_row
+            columns += [label for label in _header_labels(header_cells, worksheet.max_column)
+                        if label not in columns]
+            row_count = None if max_row is None or row_count is None else \
+                row_count + max(max_row - header - 1, 0)
+
+    return {
+        'columns': [SHEET_COLUMN, *columns] if sheet_name == ALL_SHEETS else columns,
+        'sheets': sheets,
+        'row_count': row_count,
+    }
+
+def _rows_frame(rows, labels):
+    """DataFrame of raw sheet rows, padded or cut to the header's width"""
+    width = len(labels)
+    rows = [row[:width] + (None,) * (width - len(row)) for row in rows]
+    return pd.DataFrame.from_records(rows, columns=labels).infer_objects()
+
+def iter_sheet_chunks(source, sheet_name=0, header=0, chunk_rows=None):
+    """Yield one sheet as DataFrames of at most chunk_rows rows. .xlsx rows
+    are streamed with openpyxl and CSV rows with pandas, so only one chunk is
+    held in memory; other formats are read whole and sliced. Columns are named like pd.read_excel
+    and blank rows are skipped."""
+    chunk_rows = chunk_rows or app.config['FILTER_CHUNK_ROWS']
+    fmt = spreadsheet_format(source)
+    if fmt == 'csv':
+        resolve_sheet(source, sheet_name)
+        yield from iter_csv_chunks(source, header, chunk_rows)
+        return
+    if fmt != 'xlsx':
+        # Other formats cannot be streamed by openpyxl
+        df = read_workbook(source, sheet_name, header)
+        for start in range(0, len(df), chunk_rows):
+            yield df.iloc[start:start + chunk_rows]
+        return
+
+    with read_only_workbook(source) as workbook:
+        worksheet = workbook[resolve_sheet(source, sheet_name)]
+        header_cells = next(worksheet.iter_rows(min_row=header + 1, max_row=header + 1,
+                                                values_only=True), ())
+        labels = _header_labels(header_cells, worksheet.max_column)
+        if not labels:
+            return
+        rows = worksheet.iter_rows(min_row=header + 2, values_only=True)
+        while True:
+            with stage('read_excel'):
+                batch = list(islice(rows, chunk_rows))
+                chunk = _rows_frame([row for row in batch if any(v is not None for v in row)], labels)
+            if not batch:
+                break
+            if len(chunk):
+                yield chunk
+
+_TEMPLATE_PARTS = re.compile(r'word/(document|header\d*|footer\d*)\.xml$')
+# Parts a combined document rewrites, besides the headers and footers
+_COMBINED_PARTS = re.compile(r'\[Content_Types\]\.xml$|word/document\.xml$'
+                             r'|word/_rels/(document|header\d*|footer\d*)\.xml\.rels$')
+_RELATIONSHIP = re.compile(r'<Relationship\b[^>]*>')
+_CONTENT_TYPE_OVERRIDE = re.compile(r'<Override\b[^>]*>')
+_DRAWING_ID = re.compile(r'(<wp:docPr\b[^>]*?\bid=")(\d+)"')
+_SECTION_TYPE = re.compile(r'<w:type\b[^>]*/>')
+
+def _xml_text(value):
+    """Escape a value for a <w:t> element, keeping line breaks and tabs"""
+    text = xml_escape(str(value))
+    text = text.replace('\n', '</w:t><w:br/><w:t xml:space="preserve">')
+    return text.replace('\t', '</w:t><w:tab/><w:t xml:space="preserve">')
+
+def _xml_value(value):
+    """Escape a value for any other XML context, attribute values included"""
+    return xml_escape(str(value), {'"': '&quot;', "'": '&apos;'})
+
+def _zip_member(name, date_time, content):
+    """Deflate one archive member, returning what is needed to write its headers"""
+    compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+    compressed = compressor.compress(content) + compressor.flush()
+    year, month, day, hour, minute, second = date_time
+    return {
+        'name': name.encode('utf-8'),
+        'flags': 0 if name.isascii() else 0x800,  # UTF-8 name flag
+        'time': (hour << 11) | (minute << 5) | (second // 2),
+        'date': ((year - 1980) << 9) | (month << 5) | day,
+        'crc': zlib.crc32(content),
+        'size': len(content),
+        'data': compressed,
+    }
+
+def _write_zip(members):
+    """Assemble a ZIP archive from already-deflated members"""
+    out = io.BytesIO()
+    central = []
+    for m in members:
+        offset = out.tell()
+        out.write(struct.pack('<4s2B4HL2L2H', b'PK\x03\x04', 20, 0, m['flags'], zipfile.ZIP_DEFLATED,
+                              m['time'], m['date'], m['crc'], len(m['data']), m['size'],
+                              len(m['name']), 0))
+        out.write(m['name'])
+        out.write(m['data'])
+        central.append(struct.pack('<4s4B4HL2L5H2L', b'PK\x01\x02', 20, 0, 20, 0, m['flags'],
+                                   zipfile.ZIP_DEFLATED, m['time'], m['date'], m['crc'],
+                                   len(m['data']), m['size'], len(m['name']), 0, 0, 0, 0, 0,
+                                   offset) + m['name'])
+    central_offset = out.tell()
+    central = b''.join(central)
+    out.write(central)
+    out.write(struct.pack('<4s4H2LH', b'PK\x05\x06', 0, 0, len(members), len(members),
+                          len(central), central_offset, 0))
+    return out.getvalue()
+
+class CompiledTemplate:
+    """A .docx template analysed once for fast per-row rendering.
+
+    Runs that split a placeholder are merged, then the body, header and
+    footer XML parts are cut into literal chunks and placeholder slots.
+    Rendering a row is plain string substitution into those parts, while
+    every other part of the package is compressed once and copied from
+    memory unchanged."""
+
+    def __init__(self, template):
+        doc = docx.Document(io.BytesIO(template))
+        placeholders = extract_placeholders(doc)
+        # Replacing each placeholder with itself merges the runs it spans
+        replace_placeholders(doc, {ph: ph for ph in placeholders})
+        normalised = io.BytesIO()
+        doc.save(normalised)
+
+        self.placeholders = placeholders
+        # Archive order: precompressed members, or (name, date_time, pieces)
+        # where pieces alternate literal XML and placeholder slots
+        self.members = []
+        # (date_time, XML) of the parts render_combined() rewrites
+        self._parts = {}
+
+        self._escaped = {xml_escape(ph): ph for ph in placeholders}
+        self._alternatives = '|'.join(re.escape(e) for e in sorted(self._escaped, key=len, reverse=True))
+        self._slot_regex = re.compile(f'({self._alternatives})') if placeholders else None
+
+        with zipfile.ZipFile(normalised) as zipf:
+            for info in zipf.infolist():
+                content = zipf.read(info)
+                if _COMBINED_PARTS.match(info.filename):
+                    self._parts[info.filename] = (info.date_time, content.decode('utf-8'))
+                if _TEMPLATE_PARTS.match(info.filename):
+                    pieces = self._pieces(content.decode('utf-8'))
+                    if len(pieces) > 1:
+                        self.members.append((info.filename, info.date_time, pieces))
+                        continue
+                self.members.append(_zip_member(info.filename, info.date_time, content))
+
+    def _pieces(self, xml):
+        """Cut XML into alternating literal text and placeholder slots.
+
+        A slot is (original XML, placeholder, in_run); only slots in <w:t>
+        text may be split into runs for line breaks and tabs, those in
+        attribute values or other elements such as field codes are plainly
+        escaped."""
+        if not self._slot_regex:
+            return [xml]
+        # Values may start or end with spaces, so keep them in slot runs
+        xml = re.sub(f'<w:t>(?=[^<]*(?:{self._alternatives}))', '<w:t xml:space="preserve">', xml)
+        pieces = self._slot_regex.split(xml)
+        in_run = False
+        for i in range(1, len(pieces), 2):
+            # Placeholders hold no markup, so the last tag before a slot
+            # is in the literal text preceding it or an earlier slot's
+            literal = pieces[i - 1]
+            start = literal.rfind('<')
+            if start >= 0:
+                in_run = ('>' in literal[start:]
+                          and re.match(r'<w:t[\s>]', literal[start:]) is not None)
+            pieces[i] = (pieces[i], self._escaped[pieces[i]], in_run)
+        return pieces
+
+    @staticmethod
+    def _fill(pieces, data):
+        rendered = pieces[:]
+        rendered[1::2] = [original if ph not in data
+                          else _xml_text(data[ph]) if in_run else _xml_value(data[ph])
+                          for original, ph, in_run in pieces[1::2]]
+        return ''.join(rendered)
+
+    def render(self, data):
+        """Return the .docx bytes with every placeholder replaced from data"""
+        members = []
+        for member in self.members:
+            if isinstance(member, dict):
+                members.append(member)
+                continue
+            name, date_time, pieces = member
+            members.append(_zip_member(name, date_time, self._fill(pieces, data).encode('utf-8')))
+        return _write_zip(members)
+
+    @functools.cached_property
+    def _layout(self):
+        """The main document cut around its body content for render_combined(),
+        and the relationships of the header and footer parts that hold
+        placeholders, which every record needs a copy of"""
+        xml = self._parts['word/document.xml'][1]
+        body_start = xml.index('>', xml.index('<w:body')) + 1
+        body_end = xml.rindex('</w:body>')
+        # The body ends with the properties of its last section, unless the
+        # last <w:sectPr> found belongs to a paragraph
+        sect_start = xml.rfind('<w:sectPr', body_start, body_end)
+        if sect_start < 0 or '</w:pPr>' in xml[sect_start:body_end]:
+            sect_start = body_end
+        section = xml[sect_start:body_end]
+
+        templated = {m[0] for m in self.members if isinstance(m, tuple)}
+        varying = {}
+        _, relationships = self._parts.get('word/_rels/document.xml.rels', (None, ''))
+        for relationship in _RELATIONSHIP.findall(relationships):
+            target = re.search(r'\bTarget="([^"]*)"', relationship).group(1)
+            part = target[1:] if target.startswith('/') else f'word/{target}'
+            if part != 'word/document.xml' and part in templated:
+                rel_id = re.search(r'\bId="([^"]*)"', relationship).group(1)
+                varying[rel_id] = (part, target, relationship)
+        varying_ids = '|'.join(map(re.escape, varying))
+        drawing_ids = [int(i) for _, i in _DRAWING_ID.findall(xml)]
+        # A section break carrying the same properties; without a <w:type>
+        # the next section starts on a new page
+        section_break = (f'<w:p><w:pPr>{_SECTION_TYPE.sub("", section)}</w:pPr></w:p>' if section
+                         else '<w:p><w:r><w:br w:type="page"/></w:r></w:p>')
+        return {
+            'head': self._pieces(xml[:body_start]),
+            'body': self._pieces(xml[body_start:sect_start]),
+            'section': section,
+            'section_break': section_break,
+            'tail': self._pieces(xml[body_end:]),
+            'varying': varying,
+            'varying_ids': re.compile(f'(r:id=")({varying_ids})"') if varying else None,
+            'drawing_stride': max(drawing_ids) + 1 if drawing_ids else 0,
+        }
+
+    def render_combined(self, rows):
+        """Return one .docx holding a copy of the template per data dict in
+        rows, each in its own section starting on a new page. Headers and
+        footers with placeholders are copied for every record, and drawing
+        IDs are renumbered so they stay unique."""
+        layout = self._layout
+        varying = layout['varying']
+        templated = {m[0]: m for m in self.members if isinstance(m, tuple)}
+        first = rows[0] if rows else {}
+
+        document = [self._fill(layout['head'], first)]
+        relationships, overrides, copies = [], [], []
+        content_types = self._parts.get('[Content_Types].xml', (None, ''))[1]
+        for i, data in enumerate(rows):
+            record = self._fill(layout['body'], data)
+            record += layout['section'] if i == len(rows) - 1 else layout['section_break']
+            if varying:
+                record = layout['varying_ids'].sub(lambda m: f'{m[1]}{m[2]}_m{i}"', record)
+            if layout['drawing_stride'] and i:
+                offset = i * layout['drawing_stride']
+                record = _DRAWING_ID.sub(lambda m: f'{m[1]}{int(m[2]) + offset}"', record)
+            document.append(record)
+
+            for rel_id, (part, target, relationship) in varying.items():
+                copy = f'{part[:-4]}_m{i}.xml'
+                relationships.append(relationship.replace(f'Id="{rel_id}"', f'Id="{rel_id}_m{i}"')
+                                     .replace(f'Target="{target}"', f'Target="{target[:-4]}_m{i}.xml"'))
+                overrides.extend(o.replace(f'PartName="/{part}"', f'PartName="/{copy}"')
+                                 for o in _CONTENT_TYPE_OVERRIDE.findall(content_types)
+                                 if f'PartName="/{part}"' in o)
+                _, date_time, pieces = templated[part]
+                copies.append(_zip_member(copy, date_time, self._fill(pieces, data).encode('utf-8')))
+                part_rels = f'word/_rels/{part[5:]}.rels'
+                if part_rels in self._parts:
+                    date_time, xml = self._parts[part_rels]
+                    copies.append(_zip_member(f'word/_rels/{copy[5:]}.rels', date_time, xml.encode('utf-8')))
+        document.append(self._fill(layout['tail'], first))
+
+        rewritten = {'word/document.xml': ''.join(document)}
+        if varying:
+            rels = self._parts['word/_rels/document.xml.rels'][1]
+            rewritten['word/_rels/document.xml.rels'] = rels.replace(
+                '</Relationships>', ''.join(relationships) + '</Relationships>')
+            rewritten['[Content_Types].xml'] = content_types.replace('</Types>',
+                                                                     ''.join(overrides) + '</Types>')
+
+        members = []
+        for member in self.members:
+            name = member[0] if isinstance(member, tuple) else member['name'].decode('utf-8')
+            if name in rewritten:
+                members.append(_zip_member(name, self._parts[name][0], rewritten[name].encode('utf-8')))
+            elif isinstance(member, tuple):
+                members.append(_zip_member(name, member[1], self._fill(member[2], first).encode('utf-8')))
+            else:
+                members.append(member)
+        return _write_zip(members + copies)
+
+def render_document(template, replace_data):
+    """Render one row into .docx bytes from a CompiledTemplate or raw template bytes"""
+    if isinstance(template, CompiledTemplate):
+        with stage('render_template'):
+            return template.render(replace_data)
+    doc = docx.Document(io.BytesIO(template))
+    with stage('replace_placeholders'):
+        replace_placeholders(doc, replace_data)
+    buffer = io.BytesIO()
+    with stage('docx_save'):
+        doc.save(buffer)
+    return buffer.getvalue()
+
+class _ZipSink(io.RawIOBase):
+    """Write-only, non-seekable target that lets zipfile emit an archive in
+    pieces (zipfile then writes sizes in data descriptors after each member)"""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+def archive_compression(arcname, compresslevel):
+    """Pick the compression for one archive member. Formats that are already
+    compressed (PDF, Office files) are stored as-is."""
+    if not compresslevel or arcname.lower().endswith(app.config['ARCHIVE_STORED_EXTENSIONS']):
+        return zipfile.ZIP_STORED, None
+    return zipfile.ZIP_DEFLATED, compresslevel
+
+def compresslevel_value(value):
+    """A ZIP deflate level from a request: an integer from 0 to 9, or a form
+    field holding one. Raises ValueError otherwise, before anything is written."""
+    if isinstance(value, str) and re.fullmatch(r'\s*-?\d+\s*', value):
+        value = int(value)
+    if isinstance(value, bool) or not isinstance(value, int) or not 0 <= value <= 9:
+        raise ValueError('Μη έγκυρο επίπεδο συμπίεσης (0-9)')
+    return value
+
+def stream_zip(members, compresslevel=None):
+    """Yield a ZIP archive chunk by chunk as (arcname, bytes) members arrive,
+    so memory use does not grow with the number of members"""
+    if compresslevel is None:
+        compresslevel = app.config['ARCHIVE_COMPRESSLEVEL']
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, 'w') as zipf:
+        for arcname, content in members:
+            compress_type, level = archive_compression(arcname, compresslevel)
+            with stage('zip'):
+                zipf.writestr(arcname, content, compress_type=compress_type, compresslevel=level)
+            yield sink.drain()
+    yield sink.drain()
+
+def write_zip_stream(fileobj, members, compresslevel=None):
+    """Spool a streamed ZIP archive into a file"""
+    for chunk in stream_zip(members, compresslevel):
+        fileobj.write(chunk)
+
+class SofficeConverter:
+    """A long-lived headless LibreOffice instance with its own user profile.
+
+    Documents are converted over a UNO pipe connection when the `uno` bridge
+    is importable (the Docker image runs on the system Python for that).
+    Otherwise no instance stays up: each batch is a single command-line
+    conversion that only reuses the already initialised profile."""
+
+    def __init__(self, binary, timeout):
+        self.binary = binary
+        self.timeout = timeout
+        self.profile_dir = tempfile.mkdtemp(prefix='lo_profile_')
+        self.pipe_name = f'excel_tools_{uuid.uuid4().hex}'
+        self.process = None
+        self.desktop = None
+        try:
+            import uno  # noqa: F401  (ships with LibreOffice, not on PyPI)
+            self.use_uno = True
+        except ImportError:
+            self.use_uno = False
+
+    def _command(self, *args):
+        return [self.binary, f'-env:UserInstallation=file://{self.profile_dir}',
+                '--headless', '--invisible', '--nologo', '--norestore', *args]
+
+    def start(self):
+        if not self.use_uno:
+            return
+        import uno
+        self.process = subprocess.Popen(
+            self._command(f'--accept=pipe,name={self.pipe_name};urp;StarOffice.ComponentContext'),
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        local = uno.getComponentContext()
+        resolver = local.ServiceManager.createInstanceWithContext(
+            'com.sun.star.bridge.UnoUrlResolver', local)
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                context = resolver.resolve(
+                    f'uno:pipe,name={self.pipe_name};urp;StarOffice.ComponentContext')
+                break
+            except Exception:
+                if time.monotonic() > deadline or self.process.poll() is not None:
+                    self.stop()
+                    raise RuntimeError('Η εκκίνηση του LibreOffice απέτυχε')
+                time.sleep(0.25)
+        self.desktop = context.ServiceManager.createInstanceWithContext(
+            'com.sun.star.frame.Desktop', context)
+
+    def stop(self):
+        self.desktop = None
+        if self.process is not None:
+            self.process.kill()
+            self.process.wait()
+            self.process = None
+
+    def healthy(self):
+        if not self.use_uno:
+            return True
+        if self.process is None or self.process.poll() is not None:
+            return False
+        try:
+            self.desktop.getComponents()
+            return True
+        except Exception:
+            return False
+
+    def convert(self, docx_paths, output_dir):
+        """Convert a batch of .docx files into output_dir, restarting the
+        instance if it hangs for longer than the batch timeout"""
+        timeout = self.timeout * max(len(docx_paths), 1)
+        if not self.use_uno:
+            try:
+                subprocess.run(self._command('--convert-to', 'pdf:writer_pdf_Export',
+                                             '--outdir', output_dir, *docx_paths),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                               timeout=timeout)
+            except subprocess.TimeoutExpired:
+                # subprocess.run() has already killed the hung instance
+                raise TimeoutError('Η μετατροπή σε PDF δεν ολοκληρώθηκε εγκαίρως')
+            return
+
+        if not self.healthy():
+            self.stop()
+            self.start()
+        worker = threading.Thread(target=self._convert_uno, args=(docx_paths, output_dir), daemon=True)
+        worker.start()
+        worker.join(timeout)
+        if worker.is_alive():
+            # Killing the process unblocks the UNO call in the worker thread
+            self.stop()
+            raise TimeoutError('Η μετατροπή σε PDF δεν ολοκληρώθηκε εγκαίρως')
+
+    def _convert_uno(self, docx_paths, output_dir):
+        import uno
+        from com.sun.star.beans import PropertyValue
+
+        def prop(name, value):
+            p = PropertyValue()
+            p.Name, p.Value = name, value
+            return p
+
+        for docx_path in docx_paths:
+            pdf_path = os.path.join(output_dir, os.path.splitext(os.path.basename(docx_path))[0] + '.pdf')
+            document = self.desktop.loadComponentFromURL(
+                uno.systemPathToFileUrl(os.path.abspath(docx_path)), '_blank', 0, (prop('Hidden', True),))
+            try:
+                document.storeToURL(uno.systemPathToFileUrl(os.path.abspath(pdf_path)),
+                                    (prop('FilterName', 'writer_pdf_Export'),))
+            finally:
+                document.close(True)
+
+def soffice_binary():
+    """Path of the LibreOffice executable, or None when it is not installed"""
+    return shutil.which('soffice') or shutil.which('libreoffice')
+
+def soffice_converter_factory():
+    """Default converter factory for ConverterPool"""
+    binary = soffice_binary()
+    if binary is None:
+        raise RuntimeError('Το LibreOffice δεν είναι εγκατεστημένο')
+    return SofficeConverter(binary, app.config['PDF_CONVERT_TIMEOUT'])
+
+class ConverterPool:
+    """A fixed set of converter instances fed from a bounded job queue.
+
+    `converter_factory` returns objects with start(), stop(), healthy() and
+    convert(docx_paths, output_dir); tests can pass a stand-in when
+    LibreOffice is not installed."""
+
+    def __init__(self, size, queue_size, converter_factory=soffice_converter_factory):
+        self._jobs = queue.Queue(maxsize=queue_size)
+        self._factory = converter_factory
+        for _ in range(size):
+            threading.Thread(target=self._work, daemon=True).start()
+
+    def submit(self, docx_paths, output_dir):
+        """Queue a batch conversion (blocking while the queue is full) and
+        return a Future resolving to the PDF path of every document. A batch
+        that times out or leaves any PDF unwritten fails as a whole."""
+        future = Future()
+        self._jobs.put((future, docx_paths, output_dir))
+        return future
+
+    def _work(self):
+        converter, running = None, False
+        while True:
+            future, docx_paths, output_dir = self._jobs.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                if converter is None:
+                    converter = self._factory()
+                elif running and not converter.healthy():
+                    converter.stop()
+                    running = False
+                if not running:
+                    converter.start()
+                    running = True
+                with stage('pdf_convert'):
+                    converter.convert(docx_paths, output_dir)
+                pdf_paths = [os.path.join(output_dir, os.path.splitext(os.path.basename(p))[0] + '.pdf')
+                             for p in docx_paths]
+                missing = sum(not os.path.exists(p) for p in pdf_paths)
+                if missing:
+                    raise RuntimeError(f'Η μετατροπή σε PDF απέτυχε για {missing} από {len(pdf_paths)} έγγραφα')
+                future.set_result(pdf_paths)
+            except Exception as e:
+                # A failed batch may have left the instance hung; the next one restarts it
+                if running:
+                    converter.stop()
+                    running = False
+                future.set_exception(e)
+
+_converter_pool = None
+_converter_pool_lock = ProcessLocal(threading.Lock)
+
+def pdf_export_unavailable():
+    """Why PDFs cannot be produced on this server, or None when they can"""
+    if platform.system() == 'Windows':
+        return None if importlib.util.find_spec('docx2pdf') else 'Το docx2pdf δεν είναι εγκατεστημένο'
+    pool = _converter_pool
+    if (pool is None or pool._factory is soffice_converter_factory) and soffice_binary() is None:
+        return 'Το LibreOffice δεν είναι εγκατεστημένο'
+    return None
+
+def get_converter_pool():
+    """Return the process-wide PDF converter pool, starting it on first use"""
+    global _converter_pool
+    with _converter_pool_lock.get():
+        if _converter_pool is None:
+            _converter_pool = ConverterPool(app.config['PDF_CONVERTERS'],
+                                            app.config['PDF_CONVERT_QUEUE'])
+        return _converter_pool
+
+# Per-process state of the mail merge workers
+_merge_template = None
+
+def _init_merge_worker(template):
+    """Keep the (compiled) template in memory once per worker process"""
+    global _merge_template
+    _merge_template = template
+
+def _render_merge_chunk(chunk, export_formats, template=None, combined_name=None):
+    """Render a chunk of (base_filename, replace_data) rows and return
+    (base_filename, docx bytes, pdf bytes) in row order, or a single entry
+    named combined_name holding every row of the chunk in one document.
+    PDFs are only produced here on Windows; elsewhere the converter pool
+    handles them."""
+    template = template if template is not None else _merge_template
+    if combined_name is not None:
+        with stage('render_combined'):
+            documents = [(combined_name, template.render_combined([data for _, data in chunk]))]
+    else:
+        documents = ((base_filename, render_document(template, replace_data))
+                     for base_filename, replace_data in chunk)
+    outputs = []
+    temp_dir = tempfile.mkdtemp()
+    try:
+        for i, (base_filename, docx_bytes) in enumerate(documents):
+            pdf_bytes = None
+
+            if export_formats.get('pdf') and platform.system() == 'Windows':
+                docx_path = os.path.join(temp_dir, f'{i}.docx')
+                pdf_path = os.path.join(temp_dir, f'{i}.pdf')
+                with open(docx_path, 'wb') as f:
+                    f.write(docx_bytes)
+                # Word is only reachable through docx2pdf, and only on Windows
+                from docx2pdf import convert
+                with stage('pdf_convert'):
+                    convert(docx_path, pdf_path)
+                if os.path.exists(pdf_path):
+                    with open(pdf_path, 'rb') as f:
+                        pdf_bytes = f.read()
+
+            outputs.append((base_filename, docx_bytes, pdf_bytes))
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+    return outputs
+
+def _render_merge_chunk_pooled(chunk, export_formats, combined_name=None):
+    """_render_merge_chunk in a pool worker, returning the chunk's stages
+    too so the parent process can record them"""
+    with collect_stages() as stages:
+        outputs = _render_merge_chunk(chunk, export_formats, combined_name=combined_name)
+    return outputs, stages
+
+def _submit_pdf_batch(rendered):
+    """Hand a rendered chunk to the converter pool"""
+    temp_dir = tempfile.mkdtemp(dir=app.config['UPLOAD_FOLDER'])
+    docx_paths = []
+    for i, (_, docx_bytes, _) in enumerate(rendered):
+        docx_path = os.path.join(temp_dir, f'{i}.docx')
+        with open(docx_path, 'wb') as f:
+            f.write(docx_bytes)
+        docx_paths.append(docx_path)
+    return rendered, temp_dir, get_converter_pool().submit(docx_paths, temp_dir)
+
+def _collect_pdf_batch(rendered, temp_dir, future):
+    try:
+        pdf_paths = future.result()
+        outputs = []
+        for (base_filename, docx_bytes, _), pdf_path in zip(rendered, pdf_paths):
+            with open(pdf_path, 'rb') as f:
+                outputs.append((base_filename, docx_bytes, f.read()))
+        return outputs
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+def _merge_process_context():
+    """Start method of the merge processes. A fork of this multi-threaded
+    server would copy every lock in whatever state another thread left it,
+    so the workers are forked from a clean forkserver instead, which
+    imports this module once (spawned where there is no forkserver)."""
+    if 'forkserver' not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('spawn')
+    context = multiprocessing.get_context('forkserver')
+    if __name__ != '__main__':
+        context.set_forkserver_preload([__name__])
+    return context
+
+def _render_chunks(template, chunks, export_formats, workers, combined_names=None):
+    """Yield the rendered chunks in order, using a process pool when useful"""
+    combined_names = combined_names or [None] * len(chunks)
+    if workers <= 1 or len(chunks) <= 1:
+        for chunk, combined_name in zip(chunks, combined_names):
+            yield _render_merge_chunk(chunk, export_formats, template, combined_name)
+        return
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(chunks)),
+                             mp_context=_merge_process_context(),
+                             initializer=_init_merge_worker,
+                             initargs=(template,)) as executor:
+        # map() returns results in submission order
+        for outputs, stages in executor.map(_render_merge_chunk_pooled, chunks,
+                                            [export_formats] * len(chunks), combined_names):
+            for name, seconds, allocated in stages:
+                record_stage(name, seconds, allocated)
+            yield outputs
+
+class MergeCache:
+    """Rendered mail merge documents kept between runs, so re-running a merge
+    after a few rows of the sheet changed only renders and converts those.
+
+    Each document is stored in `folder` under the hash of what it is rendered
+    from: the template, the mapping and the row's values. The manifest of a
+    merge, identified by its template, source sheet (name, header row and
+    columns, but not the rows, which are what a re-run may change), mapping
+    and key column, records the hash behind every output name of its last
+    run, which the next run is compared with.
+    Manifests live in SQLite next to the jobs, so every worker process sees
+    them."""
+
+    def __init__(self, folder, database, max_disk):
+        self.folder = folder
+        self.database = database
+        self.max_disk = max_disk
+        os.makedirs(folder, exist_ok=True)
+        with self._connect() as db:
+            db.execute("""CREATE TABLE IF NOT EXISTS merge_manifests (
+                merge_id TEXT, name TEXT, output_hash TEXT, updated_at REAL,
+                PRIMARY KEY (merge_id, name))""")
+
+    @contextmanager
+    def _connect(self):
+        db = sqlite3.connect(self.database, timeout=30)
+        db.row_factory = sqlite3.Row
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def _path(self, output_hash, extension):
+        return os.path.join(self.folder, f'{output_hash}.{extension}')
+
+    def plan(self, template, rows, mappings, key_column, export_formats, source):
+        """Hash the documents of a one-file-per-row merge and compare them with
+        the last run of the same merge. Returns the merge ID, the hash of each
+        row, the indexes of the rows whose documents are cached and a summary:
+        outputs added, changed, unchanged and removed since the last run, and
+        how many are rendered now or reused."""
+        base = hashlib.sha256(template)
+        base.update(json.dumps(mappings, sort_keys=True).encode('utf-8'))
+        hashes = []
+        for _, replace_data in rows:
+            row_hash = base.copy()
+            row_hash.update(json.dumps(replace_data, sort_keys=True).encode('utf-8'))
+            hashes.append(row_hash.hexdigest())
+
+        extensions = [fmt for fmt in ('docx', 'pdf') if export_formats.get(fmt)]
+        cached = {i for i, output_hash in enumerate(hashes)
+                  if all(os.path.exists(self._path(output_hash, ext)) for ext in extensions)}
+
+        merge_id = hashlib.sha256(json.dumps(
+            [hashlib.sha256(template).hexdigest(), source, mappings, key_column],
+            sort_keys=True, default=str).encode('utf-8')).hexdigest()
+        with self._connect() as db:
+            previous = {row['name']: row['output_hash'] for row in db.execute(
+                'SELECT name, output_hash FROM merge_manifests WHERE merge_id = ?', (merge_id,))}
+        names = [name for name, _ in rows]
+        added = sum(name not in previous for name in names)
+        unchanged = sum(previous.get(name) == output_hash for name, output_hash in zip(names, hashes))
+        return {
+            'merge_id': merge_id,
+            'hashes': hashes,
+            'cached': cached,
+            'summary': {
+                'added': added,
+                'changed': len(rows) - added - unchanged,
+                'unchanged': unchanged,
+                'removed': len(previous.keys() - set(names)),
+                'rendered': len(rows) - len(cached),
+                'reused': len(cached),
+            },
+        }
+
+    def load(self, output_hash, export_formats):
+        """(docx bytes, pdf bytes) of a cached document in the wanted formats,
+        or None if it has been evicted since the merge was planned"""
+        contents = []
+        for ext in ('docx', 'pdf'):
+            content = None
+            if export_formats.get(ext):
+                path = self._path(output_hash, ext)
+                try:
+                    with open(path, 'rb') as f:
+                        content = f.read()
+                    os.utime(path)  # Mark as recently used for eviction
+                except OSError:
+                    return None
+            contents.append(content)
+        return tuple(contents)
+
+    def store(self, output_hash, docx_bytes, pdf_bytes):
+        for ext, content in (('docx', docx_bytes), ('pdf', pdf_bytes)):
+            if content is None:
+                continue
+            path = self._path(output_hash, ext)
+            # Other worker processes never see a half-written document
+            temp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+            with open(temp_path, 'wb') as f:
+                f.write(content)
+            os.replace(temp_path, path)
+
+    def save_manifest(self, plan, rows):
+        """Record the outputs of a finished merge for its next run"""
+        now = time.time()
+        with self._connect() as db:
+            db.execute('DELETE FROM merge_manifests WHERE merge_id = ?', (plan['merge_id'],))
+            db.executemany('INSERT INTO merge_manifests VALUES (?, ?, ?, ?)',
+                           [(plan['merge_id'], name, output_hash, now)
+                            for (name, _), output_hash in zip(rows, plan['hashes'])])
+        self._evict()
+
+    def _evict(self):
+        # Documents another process is still writing (.tmp) are not evicted;
+        # sweep() removes abandoned ones with the expired documents
+        entries = []
+        for name in os.listdir(self.folder):
+            if name.endswith('.tmp'):
+                continue
+            path = os.path.join(self.folder, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_disk:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+    def sweep(self, cutoff):
+        """Forget manifests of merges not run since cutoff and delete the
+        documents not used since then, which hold the sheet's data"""
+        with self._connect() as db:
+            db.execute('DELETE FROM merge_manifests WHERE updated_at < ?', (cutoff,))
+        for entry in os.scandir(self.folder):
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+            except OSError:
+                pass
+
+merge_cache = MergeCache(app.config['MERGE_CACHE_FOLDER'], app.config['JOBS_DATABASE'],
+                         app.config['MERGE_CACHE_DISK'])
+
+def combined_file_names(row_count, records_per_file=None):
+    """Base names of the combined mail merge documents for row_count rows,
+    records_per_file (all of them when not given) to a document"""
+    records_per_file = records_per_file or max(row_count, 1)
+    if row_count <= records_per_file:
+        return ['merged_documents']
+    width = len(str(row_count))
+    return [f'merged_documents_{start + 1:0{width}d}-{min(start + records_per_file, row_count):0{width}d}'
+            for start in range(0, row_count, records_per_file)]
+
+def _merge_chunks(template, chunks, export_formats, workers, combined_names=None):
+    """Yield the (base_filename, docx bytes, pdf bytes) outputs of each chunk
+    in order, passed through the PDF converter pool when PDFs are wanted"""
+    use_pool = export_formats.get('pdf') and platform.system() != 'Windows'
+    pending = deque()
+    for rendered in _render_chunks(template, chunks, export_formats, workers, combined_names):
+        if not use_pool:
+            yield rendered
+            continue
+        # Keep every converter busy while bounding the batches held in memory
+        pending.append(_submit_pdf_batch(rendered))
+        while len(pending) > app.config['PDF_CONVERTERS']:
+            yield _collect_pdf_batch(*pending.popleft())
+
+    while pending:
+        yield _collect_pdf_batch(*pending.popleft())
+
+def merge_documents(template, rows, export_formats, workers=None, progress=None,
+                    combine=False, records_per_file=None, plan=None):
+    """Render the mail merge for every (base_filename, replace_data) row,
+    spreading chunks of rows over a process pool. Yields (archive name,
+    file bytes) in row order and reports progress(rows done, total rows).
+
+    With combine, the rows become the pages of combined documents of at most
+    records_per_file records each (one document when not given), so each
+    document is saved and converted to PDF once. Otherwise a plan from
+    merge_cache.plan() limits rendering to the rows whose documents are not
+    cached, and the run is recorded for the next one once it completes."""
+    workers = workers or app.config['MERGE_WORKERS']
+    if combine:
+        chunk_size = records_per_file or max(len(rows), 1)
+        combined_names = combined_file_names(len(rows), records_per_file)
+        template = CompiledTemplate(template)
+    else:
+        chunk_size = app.config['MERGE_CHUNK_SIZE']
+        combined_names = None
+        if app.config['MERGE_COMPILED_TEMPLATE']:
+            template = CompiledTemplate(template)
+
+    def members(base_filename, docx_bytes, pdf_bytes):
+        if export_formats.get('docx'):
+            yield f"{base_filename}.docx", docx_bytes
+        if pdf_bytes is not None:
+            yield f"{base_filename}.pdf", pdf_bytes
+
+    if plan is None:
+        chunks = [rows[i:i + chunk_size] for i in range(0, len(rows), chunk_size)]
+        rows_done = 0
+        for chunk, rendered in zip(chunks, _merge_chunks(template, chunks, export_formats, workers,
+                                                         combined_names)):
+            for output in rendered:
+                yield from members(*output)
+            rows_done += len(chunk)
+            if progress:
+                progress(rows_done, len(rows))
+        return
+
+    # Only the rows missing from the cache are rendered, in order, and
+    # interleaved with the cached documents as the output is written
+    missing = [row for i, row in enumerate(rows) if i not in plan['cached']]
+    chunks = [missing[i:i + chunk_size] for i in range(0, len(missing), chunk_size)]
+    rendered = (output for outputs in _merge_chunks(template, chunks, export_formats, workers)
+                for output in outputs)
+    for i, (base_filename, replace_data) in enumerate(rows):
+        output_hash = plan['hashes'][i]
+        cached = None
+        if i in plan['cached']:
+            with stage('merge_cache'):
+                cached = merge_cache.load(output_hash, export_formats)
+        if cached is not None:
+            docx_bytes, pdf_bytes = cached
+        else:
+            if i in plan['cached']:
+                # Evicted since the merge was planned
+                outputs = next(_merge_chunks(template, [[(base_filename, replace_data)]], export_formats, 1))
+                _, docx_bytes, pdf_bytes = outputs[0]
+            else:
+                _, docx_bytes, pdf_bytes = next(rendered)
+            with stage('merge_cache'):
+                merge_cache.store(output_hash, docx_bytes, pdf_bytes)
+        yield from members(base_filename, docx_bytes, pdf_bytes)
+        if progress:
+            progress(i + 1, len(rows))
+    merge_cache.save_manifest(plan, rows)
+
+def get_column_names(file_path, sheet_name=0, header=0):
+    try:
+        return get_workbook_info(file_path, sheet_name, header)['columns']
+    except Exception as e:
+        return []
+
+def _format_like_pandas(values, has_missing):
+    """Stringify raw cell values the way df[column].astype(str) would: a numeric
+    column with blanks or any float is read by pandas as float64"""
+    numeric = all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values)
+    if numeric and (has_missing or any(isinstance(v, float) for v in values)):
+        return [str(float(v)) for v in values]
+    return [str(v) for v in values]
+
+def get_column_values(source, column, limit=None, sheet_name=0, header=0):
+    """Return the distinct values of one column, streamed in a single pass,
+    and whether they were truncated to the `limit` most frequent ones"""
+    limit = limit or app.config['COLUMN_VALUES_LIMIT']
+    counts = Counter()
+    has_missing = False
+
+    if not _is_xlsx(source) or column == SHEET_COLUMN:
+        df = read_selection(source, sheet_name, header, column)
+        if column not in df.columns:
+            return [], False
+        has_missing = bool(df[column].isna().any())
+        counts.update(df[column].dropna().tolist())
+    else:
+        names = get_sheet_names(source) if sheet_name == ALL_SHEETS else [resolve_sheet(source, sheet_name)]
+        with read_only_workbook(source) as workbook:
+            for name in names:
+                worksheet = workbook[name]
+                header_cells = next(worksheet.iter_rows(min_row=header + 1, max_row=header + 1,
+                                                        values_only=True), ())
+                labels = [str(label) for label in _header_labels(header_cells, worksheet.max_column)]
+                if str(column) not in labels:
+                    continue
+
+                col_idx = labels.index(str(column)) + 1
+                for (value,) in worksheet.iter_rows(min_row=header + 2, min_col=col_idx,
+                                                    max_col=col_idx, values_only=True):
+                    if value is None:
+                        has_missing = True
+                    else:
+                        counts[value] += 1
+
+    truncated = len(counts) > limit
+    # Counter keeps first-seen order, matching Series.unique() when nothing is cut
+    values = [value for value, _ in counts.most_common(limit)] if truncated else list(counts)
+    return _format_like_pandas(values, has_missing), truncated
+
+def _json_values(values):
+    """Cell values as JSON-ready Python values: blanks become None, dates ISO
+    8601 strings and anything else unknown to JSON its str()"""
+    return json.loads(pd.Series(list(values), dtype=object).to_json(
+        orient='values', date_format='iso', date_unit='s', double_precision=15, default_handler=str))
+
+def preview_rows(source, sheet_name, header=0, offset=0, limit=None, digest=None):
+    """(columns, rows offset:offset + limit as lists, row count) of a sheet
+    named by resolve_sheet(). The window comes from the workbook cache, so
+    the file is parsed at most once and later pages cost the same however
+    deep into the sheet they are."""
+    limit = limit or app.config['PREVIEW_PAGE_ROWS']
+    digest = digest or file_digest(source)
+    window = workbook_cache.get_window(_sheet_key(digest, sheet_name, header), offset, offset + limit)
+    if window is None:
+        df = read_workbook(source, sheet_name, header, digest)
+        window = df.iloc[offset:offset + limit], len(df)
+    df, row_count = window
+    rows = json.loads(df.to_json(orient='values', date_format='iso', date_unit='s',
+                                 double_precision=15, default_handler=str))
+    return _json_values(df.columns), rows, row_count
+
+def estimate_distinct(values, precision=14):
+    """HyperLogLog estimate of the number of distinct values in a Series,
+    from their 64-bit pandas hashes and 2**precision registers (about 0.8%
+    standard error at 14), with linear counting for small counts"""
+    if not len(values):
+        return 0
+    hashes = pd.util.hash_pandas_object(values, index=False).to_numpy()
+    registers = 1 << precision
+    # The top bits pick a register, which keeps the longest run of leading
+    # zeros (+1) seen in the remaining bits
+    index = (hashes >> np.uint64(64 - precision)).astype(np.intp)
+    rest = hashes & np.uint64((1 << (64 - precision)) - 1)
+    _, bit_length = np.frexp(rest.astype(np.float64))
+    ranks = np.zeros(registers, dtype=np.int8)
+    np.maximum.at(ranks, index, (64 - precision + 1 - bit_length).astype(np.int8))
+
+    alpha = 0.7213 / (1 + 1.079 / registers)
+    estimate = alpha * registers ** 2 / np.exp2(-ranks.astype(np.float64)).sum()
+    empty = int(np.count_nonzero(ranks == 0))
+    if estimate <= 2.5 * registers and empty:
+        estimate = registers * np.log(registers / empty)
+    return int(round(estimate))
+
+def column_statistics(values):
+    """dtype, blanks, estimated distinct values, smallest and largest value
+    (where the values can be ordered) and a few sample values of a column"""
+    present = values.dropna()
+    low = high = None
+    if len(present):
+        try:
+            low, high = present.min(), present.max()
+        except TypeError:
+            pass  # Mixed text and numbers have no order
+    samples = pd.unique(present.head(1000).to_numpy())[:app.config['PREVIEW_SAMPLES']]
+    low, high, *samples = _json_values([low, high, *samples])
+    return {'dtype': str(values.dtype), 'nulls': int(len(values) - len(present)),
+            'distinct': estimate_distinct(present), 'min': low, 'max': high, 'samples': samples}
+
+def sheet_statistics(source, sheet_name, header=0, digest=None):
+    """Row count and column_statistics() of every column of a sheet named by
+    resolve_sheet(), computed once per upload and kept in the workbook cache
+    next to the parsed sheet"""
+    digest = digest or file_digest(source)
+    key = _sheet_key(digest, sheet_name, header)
+    stats = workbook_cache.get_json(key, 'stats')
+    if stats is None:
+        df = read_workbook(source, sheet_name, header, digest)
+        with stage('column_stats'):
+            stats = {'row_count': len(df),
+                     'columns': [{'name': name, **column_statistics(df.iloc[:, i])}
+                                 for i, name in enumerate(_json_values(df.columns))]}
+        workbook_cache.put_json(key, 'stats', stats)
+    return stats
+
+OUTPUT_EXTENSIONS = {'xlsx': '.xlsx', 'xlsx-stream': '.xlsx', 'csv': '.csv', 'parquet': '.parquet'}
+
+def choose_output_format(row_count, requested=None):
+    """Validate a requested output format, or pick one by the number of rows"""
+    if requested and requested != 'auto':
+        if requested not in OUTPUT_EXTENSIONS:
+            raise ValueError(f'Άγνωστη μορφή αρχείου: {requested}')
+        if requested == 'parquet' and not HAS_PYARROW:
+            raise ValueError('Η μορφή Parquet απαιτεί το πακέτο pyarrow')
+        return requested
+    return 'xlsx-stream' if row_count > app.config['OUTPUT_STREAM_ROWS'] else 'xlsx'
+
+def _cell_rows(df):
+    """Rows of plain Python values, with blanks for missing values"""
+    return df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+
+class OutputWriter:
+    """Write named sheets of DataFrames to one output file. A sheet can be
+    appended to over several write() calls.
+
+    'xlsx' uses pandas' openpyxl writer. 'xlsx-stream' is a constant-memory
+    writer: xlsxwriter when it is installed, openpyxl's write-only mode
+    otherwise. 'csv' and 'parquet' write one file per sheet, zipped together
+    when there is more than one sheet. The extension of `path` is replaced to
+    match the format; close() returns the final path."""
+
+    def __init__(self, path, fmt='xlsx'):
+        self.format = fmt
+        self.base = os.path.splitext(path)[0]
+        self.path = self.base + OUTPUT_EXTENSIONS[fmt]
+        self._sheets = {}  # sheet name -> rows written, worksheet or frames
+        if fmt == 'xlsx':
+            self._book = pd.ExcelWriter(self.path)
+        elif fmt == 'xlsx-stream' and HAS_XLSXWRITER:
+            self._book = xlsxwriter.Workbook(self.path, {
+                'constant_memory': True,
+                'default_date_format': 'yyyy-mm-dd hh:mm:ss',
+                'remove_timezone': True,
+                'nan_inf_to_errors': True,
+            })
+        elif fmt == 'xlsx-stream':
+            self._book = openpyxl.Workbook(write_only=True)
+        else:
+            self._dir = tempfile.mkdtemp(dir=os.path.dirname(self.path) or '.')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        elif self.format in ('csv', 'parquet'):
+            shutil.rmtree(self._dir, ignore_errors=True)
+
+    @stage('write_output')
+    def write(self, sheet, df):
+        first = sheet not in self._sheets
+        if self.format == 'xlsx':
+            next_row = self._sheets.get(sheet, 0)
+            df.to_excel(self._book, sheet_name=sheet, index=False, header=first, startrow=next_row)
+            self._sheets[sheet] = next_row + len(df) + first
+        elif self.format == 'xlsx-stream' and HAS_XLSXWRITER:
+            if first:
+                worksheet = self._book.add_worksheet(sheet)
+                worksheet.write_row(0, 0, [str(c) for c in df.columns])
+                self._sheets[sheet] = [worksheet, 1]
+            worksheet, next_row = self._sheets[sheet]
+            for row in _cell_rows(df):
+                worksheet.write_row(next_row, 0, row)
+                next_row += 1
+            self._sheets[sheet][1] = next_row
+        elif self.format == 'xlsx-stream':
+            if first:
+                worksheet = self._book.create_sheet(sheet)
+                worksheet.append([str(c) for c in df.columns])
+                self._sheets[sheet] = worksheet
+            for row in _cell_rows(df):
+                self._sheets[sheet].append(row)
+        elif self.format == 'csv':
+            self._sheets[sheet] = True
+            # The BOM lets Excel detect UTF-8 (Greek text) when opening the file
+            df.to_csv(self._sheet_path(sheet), mode='a', header=first, index=False,
+                      encoding='utf-8-sig' if first else 'utf-8')
+        else:
+            # Parquet needs one schema per file, so frames are combined at close()
+            self._sheets.setdefault(sheet, []).append(df)
+
+    def _sheet_path(self, sheet):
+        return os.path.join(self._dir, f'{sheet}{OUTPUT_EXTENSIONS[self.format]}')
+
+    @stage('write_output')
+    def close(self):
+        if self.format == 'xlsx':
+            self._book.close()
+        elif self.format == 'xlsx-stream':
+            if HAS_XLSXWRITER:
+                self._book.close()
+            else:
+                self._book.save(self.path)
+        else:
+            if self.format == 'parquet':
+                for sheet, frames in self._sheets.items():
+                    combined = pd.concat(frames, ignore_index=True)
+                    combined.columns = [str(c) for c in combined.columns]
+                    combined.to_parquet(self._sheet_path(sheet), index=False)
+
+            sheets = list(self._sheets)
+            if len(sheets) == 1:
+                shutil.move(self._sheet_path(sheets[0]), self.path)
+            else:
+                self.path = self.base + '.zip'
+                with zipfile.ZipFile(self.path, 'w', zipfile.ZIP_DEFLATED) as zipf:
+                    for sheet in sheets:
+                        zipf.write(self._sheet_path(sheet), os.path.basename(self._sheet_path(sheet)))
+            shutil.rmtree(self._dir, ignore_errors=True)
+        return self.path
+
+def write_frames(path, frames, fmt='xlsx'):
+    """Write {sheet name: DataFrame} through an OutputWriter and return the path"""
+    with OutputWriter(path, fmt) as writer:
+        for sheet, df in frames.items():
+            writer.write(sheet, df)
+    return writer.path
+
+COMPARE_SHEETS = ('Όχι στο αρχείο 2', 'Όχι στο αρχείο 1', 'Κοινά', 'Διαφορές')
+
+def key_columns(columns):
+    """Accept a single key column or a list of them (composite key)"""
+    return list(columns) if isinstance(columns, (list, tuple)) else [columns]
+
+def key_index(df, columns):
+    """Hashable key per row: an Index for one column, a MultiIndex for several"""
+    if len(columns) == 1:
+        return pd.Index(df[columns[0]])
+    return pd.MultiIndex.from_frame(df[columns])
+
+def missing_keys(df, columns):
+    """Rows with a blank in any key column. A blank key matches nothing,
+    not even another blank, so these rows are always unmatched."""
+    return df[columns].isna().any(axis=1).to_numpy()
+
+def _cells_equal(value1, value2):
+    """Element-wise equality of two aligned columns whatever dtype pandas gave
+    each file's column: one text cell turns a whole column into object, so 0
+    and '0' compare as numbers where both sides parse, anything else by its
+    text, and blanks equal blanks"""
+    both_blank = value1.isna() & value2.isna()
+    if value1.dtype == value2.dtype and value1.dtype != object:
+        return value1.eq(value2) | both_blank
+    number1 = pd.to_numeric(value1, errors='coerce')
+    number2 = pd.to_numeric(value2, errors='coerce')
+    numeric = number1.notna() & number2.notna()
+    equal = numeric & number1.eq(number2)
+    text = ~numeric & value1.notna() & value2.notna()
+    equal[text] = value1[text].astype(str).to_numpy() == value2[text].astype(str).to_numpy()
+    return equal | both_blank
+
+def _modified_cells(left, right, left_keys, right_keys, cols1, cols2):
+    """Cell-level differences of the shared non-key columns between rows with
+    the same key (the first row per key on each side), one row per change"""
+    first = ~left_keys.duplicated()
+    left, left_keys = left[first], left_keys[first]
+    first = ~right_keys.duplicated()
+    right, right_keys = right[first], right_keys[first]
+    positions = right_keys.get_indexer(left_keys)
+
+    keys = left[cols1].reset_index(drop=True)
+    common = [c for c in left.columns if c in right.columns and c not in cols1 and c not in cols2]
+    diffs = []
+    for column in common:
+        value1 = left[column].reset_index(drop=True)
+        value2 = right[column].iloc[positions].reset_index(drop=True)
+        changed = ~_cells_equal(value1, value2)
+        if changed.any():
+            diff = keys[changed].copy()
+            diff['Στήλη'] = column
+            diff['Τιμή αρχείου 1'] = value1[changed]
+            diff['Τιμή αρχείου 2'] = value2[changed]
+            diffs.append(diff)
+
+    if not diffs:
+        return pd.DataFrame(columns=[*cols1, 'Στήλη', 'Τιμή αρχείου 1', 'Τιμή αρχείου 2'])
+    # Keep the changes of a row together, in file 1 order
+    return pd.concat(diffs).sort_index(kind='stable').reset_index(drop=True)
+
+@stage('compare')
+def _compare_frames(df1, df2, cols1, cols2):
+    """Return the frames of COMPARE_SHEETS for two inputs. A row with a blank
+    key is never the same record as another, so it is listed as missing
+    from the other file."""
+    # One hash index per side; isin() probes it instead of rescanning
+    keys1 = key_index(df1, cols1)
+    keys2 = key_index(df2, cols2)
+    in_file2 = keys1.isin(keys2) & ~missing_keys(df1, cols1)
+    in_file1 = keys2.isin(keys1) & ~missing_keys(df2, cols2)
+    modified = _modified_cells(df1[in_file2], df2[in_file1], keys1[in_file2], keys2[in_file1],
+                               cols1, cols2)
+    return df1[~in_file2], df2[~in_file1], df1[in_file2], modified
+
+def _canonical_keys(df, columns):
+    """Key values as strings that agree whenever isin() would consider the
+    keys equal (1 and 1.0 alike), for hash partitioning"""
+    canonical = {}
+    for i, column in enumerate(columns):
+        series = df[column]
+        numeric = pd.to_numeric(series, errors='coerce')
+        canonical[i] = series.astype(str).where(numeric.isna(), numeric.astype('float64').astype(str))
+    return pd.DataFrame(canonical)
+
+def partition_ids(df, columns, partitions):
+    """Assign each row to a hash partition of its key"""
+    hashes = pd.util.hash_pandas_object(_canonical_keys(df, columns), index=False).to_numpy()
+    return hashes % np.uint64(partitions)
+
+def estimate_sheet_size(source, sheet_name=0, header=0):
+    """Bytes a sheet is expected to take in memory once parsed, from its
+    header row and row count alone, so that it can be held against a memory
+    budget before anything is loaded"""
+    info = get_workbook_info(source, sheet_name, header)
+    if info['row_count'] is None:
+        # An .xlsx without a <dimension>: parsed cells take about ten times their zipped bytes
+        return os.path.getsize(source) * 10
+    return info['row_count'] * len(info['columns']) * app.config['CELL_MEMORY_ESTIMATE']
 
-def replace_placeholders(doc, data):
-    def _process_paragraph(paragraph, data):
-        runs = paragraph.runs
-        text = ''.join([run.text for run in runs])
+def spill_partitions(source, sheet_name, header, columns, partitions, folder, prefix, prepare=None):
+    """Stream a sheet chunk by chunk into `partitions` hash partitions of its
+    key columns, as pickles under folder, and return a function reading
+    partition p back as one frame. The sheet is never held whole, nor put in
+    the workbook cache; .xls and .ods, which cannot be streamed, are the
+    exception. `prepare` may add columns to each chunk first."""
+    files = [[] for _ in range(partitions)]
+    empty = pd.DataFrame(columns=columns)
+    for i, chunk in enumerate(iter_sheet_chunks(source, sheet_name, header)):
+        chunk = prepare(chunk) if prepare else chunk
+        empty = chunk.iloc[:0] if i == 0 else empty
+        ids = partition_ids(chunk, columns, partitions)
+        for p in np.unique(ids):
+            path = os.path.join(folder, f'{prefix}_{p}_{i}.pkl')
+            chunk[ids == p].to_pickle(path)
+            files[p].append(path)
 
-        for ph, val in data.items():
-            if ph not in text:
-                continue
+    def read(p):
+        if not files[p]:
+            return empty.copy()
+        return pd.concat([pd.read_pickle(path) for path in files[p]], ignore_index=True)
+    return read
 
-            start_idx = 0
-            while True:
-                start_idx = text.find(ph, start_idx)
-                if start_idx == -1:
-                    break
+def compare_files(file1_path, file2_path, col1, col2, output_path=None, progress=None,
+                  output_format=None, sheets=(0, 0), headers=(0, 0)):
+    """Compare two files on one or more key columns. Besides the rows missing
+    from either side and the common rows, a sheet lists the changed values of
+    the shared columns. Inputs expected to exceed COMPARE_MEMORY_BUDGET once
+    parsed are streamed to disk in hash partitions instead of being loaded,
+    and compared one partition at a time."""
+    progress = progress or (lambda done, total: None)
+    cols1, cols2 = key_columns(col1), key_columns(col2)
+    size = (estimate_sheet_size(file1_path, sheets[0], headers[0])
+            + estimate_sheet_size(file2_path, sheets[1], headers[1]))
+    # The key indexes, masks and diff need a few times the input size
+    partitions = int(size * 3 // app.config['COMPARE_MEMORY_BUDGET']) + 1
+    
+    # Create output file
+    output_path = output_path or os.path.join(workspaces.create(), 'comparison_result.xlsx')
+    if partitions == 1:
+        df1 = read_workbook(file1_path, sheets[0], headers[0])
+        df2 = read_workbook(file2_path, sheets[1], headers[1])
+        with OutputWriter(output_path, choose_output_format(len(df1) + len(df2), output_format)) as writer:
+            progress(1, 2)
+            for sheet, frame in zip(COMPARE_SHEETS, _compare_frames(df1, df2, cols1, cols2)):
+                writer.write(sheet, frame)
+            progress(2, 2)
+        return writer.path
 
-                current_pos = 0
-                start_run = None
-                end_run = None
+    spill_dir = tempfile.mkdtemp(dir=os.path.dirname(output_path))
+    try:
+        with stage('partition'):
+            read1 = spill_partitions(file1_path, sheets[0], headers[0], cols1, partitions, spill_dir, '1')
+            read2 = spill_partitions(file2_path, sheets[1], headers[1], cols2, partitions, spill_dir, '2')
+        # Inputs past the budget call for the constant-memory writer
+        with OutputWriter(output_path, choose_output_format(float('inf'), output_format)) as writer:
+            for p in range(partitions):
+                for sheet, frame in zip(COMPARE_SHEETS, _compare_frames(read1(p), read2(p), cols1, cols2)):
+                    writer.write(sheet, frame)
+                progress(p + 1, partitions)
+    finally:
+        shutil.rmtree(spill_dir, ignore_errors=True)
+    return writer.path
 
-                for i, run in enumerate(runs):
-                    run_end = current_pos + len(run.text)
-                    if current_pos <= start_idx < run_end:
-                        start_run = i
-                    if current_pos <= (start_idx + len(ph)) <= run_end:
-                        end_run = i
-                        break
-                    current_pos = run_end
+JOIN_TYPES = ('inner', 'left', 'right', 'outer', 'anti')
 
-                if start_run is not None and end_run is not None:
-                    merged_text = ''.join(run.text for run in runs[start_run:end_run + 1])
-                    replaced_text = merged_text.replace(ph, str(val))
-                    runs[start_run].text = replaced_text
-                    for run in runs[start_run + 1:end_run + 1]:
-                        run.text = ""
+class JoinFanOut(Exception):
+    """Raised when keys repeated in both files would multiply the joined rows"""
 
-                start_idx += len(ph)
+    def __init__(self, estimated_rows):
+        super().__init__(f'Η συγχώνευση θα δημιουργήσει περίπου {estimated_rows} γραμμές')
+        self.estimated_rows = estimated_rows
 
-    for paragraph in doc.paragraphs:
-        _process_paragraph(paragraph, data)
+def normalise_key(series, options):
+    """Normalise join key values: 'trim' strips whitespace, 'casefold'
+    ignores case and 'numeric' makes 123, 123.0 and "123" equal"""
+    key = series
+    if 'trim' in options or 'casefold' in options:
+        key = key.where(key.isna(), key.astype(str))
+        if 'trim' in options:
+            key = key.str.strip()
+        if 'casefold' in options:
+            key = key.str.casefold()
+    if 'numeric' in options:
+        numeric = pd.to_numeric(key, errors='coerce')
+        key = numeric.astype(object).where(numeric.notna(), key)
+    return key
 
-    for table in doc.tables:
-        for row in table.rows:
-            for cell in row.cells:
-                for paragraph in cell.paragraphs:
-                    _process_paragraph(paragraph, data)
+def _with_join_keys(df, columns, normalise):
+    """Copy of df with the normalised key columns added as __key0, __key1, ..."""
+    keyed = df.copy(deep=False)
+    for i, column in enumerate(columns):
+        keyed[f'__key{i}'] = normalise_key(df[column], normalise)
+    return keyed
 
-    for section in doc.sections:
-        for paragraph in section.header.paragraphs:
-            _process_paragraph(paragraph, data)
-        for paragraph in section.footer.paragraphs:
-            _process_paragraph(paragraph, data)
+def join_row_counts(left, right, keys):
+    """[matched pairs, matched left rows, matched right rows, left rows,
+    right rows] of a join, from the key frequencies. Equal keys fall in the
+    same hash partition, so the counts of partitions add up."""
+    counts1 = left[~missing_keys(left, keys)].groupby(keys).size()
+    counts2 = right[~missing_keys(right, keys)].groupby(keys).size()
+    both = pd.concat([counts1, counts2], axis=1, join='inner')
+    return [int((both[0] * both[1]).sum()), int(both[0].sum()), int(both[1].sum()), len(left), len(right)]
 
-def get_column_names(file_path):
-    try:
-        df = pd.read_excel(file_path)
-        return df.columns.tolist()
-    except Exception as e:
-        return []
+def estimate_join_rows(counts, how):
+    """Exact output row count of the join from its join_row_counts(), and
+    whether keys duplicated on both sides multiply the matching rows"""
+    matched, matched_left, matched_right, left_rows, right_rows = counts
+    only_left = left_rows - matched_left
+    only_right = right_rows - matched_right
+    rows = {
+        'inner': matched,
+        'left': matched + only_left,
+        'right': matched + only_right,
+        'outer': matched + only_left + only_right,
+        'anti': only_left,
+    }[how]
+    return rows, how != 'anti' and matched > max(matched_left, matched_right)
 
-def get_column_values(file_path, column):
-    try:
-        df = pd.read_excel(file_path)
-        if column not in df.columns:
-            return []
-        # Get unique values and convert to list, handling NaN values
-        values = df[column].dropna().unique().tolist()
-        # Convert all values to strings for consistency
-        return [str(value) for value in values]
-    except Exception as e:
-        return []
+@stage('join')
+def _join_frames(left, right, keys, cols1, cols2, how):
+    """Join two keyed frames; df2's key columns fold into df1's. Rows with a
+    blank key are joined to nothing and kept by the joins that keep
+    unmatched rows of their side."""
+    left_missing = missing_keys(left, keys)
+    right_missing = missing_keys(right, keys)
+    if how == 'anti':
+        matched = key_index(left, keys).isin(key_index(right[~right_missing], keys)) & ~left_missing
+        return left[~matched].drop(columns=keys)
 
-def compare_files(file1_path, file2_path, col1, col2):
-    df1 = pd.read_excel(file1_path)
-    df2 = pd.read_excel(file2_path)
-    
-    # Find records in file1 not in file2
-    not_in_file2 = df1[~df1[col1].isin(df2[col2])]
-    
-    # Find records in file2 not in file1
-    not_in_file1 = df2[~df2[col2].isin(df1[col1])]
+    right_keys = {column: f'__right{i}' for i, column in enumerate(cols2)}
+    right = right.rename(columns=right_keys)
+    left = left.assign(__row=np.arange(len(left)))
+    parts = [pd.merge(left[~left_missing], right[~right_missing], on=keys, how=how)]
+    # Merged against no rows, so they take the same columns as the matches
+    if how in ('left', 'outer'):
+        parts.append(pd.merge(left[left_missing], right.iloc[:0], on=keys, how='left'))
+    if how in ('right', 'outer'):
+        parts.append(pd.merge(left.iloc[:0], right[right_missing], on=keys, how='right'))
+    joined = pd.concat(parts, ignore_index=True) if len(parts) > 1 else parts[0]
+    if how == 'left':
+        joined = joined.sort_values('__row', kind='stable', ignore_index=True)
+    joined = joined.drop(columns='__row')
+    for column, right_key in zip(cols1, right_keys.values()):
+        # Rows that exist only in file 2 take their key from it
+        joined[column] = joined[column].where(joined[column].notna(), joined[right_key])
+    return joined.drop(columns=[*keys, *right_keys.values()])
 
-    # Find records in file1 and in file2
-    in_both = df1[df1[col1].isin(df2[col2])]
-    
-    # Create output Excel file
-    output_path = os.path.join(app.config['UPLOAD_FOLDER'], 'comparison_result.xlsx')
-    with pd.ExcelWriter(output_path) as writer:
-        not_in_file2.to_excel(writer, sheet_name='Όχι στο αρχείο 2', index=False)
-        not_in_file1.to_excel(writer, sheet_name='Όχι στο αρχείο 1', index=False)
-        in_both.to_excel(writer, sheet_name='Κοινά', index=False)
-    
-    return output_path
+def join_files(file1_path, file2_path, col1, col2, how='inner', normalise=(), output_path=None,
+               allow_fanout=False, output_format=None, sheets=(0, 0), headers=(0, 0)):
+    """Join two files on one or more key columns. Keys can be normalised
+    before matching, and inputs expected to exceed JOIN_MEMORY_BUDGET once
+    parsed are streamed to disk in hash partitions instead of being loaded,
+    and joined partition by partition. Raises JoinFanOut when keys repeated
+    on both sides would multiply rows, unless allow_fanout is set."""
+    cols1, cols2 = key_columns(col1), key_columns(col2)
+    if how not in JOIN_TYPES:
+        raise ValueError(f'Άγνωστος τύπος συγχώνευσης: {how}')
+    keys = [f'__key{i}' for i in range(len(cols1))]
+    size = (estimate_sheet_size(file1_path, sheets[0], headers[0])
+            + estimate_sheet_size(file2_path, sheets[1], headers[1]))
+    # The normalised keys, the merge and its result need a few times the input size
+    partitions = int(size * 3 // app.config['JOIN_MEMORY_BUDGET']) + 1
 
-def join_files(file1_path, file2_path, col1, col2):
-    df1 = pd.read_excel(file1_path)
-    df2 = pd.read_excel(file2_path)
-    
-    # Rename the join column in df2 to match df1 to avoid duplicates
-    df2 = df2.rename(columns={col2: col1})
-    
-    # Perform the join operation (similar to SQL INNER JOIN)
-    joined_df = pd.merge(df1, df2, on=col1, how='inner')
-    
-    # Create output Excel file
-    output_path = os.path.join(app.config['UPLOAD_FOLDER'], 'joined_result.xlsx')
-    joined_df.to_excel(output_path, index=False)
-    
-    return output_path
+    # Create output file
+    output_path = output_path or os.path.join(workspaces.create(), 'joined_result.xlsx')
+    if partitions == 1:
+        left = _with_join_keys(read_workbook(file1_path, sheets[0], headers[0]), cols1, normalise)
+        right = _with_join_keys(read_workbook(file2_path, sheets[1], headers[1]), cols2, normalise)
+        estimated_rows, fans_out = estimate_join_rows(join_row_counts(left, right, keys), how)
+        if fans_out and not allow_fanout:
+            raise JoinFanOut(estimated_rows)
+        return write_frames(output_path, {'Sheet1': _join_frames(left, right, keys, cols1, cols2, how)},
+                            choose_output_format(estimated_rows, output_format))
 
-def split_file(file_path, column, value):
-    df = pd.read_excel(file_path)
-    
-    # Filter rows where the column value matches the selected value
-    # Convert both to strings for comparison to handle different data types
-    filtered_df = df[df[column].astype(str) == str(value)]
-    
-    # Create output Excel file
-    output_path = os.path.join(app.config['UPLOAD_FOLDER'], f'split_{value}.xlsx')
-    filtered_df.to_excel(output_path, index=False)
-    
-    return output_path
+    spill_dir = tempfile.mkdtemp(dir=os.path.dirname(output_path))
+    try:
+        with stage('partition'):
+            read1 = spill_partitions(file1_path, sheets[0], headers[0], keys, partitions, spill_dir, '1',
+                                     lambda chunk: _with_join_keys(chunk, cols1, normalise))
+            read2 = spill_partitions(file2_path, sheets[1], headers[1], keys, partitions, spill_dir, '2',
+                                     lambda chunk: _with_join_keys(chunk, cols2, normalise))
+        counts = np.zeros(5, dtype=np.int64)
+        for p in range(partitions):
+            counts += join_row_counts(read1(p), read2(p), keys)
+        estimated_rows, fans_out = estimate_join_rows(counts.tolist(), how)
+        if fans_out and not allow_fanout:
+            raise JoinFanOut(estimated_rows)
+
+        # Inputs past the budget call for the constant-memory writer
+        with OutputWriter(output_path, choose_output_format(float('inf'), output_format)) as writer:
+            for p in range(partitions):
+                writer.write('Sheet1', _join_frames(read1(p), read2(p), keys, cols1, cols2, how))
+    finally:
+        shutil.rmtree(spill_dir, ignore_errors=True)
+    return writer.path
 
 @app.route('/')
 def index():
@@ -211,6 +2956,96 @@ def filter_page():
 def split_by_column_page():
     return render_template('split.html')
 
+def request_input(values, files, field='file'):
+    """Path and original name of a tool's spreadsheet: a reference in
+    `filename` to a file sent to /upload or /uploads, with its name in
+    `original_filename`, or the file itself in `field`. Raises
+    FileNotFoundError for an unknown reference and ValueError otherwise."""
+    reference = values.get('filename')
+    if reference:
+        path = workspaces.input_path(reference)
+        name = values.get('original_filename') or reference
+    else:
+        if field not in files:
+            raise ValueError('Δεν έχει μεταφορτωθεί αρχείο')
+        file = files[field]
+        if file.filename == '':
+            raise ValueError('Δεν έχει επιλεγεί αρχείο')
+        if not spreadsheet_format(file):
+            raise ValueError('Παρακαλώ μεταφορτώστε αρχείο Excel, ODS ή CSV')
+        path, name = workspaces.input_path(workspaces.store_upload(file)), file.filename
+    if not spreadsheet_format(path):
+        raise ValueError('Παρακαλώ μεταφορτώστε αρχείο Excel, ODS ή CSV')
+    return path, name
+
+@app.route('/uploads', methods=['POST'])
+def start_upload():
+    """Open a chunked upload for a file too large for one request. Takes
+    JSON {filename, size, sha256 (optional)}; the chunks are then PUT to
+    upload_url with a Content-Range header, in any order and in parallel."""
+    data = request.get_json(silent=True) or {}
+    size = data.get('size')
+    if not data.get('filename') or not isinstance(size, int) or size < 0:
+        return jsonify({'error': 'Δώστε όνομα και μέγεθος αρχείου'}), 400
+    if size > app.config['UPLOAD_MAX_SIZE']:
+        limit = app.config['UPLOAD_MAX_SIZE'] // (1024 * 1024)
+        return jsonify({'error': f'Το αρχείο υπερβαίνει το μέγιστο μέγεθος των {limit}MB'}), 413
+    sha256 = data.get('sha256')
+    if sha256 is not None and not re.fullmatch(r'[0-9a-fA-F]{64}', str(sha256)):
+        return jsonify({'error': 'Μη έγκυρο άθροισμα ελέγχου'}), 400
+
+    upload_id = workspaces.start_upload(data['filename'], size, sha256)
+    return jsonify({'upload_id': upload_id,
+                    'chunk_size': app.config['UPLOAD_CHUNK_SIZE'],
+                    'upload_url': url_for('upload_chunk', upload_id=upload_id),
+                    'complete_url': url_for('complete_upload', upload_id=upload_id)}), 201
+
+def _chunk_digest(header):
+    """The SHA-256 of an RFC 9530 Content-Digest header, or None without one"""
+    match = re.search(r'sha-256=:([A-Za-z0-9+/=]+):', header or '')
+    return base64.b64decode(match.group(1)) if match else None
+
+@app.route('/uploads/<upload_id>', methods=['GET', 'PUT'])
+def upload_chunk(upload_id):
+    """GET lists the byte ranges received, to resume an interrupted upload.
+    PUT writes one chunk, sent as the raw body so it streams to disk without
+    form parsing."""
+    try:
+        status = workspaces.upload_status(upload_id)
+    except FileNotFoundError:
+        return jsonify({'error': 'Η μεταφόρτωση δεν βρέθηκε ή έχει λήξει'}), 404
+    if request.method == 'GET':
+        return jsonify(status)
+
+    content_range = parse_content_range_header(request.headers.get('Content-Range'))
+    if content_range is None or content_range.units != 'bytes' or content_range.length != status['size'] \
+            or content_range.stop - content_range.start != request.content_length \
+            or content_range.stop - content_range.start > app.config['UPLOAD_CHUNK_SIZE']:
+        return jsonify({'error': 'Μη έγκυρο τμήμα αρχείου'}), 400
+    try:
+        workspaces.write_chunk(upload_id, content_range.start, request.stream, request.content_length,
+                               _chunk_digest(request.headers.get('Content-Digest')))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 422
+    return jsonify(workspaces.upload_status(upload_id))
+
+@app.route('/uploads/<upload_id>/complete', methods=['POST'])
+def complete_upload(upload_id):
+    """Assemble the upload and return the reference every tool accepts in
+    place of the file. Takes optional JSON {sha256}, the whole file's
+    checksum, which the pages compute while the chunks are sent."""
+    sha256 = (request.get_json(silent=True) or {}).get('sha256')
+    if sha256 is not None and not re.fullmatch(r'[0-9a-fA-F]{64}', str(sha256)):
+        return jsonify({'error': 'Μη έγκυρο άθροισμα ελέγχου'}), 400
+    try:
+        status = workspaces.upload_status(upload_id)
+        reference = workspaces.finish_upload(upload_id, sha256)
+    except FileNotFoundError:
+        return jsonify({'error': 'Η μεταφόρτωση δεν βρέθηκε ή έχει λήξει'}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e), 'received': status['received']}), 409
+    return jsonify({'filename': reference, 'original_filename': status['name']})
+
 @app.route('/upload', methods=['POST'])
 def upload_file():
     if 'file' not in request.files:
@@ -220,168 +3055,291 @@ def upload_file():
     if file.filename == '':
         return jsonify({'error': 'Δεν έχει επιλεγεί αρχείο'}), 400
     
-    if file and file.filename.endswith('.xlsx'):
-        filename = secure_filename(file.filename)
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(file_path)
+    if file and spreadsheet_format(file):
+        # The reference is the content hash, so concurrent uploads never collide
+        filename = workspaces.store_upload(file)
         
-        columns = get_column_names(file_path)
-        return jsonify({'columns': columns, 'filename': filename})
+        try:
+            file_path = workspaces.input_path(filename)
+            info = get_workbook_info(file_path, *sheet_selection(file_path, request.form, allow_all=True))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+        return jsonify({**info, 'filename': filename})
     
     return jsonify({'error': 'Μη έγκυρος τύπος αρχείου'}), 400
 
+@app.route('/workbook-info', methods=['POST'])
+def workbook_info():
+    """Columns of another sheet or header row of a file already sent to /upload"""
+    try:
+        file_path = workspaces.input_path(request.form.get('filename', ''))
+    except FileNotFoundError:
+        return jsonify({'error': 'Το αρχείο δεν βρέθηκε'}), 404
+
+    try:
+        info = get_workbook_info(file_path, *sheet_selection(file_path, request.form, allow_all=True))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    return jsonify({**info, 'filename': request.form['filename']})
+
 @app.route('/upload-xls-docx', methods=['POST'])
 def upload_files_xls_docx():
-    if 'excel' not in request.files or 'word' not in request.files:
-        return jsonify({'error': 'Missing files'}), 400
-    
-    excel_file = request.files['excel']
-    word_file = request.files['word']
-    
-    if excel_file.filename == '' or word_file.filename == '':
-        return jsonify({'error': 'No files selected'}), 400
-
-    # Save files temporarily
-    excel_path = os.path.join(app.config['UPLOAD_FOLDER'], secure_filename(excel_file.filename))
-    word_path = os.path.join(app.config['UPLOAD_FOLDER'], secure_filename(word_file.filename))
-    
-    excel_file.save(excel_path)
-    word_file.save(word_path)
+    # Either file may be a reference from /uploads instead
+    references = {}
+    for field in ('excel', 'word'):
+        references[field] = request.form.get(f'{field}_file')
+        if not references[field]:
+            if field not in request.files:
+                return jsonify({'error': 'Missing files'}), 400
+            if request.files[field].filename == '':
+                return jsonify({'error': 'No files selected'}), 400
+            # Save files temporarily
+            references[field] = workspaces.store_upload(request.files[field])
+    excel_ref, word_ref = references['excel'], references['word']
 
     try:
+        excel_path = workspaces.input_path(excel_ref)
+        word_path = workspaces.input_path(word_ref)
+
         # Read Excel columns
-        df = pd.read_excel(excel_path)
-        columns = df.columns.tolist()
+        sheet_name, header = sheet_selection(excel_path, request.form)
+        info = get_workbook_info(excel_path, sheet_name, header)
 
         # Extract placeholders from Word
-        doc = Document(word_path)
+        doc = docx.Document(word_path)
         placeholders = extract_placeholders(doc)
 
         return jsonify({
-            'columns': columns,
+            **info,
             'placeholders': placeholders,
-            'excel_path': excel_path,
-            'word_path': word_path
+            'excel_file': excel_ref,
+            'word_file': word_ref
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def prepare_merge(excel_path, word_path, mappings, key_column, sheet_name=0, header=0):
+    """Load the template and build the (base_filename, replace_data) rows.
+    Also returns the source sheet's description for merge_cache.plan()"""
+    df = read_workbook(excel_path, sheet_name, header)
+    source = [sheet_name, header, [str(column) for column in df.columns]]
+
+    # Build (filename, replacements) per row up front so the output
+    # order and duplicate-name suffixes do not depend on the workers
+    mapped = {ph: df[col].astype(str).tolist() for ph, col in mappings.items()}
+    keys = df[key_column].astype(str).tolist()
+    rows = []
+    filename_counters = {}  # Keep track of filename occurrences
+    for i, base_filename in enumerate(keys):
+        # Handle duplicate filenames
+        if base_filename in filename_counters:
+            filename_counters[base_filename] += 1
+            base_filename = f"{base_filename}_{filename_counters[base_filename]}"
+        else:
+            filename_counters[base_filename] = 0
+        rows.append((base_filename, {ph: values[i] for ph, values in mapped.items()}))
+
+    with open(word_path, 'rb') as f:
+        template = f.read()
+    return template, rows, source
+
+def single_merge_output(row_count, export_formats, combine, records_per_file=None):
+    """The file name of a merge that produces a single combined document in
+    a single format, which is sent as is instead of in a ZIP archive"""
+    names = combined_file_names(row_count, records_per_file) if combine else []
+    formats = [fmt for fmt in ('docx', 'pdf') if export_formats.get(fmt)]
+    if len(names) == 1 and len(formats) == 1:
+        return f'{names[0]}.{formats[0]}'
+    return None
+
+def plan_merge(template, rows, mappings, key_column, export_formats, combine, source):
+    """The merge_cache plan of a one-file-per-row merge, or None when the
+    merge is combined or the cache is turned off"""
+    if combine or not app.config['MERGE_CACHE_DISK']:
+        return None
+    with stage('merge_plan'):
+        return merge_cache.plan(template, rows, mappings, key_column, export_formats, source)
+
+def _generate_job(progress, excel_path, word_path, mappings, key_column, export_formats, compresslevel,
+                  sheet_name=0, header=0, combine=False, records_per_file=None):
+    template, rows, source = prepare_merge(excel_path, word_path, mappings, key_column, sheet_name, header)
+    plan = plan_merge(template, rows, mappings, key_column, export_formats, combine, source)
+    members = merge_documents(template, rows, export_formats, progress=progress,
+                              combine=combine, records_per_file=records_per_file, plan=plan)
+    single = single_merge_output(len(rows), export_formats, combine, records_per_file)
+    if single:
+        outputs = list(members)
+        if not outputs:
+            raise RuntimeError('Δεν δημιουργήθηκε κανένα έγγραφο')
+        output_path = job_output_path(os.path.splitext(single)[1])
+        with open(output_path, 'wb') as f:
+            f.write(outputs[0][1])
+        return output_path, single
+
+    output_path = job_output_path('.zip')
+    with open(output_path, 'wb') as f:
+        write_zip_stream(f, members, compresslevel)
+    return output_path, 'generated_documents.zip', plan['summary'] if plan else None
+
 @app.route('/generate', methods=['POST'])
+@heavy_route()
 def generate_documents():
     data = request.json
-    excel_path = data.get('excel_path')
-    word_path = data.get('word_path')
     mappings = data.get('mappings')
     key_column = data.get('key_column')
     export_formats = data.get('export_formats', {'docx': True, 'pdf': False})
 
-    if not all([excel_path, word_path, mappings, key_column]):
+    if not all([data.get('excel_file'), data.get('word_file'), mappings, key_column]):
         return jsonify({'error': 'Missing required data'}), 400
 
+    try:
+        excel_path = workspaces.input_path(data['excel_file'])
+        word_path = workspaces.input_path(data['word_file'])
+    except FileNotFoundError:
+        return jsonify({'error': 'Το αρχείο δεν βρέθηκε'}), 404
+
+    try:
+        sheet_name, header = sheet_selection(excel_path, data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
     if not any(export_formats.values()):
         return jsonify({'error': 'Please select at least one export format'}), 400
 
+    # Once the archive streams the status is sent, so nothing may fail later
+    # for a reason known now
     try:
-        df = pd.read_excel(excel_path)
-        
-        # Create a temporary directory for processing
-        temp_dir = tempfile.mkdtemp(dir=app.config['UPLOAD_FOLDER'])
-        try:
-            # Process each row
-            output_files = []
-            filename_counters = {}  # Keep track of filename occurrences
-            
-            for index, row in df.iterrows():
-                doc = Document(word_path)
-                
-                # Prepare data for replacement
-                replace_data = {ph: str(row[col]) for ph, col in mappings.items()}
-                replace_placeholders(doc, replace_data)
-                
-                base_filename = f"{row[key_column]}"
-                
-                # Handle duplicate filenames
-                if base_filename in filename_counters:
-                    filename_counters[base_filename] += 1
-                    base_filename = f"{base_filename}_{filename_counters[base_filename]}"
-                else:
-                    filename_counters[base_filename] = 0
-                
-                # Save as DOCX if requested
-                if export_formats.get('docx'):
-                    docx_path = os.path.join(temp_dir, f"{base_filename}.docx")
-                    doc.save(docx_path)
-                    output_files.append(docx_path)
-                
-                # Convert to PDF if requested
-                if export_formats.get('pdf'):
-                    if platform.system() == 'Windows':
-                        # Initialize COM for each conversion
-                        try:
-                            if not export_formats.get('docx'):
-                                # If we don't want DOCX, save it temporarily
-                                docx_path = os.path.join(temp_dir, f"{base_filename}_temp.docx")
-                                doc.save(docx_path)
-
-                            pdf_path = os.path.join(temp_dir, f"{base_filename}.pdf")
-                            convert(docx_path, pdf_path)
-                            output_files.append(pdf_path)
-
-                            # Clean up temporary DOCX if we didn't want it
-                            if not export_formats.get('docx'):
-                                try:
-                                    os.remove(docx_path)
-                                except OSError:
-                                    pass
-                        finally:
-                            pass
-                    else:
-                        # Use LibreOffice for PDF conversion on non-Windows systems
-                        docx_path = os.path.join(temp_dir, f"{base_filename}.docx")
-                        doc.save(docx_path)
-                        pdf_path = os.path.join(temp_dir, f"{base_filename}.pdf")
-                        command = f'libreoffice --headless --convert-to pdf:writer_pdf_Export "{docx_path}" --outdir "{temp_dir}"'
-                        os.system(command)
-                        output_files.append(pdf_path)
-
-           # Create a temporary file for the ZIP
-            zip_buffer = io.BytesIO()
-            
-            # Create the ZIP file in memory
-            with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                for file in output_files:
-                    if os.path.exists(file):  # Only add files that exist
-                        zipf.write(file, os.path.basename(file))
-
-            # Clean up the temporary processing directory
-            try:
-                shutil.rmtree(temp_dir)
-            except OSError:
-                pass  # Ignore errors during cleanup
-
-            # Prepare the ZIP file for download
-            zip_buffer.seek(0)
-            
-            # Create response with appropriate headers for automatic download
-            response = make_response(zip_buffer.getvalue())
-            response.headers['Content-Type'] = 'application/zip'
-            response.headers['Content-Disposition'] = 'attachment; filename=generated_documents.zip'
-            
-            return response
+        compresslevel = compresslevel_value(data.get('compresslevel', app.config['ARCHIVE_COMPRESSLEVEL']))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if export_formats.get('pdf'):
+        reason = pdf_export_unavailable()
+        if reason:
+            return jsonify({'error': f'Η εξαγωγή σε PDF δεν είναι διαθέσιμη: {reason}'}), 503
 
-        except Exception as e:
-            # Clean up on error
-            try:
-                shutil.rmtree(temp_dir)
-            except OSError:
-                pass  # Ignore errors during cleanup
-            raise e
+    # One document per row, or all rows in combined documents of at most
+    # records_per_file records
+    combine = bool(data.get('combine'))
+    try:
+        records_per_file = int(data.get('records_per_file') or 0) or None
+    except (TypeError, ValueError):
+        records_per_file = -1
+    if records_per_file is not None and records_per_file < 1:
+        return jsonify({'error': 'Μη έγκυρος αριθμός εγγραφών ανά αρχείο'}), 400
+
+    if data.get('async'):
+        job_id = submit_job('generate', _generate_job, excel_path, word_path,
+                            mappings, key_column, export_formats, compresslevel, sheet_name, header,
+                            combine, records_per_file)
+        if job_id is None:
+            return jsonify({'error': 'Ο διακομιστής είναι απασχολημένος, δοκιμάστε αργότερα'}), 503
+        return jsonify(job_response(job_id)), 202
+
+    try:
+        template, rows, source = prepare_merge(excel_path, word_path, mappings, key_column, sheet_name, header)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+    plan = plan_merge(template, rows, mappings, key_column, export_formats, combine, source)
+    members = merge_documents(template, rows, export_formats, combine=combine,
+                              records_per_file=records_per_file, plan=plan)
+    single = single_merge_output(len(rows), export_formats, combine, records_per_file)
+    if single:
+        outputs = list(members)
+        if not outputs:
+            return jsonify({'error': 'Δεν δημιουργήθηκε κανένα έγγραφο'}), 500
+        return send_file(io.BytesIO(outputs[0][1]), as_attachment=True, download_name=single)
+
+    # Each document reaches the client as soon as it is rendered
+    response = Response(stream_with_context(stream_zip(members, compresslevel)),
+                        mimetype='application/zip')
+    response.headers['Content-Disposition'] = 'attachment; filename=generated_documents.zip'
+    if plan:
+        # What changed since the last run, known before anything is rendered
+        response.headers['X-Merge-Summary'] = json.dumps(plan['summary'])
+    return response
+
+def _preview_source():
+    """(path, digest, sheet, header offset) of the file a /preview request
+    names. Raises FileNotFoundError or ValueError."""
+    filename = request.form.get('filename', '')
+    file_path = workspaces.input_path(filename)
+    digest = workspaces.input_digest(filename)
+    return (file_path, digest, *sheet_selection(file_path, request.form, digest=digest))
+
+@app.route('/preview', methods=['POST'])
+def preview():
+    """A page of rows of a sheet of a file already sent to /upload: the
+    filename, sheet and header_row fields of /workbook-info, plus offset
+    and limit"""
+    try:
+        file_path, digest, sheet_name, header = _preview_source()
+    except FileNotFoundError:
+        return jsonify({'error': 'Το αρχείο δεν βρέθηκε'}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
+    offset = request.form.get('offset', 0, type=int)
+    limit = request.form.get('limit', app.config['PREVIEW_PAGE_ROWS'], type=int)
+    if offset < 0 or not 0 < limit <= app.config['PREVIEW_MAX_ROWS']:
+        return jsonify({'error': 'Μη έγκυρο εύρος γραμμών'}), 400
+    try:
+        columns, rows, row_count = preview_rows(file_path, sheet_name, header, offset, limit, digest)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    next_offset = offset + len(rows)
+    return jsonify({'columns': columns, 'rows': rows, 'offset': offset, 'limit': limit,
+                    'row_count': row_count, 'next_offset': next_offset if next_offset < row_count else None})
+
+@app.route('/preview/stats', methods=['POST'])
+def preview_stats():
+    """Per-column statistics of a sheet of a file already sent to /upload,
+    for choosing key columns: blanks, estimated distinct values, range and
+    sample values"""
+    try:
+        file_path, digest, sheet_name, header = _preview_source()
+    except FileNotFoundError:
+        return jsonify({'error': 'Το αρχείο δεν βρέθηκε'}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        return jsonify(sheet_statistics(file_path, sheet_name, header, digest))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/column-values', methods=['POST'])
 def column_values():
+    column = request.form.get('column')
+    if not column:
+        return jsonify({'error': 'Δεν έχει επιλεγεί στήλη'}), 400
+
+    limit = request.form.get('limit', type=int)
+
+    # A file already sent to /upload can be referenced instead of re-uploaded
+    filename = request.form.get('filename')
+    if filename:
+        try:
+            file_path = workspaces.input_path(filename)
+        except FileNotFoundError:
+            return jsonify({'error': 'Το αρχείο δεν βρέθηκε'}), 404
+        try:
+            values, truncated = get_column_values(
+                file_path, column, limit, *sheet_selection(file_path, request.form, allow_all=True))
+            return jsonify({'values': values, 'truncated': truncated})
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+
     if 'file' not in request.files:
         return jsonify({'error': 'Δεν έχει μεταφορτωθεί αρχείο'}), 400
     
@@ -389,94 +3347,349 @@ def column_values():
     if file.filename == '':
         return jsonify({'error': 'Δεν έχει επιλεγεί αρχείο'}), 400
     
-    if not file.filename.endswith(('.xlsx', '.xls')):
-        return jsonify({'error': 'Παρακαλώ μεταφορτώστε αρχείο Excel'}), 400
-    
-    column = request.form.get('column')
-    if not column:
-        return jsonify({'error': 'Δεν έχει επιλεγεί στήλη'}), 400
+    if not spreadsheet_format(file):
+        return jsonify({'error': 'Παρακαλώ μεταφορτώστε αρχείο Excel, ODS ή CSV'}), 400
     
     try:
-        # Save the file temporarily
-        filename = secure_filename(file.filename)
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(file_path)
+        # Save the file; the sweeper removes it once it expires
+        file_path = workspaces.input_path(workspaces.store_upload(file))
         
         # Get unique values for the column
-        values = get_column_values(file_path, column)
-        
-        # Clean up the temporary file
-        os.remove(file_path)
+        values, truncated = get_column_values(
+            file_path, column, limit, *sheet_selection(file_path, request.form, allow_all=True))
         
-        return jsonify({'values': values})
+        return jsonify({'values': values, 'truncated': truncated})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def _compare_job(progress, file1_path, file2_path, col1, col2, output_format, sheets, headers):
+    output_path = compare_files(file1_path, file2_path, col1, col2,
+                                job_output_path('.xlsx'), progress, output_format, sheets, headers)
+    return output_path, 'comparison_result' + os.path.splitext(output_path)[1]
+
 @app.route('/compare', methods=['POST'])
+@heavy_route()
 def compare():
     data = request.json
-    file1_path = os.path.join(app.config['UPLOAD_FOLDER'], data['file1'])
-    file2_path = os.path.join(app.config['UPLOAD_FOLDER'], data['file2'])
+    try:
+        file1_path = workspaces.input_path(data['file1'])
+        file2_path = workspaces.input_path(data['file2'])
+    except FileNotFoundError:
+        return jsonify({'error': 'Το αρχείο δεν βρέθηκε'}), 404
+
+    try:
+        (sheet1, header1), (sheet2, header2) = (sheet_selection(file1_path, data, '1'),
+                                                sheet_selection(file2_path, data, '2'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    sheets, headers = (sheet1, sheet2), (header1, header2)
     
+    if data.get('async'):
+        job_id = submit_job('compare', _compare_job, file1_path, file2_path, data['col1'], data['col2'],
+                            data.get('output_format'), sheets, headers)
+        if job_id is None:
+            return jsonify({'error': 'Ο διακομιστής είναι απασχολημένος, δοκιμάστε αργότερα'}), 503
+        return jsonify(job_response(job_id)), 202
+
     try:
-        output_path = compare_files(file1_path, file2_path, data['col1'], data['col2'])
-        return send_file(output_path, as_attachment=True)
+        output_path = compare_files(file1_path, file2_path, data['col1'], data['col2'],
+                                    output_format=data.get('output_format'), sheets=sheets,
+                                    headers=headers)
+        return send_file(os.path.abspath(output_path), as_attachment=True)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/join', methods=['POST'])
+@heavy_route()
 def join():
     data = request.json
-    file1_path = os.path.join(app.config['UPLOAD_FOLDER'], data['file1'])
-    file2_path = os.path.join(app.config['UPLOAD_FOLDER'], data['file2'])
+    try:
+        file1_path = workspaces.input_path(data['file1'])
+        file2_path = workspaces.input_path(data['file2'])
+    except FileNotFoundError:
+        return jsonify({'error': 'Το αρχείο δεν βρέθηκε'}), 404
     
     try:
-        output_path = join_files(file1_path, file2_path, data['col1'], data['col2'])
-        return send_file(output_path, as_attachment=True)
+        (sheet1, header1), (sheet2, header2) = (sheet_selection(file1_path, data, '1'),
+                                                sheet_selection(file2_path, data, '2'))
+        output_path = join_files(file1_path, file2_path, data['col1'], data['col2'],
+                                 how=data.get('how', 'inner'), normalise=data.get('normalise', ()),
+                                 allow_fanout=data.get('confirm', False),
+                                 output_format=data.get('output_format'),
+                                 sheets=(sheet1, sheet2), headers=(header1, header2))
+        return send_file(os.path.abspath(output_path), as_attachment=True)
+    except JoinFanOut as e:
+        # Let the user confirm before writing a result larger than both inputs
+        return jsonify({'warning': str(e), 'estimated_rows': e.estimated_rows}), 409
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# Filter operators and how they read in messages
+FILTER_OPERATORS = {
+    'eq': 'ισούται με',
+    'ne': 'διαφέρει από',
+    'in': 'είναι ένα από',
+    'not_in': 'δεν είναι κανένα από',
+    'between': 'είναι μεταξύ',
+    'contains': 'περιέχει',
+    'regex': 'ταιριάζει με την έκφραση',
+    'empty': 'είναι κενό',
+    'not_empty': 'δεν είναι κενό',
+}
+
+def parse_filter(values):
+    """Return (conditions, match) from a filter request. `conditions` is a
+    JSON list of {column, op, value}, where value is a list for in/not_in
+    and [min, max] for between (either end may be blank), combined with
+    match=all or any. The single column/value fields of older clients are
+    read as one eq condition. Raises ValueError for a malformed condition."""
+    match = values.get('match') or 'all'
+    if match not in ('all', 'any'):
+        raise ValueError('Μη έγκυρος συνδυασμός κριτηρίων')
+
+    if values.get('conditions'):
+        try:
+            conditions = json.loads(values['conditions'])
+        except ValueError:
+            raise ValueError('Μη έγκυρα κριτήρια φιλτραρίσματος')
+    elif values.get('column') and values.get('value'):
+        conditions = [{'column': values['column'], 'op': 'eq', 'value': values['value']}]
+    else:
+        conditions = []
+    if not isinstance(conditions, list):
+        raise ValueError('Μη έγκυρα κριτήρια φιλτραρίσματος')
+
+    parsed = []
+    for condition in conditions:
+        if not isinstance(condition, dict) or not condition.get('column'):
+            raise ValueError('Κάθε κριτήριο χρειάζεται στήλη')
+        column, op, value = str(condition['column']), condition.get('op', 'eq'), condition.get('value')
+        if op not in FILTER_OPERATORS:
+            raise ValueError(f'Άγνωστος τελεστής φίλτρου: {op}')
+
+        if op in ('in', 'not_in'):
+            value = [str(v) for v in (value if isinstance(value, list) else [value]) if v not in (None, '')]
+            if not value:
+                raise ValueError(f'Δεν δόθηκαν τιμές για τη στήλη "{column}"')
+        elif op == 'between':
+            if not isinstance(value, list) or len(value) != 2 or all(v in (None, '') for v in value):
+                raise ValueError(f'Δώστε ελάχιστη ή μέγιστη τιμή για τη στήλη "{column}"')
+            value = [None if v in (None, '') else str(v) for v in value]
+        elif op not in ('empty', 'not_empty'):
+            if value in (None, ''):
+                raise ValueError(f'Δεν δόθηκε τιμή για τη στήλη "{column}"')
+            value = str(value)
+            if op == 'regex':
+                try:
+                    re.compile(value)
+                except re.error as e:
+                    raise ValueError(f'Μη έγκυρη κανονική έκφραση "{value}": {e}')
+        parsed.append({'column': column, 'op': op, 'value': value})
+    return parsed, match
+
+def describe_filter(conditions, match='all'):
+    """The conditions as a sentence for the result message"""
+    parts = []
+    for condition in conditions:
+        column, op, value = condition['column'], condition['op'], condition['value']
+        if op in ('empty', 'not_empty'):
+            parts.append(f'{column} {FILTER_OPERATORS[op]}')
+        elif op == 'between':
+            low, high = value
+            if low is None:
+                parts.append(f'{column} είναι έως "{high}"')
+            elif high is None:
+                parts.append(f'{column} είναι από "{low}"')
+            else:
+                parts.append(f'{column} είναι από "{low}" έως "{high}"')
+        elif op in ('in', 'not_in'):
+            parts.append(f'{column} {FILTER_OPERATORS[op]} ' + ', '.join(f'"{v}"' for v in value))
+        else:
+            parts.append(f'{column} {FILTER_OPERATORS[op]} "{value}"')
+    return (' και ' if match == 'all' else ' ή ').join(parts)
+
+def _comparable(series):
+    """Whether a column may be compared as numbers"""
+    return not (pd.api.types.is_bool_dtype(series) or pd.api.types.is_datetime64_any_dtype(series))
+
+def _equals_any(series, values):
+    """Cells equal to one of the values. Cells are compared as text, like
+    the original astype(str) filter, and numbers also by value, so 3, 3.0
+    and "3" match whichever way the value list formatted them, and dates
+    also as timestamps."""
+    present = series.notna()
+    mask = series[present].astype(str).isin(values).reindex(series.index, fill_value=False)
+    numbers = pd.to_numeric(pd.Series(values, dtype=object), errors='coerce').dropna()
+    if len(numbers) and _comparable(series):
+        mask |= pd.to_numeric(series, errors='coerce').isin(numbers)
+    if pd.api.types.is_datetime64_any_dtype(series):
+        # astype(str) drops midnight times, which the value list keeps
+        dates = pd.to_datetime(pd.Series(values, dtype=object), errors='coerce', format='mixed').dropna()
+        mask |= series.isin(dates)
+    return mask
+
+def _range_bounds(series, low, high):
+    """The column and bounds converted to numbers, dates or text, whichever
+    all the given bounds parse as"""
+    bounds = [b for b in (low, high) if b is not None]
+    numbers = pd.to_numeric(pd.Series(bounds, dtype=object), errors='coerce')
+    if numbers.notna().all() and _comparable(series):
+        return pd.to_numeric(series, errors='coerce'), *(None if b is None else float(b) for b in (low, high))
+    try:
+        dates = [None if b is None else pd.Timestamp(b) for b in (low, high)]
+    except ValueError:
+        dates = None
+    if dates is not None and not pd.api.types.is_numeric_dtype(series):
+        return pd.to_datetime(series, errors='coerce', format='mixed'), *dates
+    return series.where(series.isna(), series.astype(str)), low, high
+
+def _between(series, low, high):
+    values, low, high = _range_bounds(series, low, high)
+    present = values.notna()
+    kept = values[present]
+    mask = pd.Series(True, index=kept.index)
+    if low is not None:
+        mask &= kept >= low
+    if high is not None:
+        mask &= kept <= high
+    return mask.reindex(series.index, fill_value=False)
+
+def _is_empty(series):
+    mask = series.isna()
+    if series.dtype == object:
+        mask |= series.astype(str).str.strip().eq('')
+    return mask
+
+def _condition_mask(condition):
+    """Compile one condition to a function of a chunk returning a boolean mask"""
+    name, op, value = condition['column'], condition['op'], condition['value']
+
+    def column(df):
+        return df[next(c for c in df.columns if str(c) == name)]
+
+    if op in ('eq', 'in'):
+        values = [value] if op == 'eq' else value
+        return lambda df: _equals_any(column(df), values)
+    if op in ('ne', 'not_in'):
+        values = [value] if op == 'ne' else value
+        return lambda df: ~_equals_any(column(df), values)
+    if op == 'between':
+        return lambda df: _between(column(df), *value)
+    if op in ('contains', 'regex'):
+        def test(df):
+            series = column(df)
+            return series.notna() & series.astype(str).str.contains(value, case=op == 'regex',
+                                                                   regex=op == 'regex')
+        return test
+    if op == 'empty':
+        return lambda df: _is_empty(column(df))
+    return lambda df: ~_is_empty(column(df))
+
+def compile_predicate(conditions, match='all'):
+    """Compile parsed conditions to one function of a chunk returning the
+    boolean mask of matching rows"""
+    tests = [_condition_mask(condition) for condition in conditions]
+
+    def predicate(df):
+        mask = None
+        for test in tests:
+            result = test(df)
+            mask = result if mask is None else (mask & result if match == 'all' else mask | result)
+        return mask
+    return predicate
+
+def filter_workbook(source, conditions, output_path, match='all', sheet_name=0, header=0,
+                    output_format=None):
+    """Stream a sheet (or every sheet, for ALL_SHEETS) through the compiled
+    conditions chunk by chunk, writing matching rows straight to the output.
+    Returns the number of matching rows and the output path, or (0, None)
+    when nothing matched. Raises KeyError for a column no sheet has."""
+    all_sheets = sheet_name == ALL_SHEETS
+    names = get_sheet_names(source) if all_sheets else [resolve_sheet(source, sheet_name)]
+    required = {condition['column'] for condition in conditions} - ({SHEET_COLUMN} if all_sheets else set())
+
+    # Only header rows are read here, to pick the sheets and the output columns
+    sheets, columns, missing, row_count = [], [], None, 0
+    for name in names:
+        info = get_workbook_info(source, name, header)
+        absent = required - {str(label) for label in info['columns']}
+        if absent:
+            missing = missing or sorted(absent)[0]
+            continue
+        sheets.append(name)
+        columns += [label for label in info['columns'] if label not in columns]
+        row_count = None if row_count is None or info['row_count'] is None else row_count + info['row_count']
+    if not sheets:
+        raise KeyError(missing)
+    if all_sheets:
+        columns = [SHEET_COLUMN, *[label for label in columns if label != SHEET_COLUMN]]
+
+    predicate = compile_predicate(conditions, match)
+    # A sheet of unknown size is treated as large
+    fmt = choose_output_format(app.config['OUTPUT_STREAM_ROWS'] + 1 if row_count is None else row_count,
+                               output_format)
+    count, writer = 0, None
+    with ExitStack() as stack:
+        for name in sheets:
+            for chunk in iter_sheet_chunks(source, name, header):
+                if all_sheets:
+                    chunk = chunk.drop(columns=SHEET_COLUMN, errors='ignore')
+                    chunk.insert(0, SHEET_COLUMN, name)
+                    chunk = chunk.reindex(columns=columns)
+                with stage('filter'):
+                    matched = chunk[predicate(chunk)]
+                if not len(matched):
+                    continue
+                if writer is None:
+                    writer = stack.enter_context(OutputWriter(output_path, fmt))
+                writer.write('Sheet1', matched)
+                count += len(matched)
+    return count, writer.path if writer else None
+
 @app.route('/filter', methods=['POST'])
+@heavy_route('filter.html')
 def filter_file():
-    if 'file' not in request.files:
-        return render_template('filter.html', error='Δεν έχει μεταφορτωθεί αρχείο')
-    
-    file = request.files['file']
-    if file.filename == '':
-        return render_template('filter.html', error='Δεν έχει επιλεγεί αρχείο')
-    
-    if not file.filename.endswith(('.xlsx', '.xls')):
-        return render_template('filter.html', error='Παρακαλώ μεταφορτώστε αρχείο Excel')
-    
-    column = request.form.get('column')
-    value = request.form.get('value')
-    
-    if not column or not value:
+    try:
+        source, original_filename = request_input(request.form, request.files)
+    except FileNotFoundError:
+        return render_template('filter.html', error='Το αρχείο δεν βρέθηκε')
+    except ValueError as e:
+        return render_template('filter.html', error=str(e))
+
+    try:
+        conditions, match = parse_filter(request.form)
+    except ValueError as e:
+        return render_template('filter.html', error=str(e))
+
+    if not conditions:
         return render_template('filter.html', error='Παρακαλώ επιλέξτε στήλη και εισάγετε τιμή')
-    
+    description = describe_filter(conditions, match)
+
     try:
-        # Read the Excel file
-        df = pd.read_excel(file)
-        
-        if column not in df.columns:
-            return render_template('filter.html', error=f'Η στήλη "{column}" δεν βρέθηκε στο αρχείο')
-        
-        # Filter the dataframe
-        filtered_df = df[df[column].astype(str) == str(value)]
-        
-        if filtered_df.empty:
-            return render_template('filter.html', error=f'Δεν βρέθηκαν γραμμές όπου {column} ισούται με "{value}"')
-        
+        sheet_name, header = sheet_selection(source, request.form, allow_all=True)
+
         # Create output filename
-        output_filename = f'filtered_{secure_filename(file.filename)}'
-        output_path = os.path.join(app.config['UPLOAD_FOLDER'], output_filename)
-        
-        # Save the filtered dataframe
-        filtered_df.to_excel(output_path, index=False)
-        
-        return render_template('filter.html', 
-                             success=f'Βρέθηκαν {len(filtered_df)} γραμμές στις οποίες {column} ισούται με "{value}"',
-                             download_link={'url': url_for('download_file', filename=output_filename),
+        output_filename = f'filtered_{secure_filename(original_filename)}'
+        output_path = os.path.join(workspaces.create(), output_filename)
+
+        # Stream the matching rows of the selected sheet, or of every sheet with the columns
+        try:
+            count, output_path = filter_workbook(source, conditions, output_path, match, sheet_name, header,
+                                                 request.form.get('output_format'))
+        except KeyError as e:
+            return render_template('filter.html', error=f'Η στήλη "{e.args[0]}" δεν βρέθηκε στο αρχείο')
+
+        if not count:
+            return render_template('filter.html', error=f'Δεν βρέθηκαν γραμμές όπου {description}')
+
+        output_filename = os.path.basename(output_path)
+        file_id = workspaces.register(output_path, output_filename)
+
+        return render_template('filter.html',
+                             success=f'Βρέθηκαν {count} γραμμές στις οποίες {description}',
+                             download_link={'url': url_for('download_file', file_id=file_id),
                                           'filename': output_filename})
         
     except Exception as e:
@@ -492,152 +3705,410 @@ def get_columns():
     if file.filename == '':
         return jsonify({'error': 'Δεν έχει επιλεγεί αρχείο'}), 400
     
-    if not file.filename.endswith(('.xlsx', '.xls')):
-        return jsonify({'error': 'Παρακαλώ μεταφορτώστε αρχείο Excel'}), 400
+    if not spreadsheet_format(file):
+        return jsonify({'error': 'Παρακαλώ μεταφορτώστε αρχείο Excel, ODS ή CSV'}), 400
     
     try:
-        # Read the Excel file
-        df = pd.read_excel(file)
-        
-        # Get column names
-        columns = df.columns.tolist()
-        
-        return jsonify({'columns': columns})
+        # Only the header row is read
+        return jsonify(get_workbook_info(file, *sheet_selection(file, request.form, allow_all=True)))
     
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/download/<path:filename>')
-def download_file(filename):
+@app.route('/download/<file_id>')
+def download_file(file_id):
+    result = workspaces.result(file_id)
+    if result is None or not os.path.exists(result['path']):
+        return 'Το αρχείο δεν βρέθηκε ή έχει λήξει', 404
+    return send_file(os.path.abspath(result['path']), as_attachment=True,
+                     download_name=result['name'])
+
+def clean_value(value):
+    """Make a split value safe to use in a filename"""
+    return str(value).replace('/', '_').replace('\\', '_')
+
+def _unique_names(names, max_length=None):
+    """Deduplicate names case-insensitively, in order, by appending _1, _2, ..."""
+    used = set()
+    unique = []
+    for name in names:
+        name = name[:max_length] if max_length else name
+        candidate, counter = name, 0
+        while candidate.lower() in used:
+            counter += 1
+            suffix = f'_{counter}'
+            candidate = (name[:max_length - len(suffix)] if max_length else name) + suffix
+        used.add(candidate.lower())
+        unique.append(candidate)
+    return unique
+
+@stage('split')
+def split_groups(series):
+    """Group row positions by value in one pass. Missing values (NaN/None)
+    form a single group. Returns (value, positions) in order of first
+    appearance."""
+    codes, uniques = pd.factorize(series, use_na_sentinel=False)
+    order = np.argsort(codes, kind='stable')
+    bounds = np.cumsum(np.bincount(codes, minlength=len(uniques)))[:-1]
+    return list(zip(uniques, np.split(order, bounds)))
+
+def _part_bytes(df, fmt='xlsx'):
+    """Serialize one split part in memory in the given output format"""
+    part = io.BytesIO()
+    if fmt == 'csv':
+        df.to_csv(part, index=False, encoding='utf-8-sig')
+    elif fmt == 'parquet':
+        df.rename(columns=str).to_parquet(part, index=False)
+    else:
+        engine = 'xlsxwriter' if fmt == 'xlsx-stream' and HAS_XLSXWRITER else 'openpyxl'
+        df.to_excel(part, index=False, engine=engine)
+    return part.getvalue()
+
+def _ordered_parallel_map(executor, func, items, window):
+    """executor.map() that keeps at most `window` items in flight"""
+    pending = deque()
+    for item in items:
+        pending.append(executor.submit(func, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+def split_workbook(source, column, output_path, layout='files', progress=None, compresslevel=None,
+                   output_format=None, sheet_name=0, header=0):
+    """Split a sheet by the distinct values of column and return the number
+    of parts and the output path. layout='files' writes a ZIP with one file
+    per value, layout='sheets' a single workbook with one sheet per value
+    (a ZIP of files for CSV and Parquet). Raises KeyError for an unknown
+    column."""
+    # Read the selected sheet, or every sheet with the column
+    df = read_selection(source, sheet_name, header, column)
+    
+    if column not in df.columns:
+        raise KeyError(column)
+
+    groups = split_groups(df[column])
+    fmt = choose_output_format(len(df), output_format)
+
+    if layout == 'sheets':
+        # Excel sheet names are at most 31 characters and cannot contain []:*?/\
+        names = [re.sub(r'[\[\]:*?/\\]', '_', str(value)) or '_' for value, _ in groups]
+        with OutputWriter(output_path, fmt) as writer:
+            for i, (name, (_, positions)) in enumerate(zip(_unique_names(names, 31), groups), start=1):
+                writer.write(name, df.iloc[positions])
+                if progress:
+                    progress(i, len(groups))
+        return len(groups), writer.path
+
+    filenames = _unique_names([f'split_{clean_value(value)}' for value, _ in groups])
+    parts = (df.iloc[positions] for _, positions in groups)
+
+    def members(executor):
+        # Parts are written in parallel but reach the archive in order
+        for i, (filename, content) in enumerate(zip(filenames, _ordered_parallel_map(
+                executor, lambda part: _part_bytes(part, fmt), parts,
+                app.config['SPLIT_WORKERS'] * 2)), start=1):
+            yield filename + OUTPUT_EXTENSIONS[fmt], content
+            if progress:
+                progress(i, len(groups))
+
+    with ThreadPoolExecutor(max_workers=app.config['SPLIT_WORKERS']) as executor, \
+            open(output_path, 'wb') as f:
+        write_zip_stream(f, members(executor), compresslevel)
+    
+    return len(groups), output_path
+
+def _split_output_name(original_filename, layout, extension='.xlsx'):
+    if layout == 'sheets':
+        return f'split_sheets_{os.path.splitext(secure_filename(original_filename))[0]}{extension}'
+    return f'split_files_{secure_filename(original_filename)}.zip'
+
+def _split_job(progress, file_path, column, original_filename, layout, compresslevel, output_format,
+               sheet_name=0, header=0):
+    output_path = job_output_path('.xlsx' if layout == 'sheets' else '.zip')
     try:
-        return send_file(
-            os.path.join(app.config['UPLOAD_FOLDER'], filename),
-            as_attachment=True
-        )
-    except Exception as e:
-        return str(e), 404
+        _, output_path = split_workbook(file_path, column, output_path, layout, progress,
+                                        compresslevel, output_format, sheet_name, header)
+    except KeyError:
+        raise ValueError(f'Η στήλη "{column}" δεν βρέθηκε στο αρχείο')
+    return output_path, _split_output_name(original_filename, layout, os.path.splitext(output_path)[1])
 
 @app.route('/split', methods=['POST'])
+@heavy_route('split.html')
 def split():
-    if 'file' not in request.files:
-        return render_template('split.html', error='Δεν έχει μεταφορτωθεί αρχείο')
-    
-    file = request.files['file']
-    if file.filename == '':
-        return render_template('split.html', error='Δεν έχει επιλεγεί αρχείο')
-    
-    if not file.filename.endswith(('.xlsx', '.xls')):
-        return render_template('split.html', error='Παρακαλώ μεταφορτώστε αρχείο Excel')
-    
+    # The upload does not outlive the request, so a copy is kept for jobs and sheet lookups
+    try:
+        file_path, original_filename = request_input(request.form, request.files)
+    except FileNotFoundError:
+        return render_template('split.html', error='Το αρχείο δεν βρέθηκε')
+    except ValueError as e:
+        return render_template('split.html', error=str(e))
+
     column = request.form.get('column')
     if not column:
         return render_template('split.html', error='Παρακαλώ επιλέξτε στήλη')
     
+    layout = request.form.get('layout', 'files')
+    output_format = request.form.get('output_format')
+
     try:
-        # Read the Excel file
-        df = pd.read_excel(file)
-        
-        if column not in df.columns:
-            return render_template('split.html', error=f'Η στήλη "{column}" δεν βρέθηκε στο αρχείο')
-        
-        # Create a directory for split files
-        output_dir = os.path.join(app.config['UPLOAD_FOLDER'], 'split_files')
-        os.makedirs(output_dir, exist_ok=True)
-        
-        # Split the dataframe by unique values in the selected column
-        unique_values = df[column].unique()
-        split_files = []
-        
-        for value in unique_values:
-            # Create a clean filename from the value
-            clean_value = str(value).replace('/', '_').replace('\\', '_')
-            filename = f'split_{clean_value}.xlsx'
-            filepath = os.path.join(output_dir, filename)
-            
-            # Save the filtered dataframe
-            df[df[column] == value].to_excel(filepath, index=False)
-            split_files.append(filepath)
-        
-        # Create a zip file containing all split files
-        zip_filename = f'split_files_{secure_filename(file.filename)}.zip'
-        zip_path = os.path.join(app.config['UPLOAD_FOLDER'], zip_filename)
-        
-        with zipfile.ZipFile(zip_path, 'w') as zipf:
-            for file_path in split_files:
-                arcname = os.path.basename(file_path)
-                zipf.write(file_path, arcname)
-        
-        # Clean up individual split files
-        for file_path in split_files:
-            os.remove(file_path)
+        compresslevel = compresslevel_value(request.form.get('compresslevel', app.config['ARCHIVE_COMPRESSLEVEL']))
+        sheet_name, header = sheet_selection(file_path, request.form, allow_all=True)
+    except ValueError as e:
+        if request.form.get('async'):
+            return jsonify({'error': str(e)}), 400
+        return render_template('split.html', error=str(e))
+
+    if request.form.get('async'):
+        job_id = submit_job('split', _split_job, file_path, column, original_filename, layout, compresslevel,
+                            output_format, sheet_name, header)
+        if job_id is None:
+            return jsonify({'error': 'Ο διακομιστής είναι απασχολημένος, δοκιμάστε αργότερα'}), 503
+        return jsonify(job_response(job_id)), 202
+
+    try:
+        output_path = os.path.join(workspaces.create(), _split_output_name(original_filename, layout))
+        part_count, output_path = split_workbook(file_path, column, output_path, layout,
+                                                 compresslevel=compresslevel, output_format=output_format,
+                                                 sheet_name=sheet_name, header=header)
+        output_filename = os.path.basename(output_path)
+        file_id = workspaces.register(output_path, output_filename)
         
         return render_template('split.html', 
-                             success=f'Το αρχείο διαχωρίστηκε σε {len(split_files)} αρχεία με βάση τη στήλη "{column}"',
-                             download_link={'url': url_for('download_file', filename=zip_filename),
-                                          'filename': zip_filename})
+                             success=f'Το αρχείο διαχωρίστηκε σε {part_count} {"φύλλα" if layout == "sheets" else "αρχεία"} με βάση τη στήλη "{column}"',
+                             download_link={'url': url_for('download_file', file_id=file_id),
+                                          'filename': output_filename})
         
+    except KeyError:
+        return render_template('split.html', error=f'Η στήλη "{column}" δεν βρέθηκε στο αρχείο')
     except Exception as e:
         return render_template('split.html', error=f'Σφάλμα κατά την επεξεργασία του αρχείου: {str(e)}')
 
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    if job_store.get(job_id) is None:
+        return jsonify({'error': 'Η εργασία δεν βρέθηκε'}), 404
+    return jsonify(job_response(job_id))
+
+@app.route('/jobs/<job_id>/result')
+def job_result(job_id):
+    job = job_store.get(job_id)
+    if job is None or job['status'] != 'finished':
+        return jsonify({'error': 'Το αποτέλεσμα δεν είναι διαθέσιμο'}), 404
+    if not os.path.exists(job['result_path']):
+        return jsonify({'error': 'Το αποτέλεσμα έχει λήξει'}), 410
+    return send_file(os.path.abspath(job['result_path']), as_attachment=True,
+                     download_name=job['result_name'])
+
+@app.route('/jobs/<job_id>/profile')
+def job_profile(job_id):
+    job = job_store.get(job_id)
+    if job is None or not job['profile_path'] or not os.path.exists(job['profile_path']):
+        return jsonify({'error': 'Δεν υπάρχει καταγραφή προφίλ για την εργασία'}), 404
+    return send_file(os.path.abspath(job['profile_path']), as_attachment=True,
+                     download_name=f'profile_{job_id}.prof')
+
+@app.route('/metrics')
+def metrics():
+    cache = [('hits', workbook_cache.hits), ('disk_hits', workbook_cache.disk_hits),
+             ('misses', workbook_cache.misses)]
+    lines = ['# HELP excel_tools_workbook_cache_lookups_total Workbook cache lookups by outcome',
+             '# TYPE excel_tools_workbook_cache_lookups_total counter']
+    lines += [f'excel_tools_workbook_cache_lookups_total{{result="{name}"}} {count}' for name, count in cache]
+    lines += ['# HELP excel_tools_jobs_pending Background jobs queued or running in this process',
+              '# TYPE excel_tools_jobs_pending gauge', f'excel_tools_jobs_pending {_pending_jobs}']
+    return Response(stage_metrics.render() + '\n'.join(lines) + '\n',
+                    mimetype='text/plain; version=0.0.4')
+
 # Route for the SQL generation page
 @app.route('/sql-generation', methods=['GET', 'POST'])
 def sql_generation_page():
     if request.method == 'POST':
-        if 'file' not in request.files:
-            return render_template('sql_generation.html', error='Δεν υπάρχει τμήμα αρχείου')
+        # Changing the sheet or header row re-posts the stored file's reference
+        filename = request.form.get('filename')
+        original_filename = request.form.get('original_filename', '')
+        if not filename:
+            if 'file' not in request.files:
+                return render_template('sql_generation.html', error='Δεν υπάρχει τμήμα αρχείου')
 
-        file = request.files['file']
-        if file.filename == '':
-            return render_template('sql_generation.html', error='Δεν έχει επιλεγεί αρχείο')
+            file = request.files['file']
+            if file.filename == '':
+                return render_template('sql_generation.html', error='Δεν έχει επιλεγεί αρχείο')
 
-        if file and file.filename.endswith('.xlsx'):
-            filename = secure_filename(file.filename)
-            file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            file.save(file_path)
+            if not spreadsheet_format(file):
+                return render_template('sql_generation.html', error='Μη έγκυρος τύπος αρχείου')
+            filename = workspaces.store_upload(file)
+            original_filename = file.filename
 
-            columns = get_column_names(file_path)
-            return render_template('sql_generation.html', columns=columns, filename=filename)
+        try:
+            file_path = workspaces.input_path(filename)
+            sheet_name, header = sheet_selection(file_path, request.form)
+        except FileNotFoundError:
+            return render_template('sql_generation.html', error='Το αρχείο δεν βρέθηκε')
+        except ValueError as e:
+            return render_template('sql_generation.html', error=str(e))
 
-        return render_template('sql_generation.html', error='Μη έγκυρος τύπος αρχείου')
+        columns = get_column_names(file_path, sheet_name, header)
+        return render_template('sql_generation.html', columns=columns, filename=filename,
+                               original_filename=secure_filename(original_filename),
+                               sheets=get_sheet_names(file_path), sheet=sheet_name,
+                               header_row=header + 1)
     return render_template('sql_generation.html')
 
 
+# SQL dialects sql_literals() writes for; only MySQL escapes backslashes
+SQL_DIALECTS = ('mysql', 'postgres', 'sqlite', 'ansi')
+# One UPDATE per row, multi-row UPDATE with CASE WHEN, or INSERT-or-UPDATE
+SQL_MODES = ('update', 'case', 'upsert')
+
+def sql_literals(series, dialect='mysql'):
+    """Render a column as SQL literals: NULL for missing values, bare numbers
+    for numeric columns and quoted, escaped strings for everything else"""
+    if pd.api.types.is_float_dtype(series):
+        # pandas reads an integer column with blanks as float; 7.0 goes back to 7
+        literals = series.astype(str)
+        integral = series.notna() & (series % 1 == 0) & (series.abs() < 2 ** 63)
+        literals[integral] = series[integral].astype('int64').astype(str)
+    elif pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        literals = series.astype(str)
+    else:
+        text = series.astype(str)
+        if dialect == 'mysql':
+            # MySQL treats backslashes in string literals as escapes
+            text = text.str.replace('\\', '\\\\', regex=False)
+        literals = "'" + text.str.replace("'", "''", regex=False) + "'"
+    return literals.mask(series.isna(), 'NULL')
+
+def _join_columns(parts, separator):
+    """Concatenate several string Series element-wise"""
+    joined = parts[0]
+    for part in parts[1:]:
+        joined = joined + separator + part
+    return joined
+
+@stage('build_sql')
+def build_update_statements(df, table_name, key_column, key_column_name, mapping, dialect='mysql'):
+    """One UPDATE statement per row with a key, built column-wise, indexed
+    like df. mapping is {Excel column: table column}."""
+    df = df[df[key_column].notna()]
+    set_clauses = _join_columns([f'{table_column}=' + sql_literals(df[column], dialect)
+                                 for column, table_column in mapping.items()], ', ')
+    return (f'UPDATE {table_name} SET ' + set_clauses + f' WHERE {key_column_name}='
+            + sql_literals(df[key_column], dialect) + ';')
+
+def iter_batched_statements(df, table_name, key_column, key_column_name, mapping, mode,
+                            batch_size, dialect='mysql'):
+    """Yield multi-row statements covering batch_size rows each, either
+    INSERT-or-UPDATE (mode='upsert': ON DUPLICATE KEY UPDATE for MySQL, ON
+    CONFLICT for PostgreSQL and SQLite) or UPDATE with CASE WHEN per column
+    (mode='case'). Rows without a key are left out: they would insert new
+    rows, or match nothing. Raises ValueError for an unknown mode or an
+    upsert in standard SQL, which has none short of MERGE."""
+    if mode not in ('case', 'upsert'):
+        raise ValueError(f'Άγνωστος τύπος εντολών πολλών γραμμών: {mode}')
+    if mode == 'upsert' and dialect == 'ansi':
+        raise ValueError('Η standard SQL δεν έχει εντολή upsert· επιλέξτε MySQL, PostgreSQL ή SQLite')
+    df = df[df[key_column].notna()]
+    keys = sql_literals(df[key_column], dialect)
+    values = {column: sql_literals(df[column], dialect) for column in mapping}
+
+    if mode == 'upsert':
+        columns = ', '.join([key_column_name, *mapping.values()])
+        if dialect == 'mysql':
+            conflict = 'ON DUPLICATE KEY UPDATE ' + ', '.join(f'{c} = VALUES({c})' for c in mapping.values())
+        else:
+            conflict = (f'ON CONFLICT ({key_column_name}) DO UPDATE SET '
+                        + ', '.join(f'{c} = EXCLUDED.{c}' for c in mapping.values()))
+        tuples = ('(' + _join_columns([keys, *values.values()], ', ') + ')').tolist()
+        for start in range(0, len(tuples), batch_size):
+            yield (f'INSERT INTO {table_name} ({columns}) VALUES\n'
+                   + ',\n'.join(tuples[start:start + batch_size])
+                   + f'\n{conflict};')
+        return
+
+    whens = {column: ('WHEN ' + keys + ' THEN ' + literals).tolist()
+             for column, literals in values.items()}
+    keys = keys.tolist()
+    for start in range(0, len(keys), batch_size):
+        end = start + batch_size
+        cases = ',\n'.join(
+            f'{table_column} = CASE {key_column_name} {" ".join(whens[column][start:end])} '
+            f'ELSE {table_column} END'
+            for column, table_column in mapping.items())
+        yield (f'UPDATE {table_name} SET\n{cases}\n'
+               f'WHERE {key_column_name} IN ({", ".join(keys[start:end])});')
+
 # Route for generating SQL statements based on user input (called by form submission)
 @app.route('/generate-sql', methods=['POST'])
+@heavy_route('sql_generation.html')
 def generate_sql():
     filename = request.form.get('filename')
+    original_filename = secure_filename(request.form.get('original_filename', '')) or 'data.xlsx'
     table_name = request.form.get('table_name')
     key_column = request.form.get('key_column')
     key_column_name = request.form.get('key_column_name')
+    output = request.form.get('output', 'excel')
+    mode = request.form.get('mode', 'update')
+    batch_size = max(request.form.get('batch_size', app.config['SQL_BATCH_SIZE'], type=int) or 1, 1)
+    dialect = request.form.get('dialect', 'mysql')
 
     if not all([filename, table_name, key_column, key_column_name]):
         return render_template('sql_generation.html', error='Missing required data')
+    if mode not in SQL_MODES:
+        return render_template('sql_generation.html', error=f'Άγνωστος τύπος εντολών: {mode}')
+    if dialect not in SQL_DIALECTS:
+        return render_template('sql_generation.html', error=f'Άγνωστη βάση δεδομένων: {dialect}')
+    if mode == 'upsert' and dialect == 'ansi':
+        return render_template('sql_generation.html', error='Η standard SQL δεν έχει εντολή upsert· '
+                               'επιλέξτε MySQL, PostgreSQL ή SQLite')
 
-    file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-    try:
-        df = pd.read_excel(file_path)
-        sql_statements = []
-        for index, row in df.iterrows():
-            set_clauses = []
-            for column in df.columns:
-                if column != key_column and request.form.get(column):
-                    table_column = request.form.get(column)
-                    set_clauses.append(f"{table_column}='{row[column]}'")
-            
-            if set_clauses:
-                update_statement = f"UPDATE {table_name} SET {', '.join(set_clauses)} WHERE {key_column_name}='{row[key_column]}';"
-                sql_statements.append(update_statement)
+    try:
+        file_path = workspaces.input_path(filename)
+        df = read_workbook(file_path, *sheet_selection(file_path, request.form))
+        key_column = next((column for column in df.columns if str(column) == key_column), key_column)
+
+        # Resolve the Excel column -> table column mapping once
+        mapping = {column: request.form.get(str(column)) for column in df.columns
+                   if column != key_column and request.form.get(str(column))}
+        if not mapping:
+            return render_template('sql_generation.html', error='Δεν αντιστοιχίστηκε καμία στήλη σε πεδίο του πίνακα')
+
+        # No statement can address a row without a key
+        skipped = int(df[key_column].isna().sum())
+        warning = f'Παραλείφθηκαν {skipped} γραμμές χωρίς τιμή στη στήλη κλειδιού' if skipped else None
+
+        if output == 'sql' or mode != 'update':
+            # Stream a .sql script; multi-row statements only make sense here
+            if mode == 'update':
+                statements = (statement for statement in build_update_statements(
+                    df, table_name, key_column, key_column_name, mapping, dialect))
+            else:
+                statements = iter_batched_statements(df, table_name, key_column, key_column_name,
+                                                     mapping, mode, batch_size, dialect)
+            if warning:
+                statements = chain([f'-- {warning}'], statements)
+            response = Response(stream_with_context(statement + '\n' for statement in statements),
+                                mimetype='application/sql')
+            sql_filename = os.path.splitext(original_filename)[0] + '.sql'
+            response.headers['Content-Disposition'] = f'attachment; filename=sql_generated_{sql_filename}'
+            return response
 
         # Add SQL statements to a new column in the DataFrame
-        df['sql_statement'] = sql_statements
+        df['sql_statement'] = build_update_statements(df, table_name, key_column, key_column_name,
+                                                      mapping, dialect)
 
         # Create a new Excel file with the SQL statements
-        output_filename = f"sql_generated_{filename}"
-        output_path = os.path.join(app.config['UPLOAD_FOLDER'], output_filename)
-        df.to_excel(output_path, index=False)
+        output_filename = f"sql_generated_{original_filename}"
+        output_path = os.path.join(workspaces.create(), output_filename)
+        fmt = choose_output_format(len(df), request.form.get('output_format'))
+        output_path = write_frames(output_path, {'Sheet1': df}, fmt)
+        output_filename = os.path.basename(output_path)
+        file_id = workspaces.register(output_path, output_filename)
 
-        download_link = {'url': url_for('download_file', filename=output_filename), 'filename': output_filename}
-        return render_template('sql_generation.html', download_link=download_link)
+        download_link = {'url': url_for('download_file', file_id=file_id), 'filename': output_filename}
+        return render_template('sql_generation.html', download_link=download_link, warning=warning)
 
     except Exception as e:
         return render_template('sql_generation.html', error=str(e))
@@ -646,7 +4117,40 @@ def generate_sql():
 def excel_to_word_page():
     return render_template('excel-to-word.html')
 
+def warm_up():
+    """Import and exercise the heavy libraries once: the pandas Excel and CSV
+    readers and writers, openpyxl, python-docx and its default template, the
+    date parsers and the page templates. Run in the gunicorn master before
+    it forks (see gunicorn.conf.py), so every worker starts with them loaded
+    and shares the memory copy-on-write instead of paying for them on its
+    first request. Returns the seconds taken."""
+    start = time.perf_counter()
+    df = pd.DataFrame({'a': [1, 2], 'b': ['x', None], 'c': pd.to_datetime(['2024-01-02', '2024-01-03'])})
+    buffer = io.BytesIO()
+    with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
+        df.to_excel(writer, index=False)
+    buffer.seek(0)
+    pd.read_excel(buffer, engine='openpyxl')
+    buffer.seek(0)
+    with read_only_workbook(buffer) as workbook:
+        list(workbook.active.iter_rows(values_only=True))
+    frame = pd.read_csv(io.StringIO(df.to_csv(index=False)), dtype=str, keep_default_na=False)
+    _infer_dtypes([frame])
+    pd.to_datetime(pd.Series(['2024-01-02', '02/01/2024 10:00']), errors='coerce', format='mixed')
+    pd.factorize(df['b'], use_na_sentinel=False)
+
+    doc = docx.Document()
+    doc.add_paragraph('{a}')
+    template = io.BytesIO()
+    doc.save(template)
+    CompiledTemplate(template.getvalue()).render({'{a}': '1'})
+
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+    return time.perf_counter() - start
+
 if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
     # Get port from environment variable or default to 8000
     port = int(os.environ.get('PORT', 8000))
     # Run the app on all interfaces
@@ -0,0 +1,119 @@
+"""Synthetic inputs for the benchmark suite: workbooks of a given size and
+shape, and .docx templates whose placeholders are split across runs.
+
+Usage: python benchmarks/generate.py OUTPUT_DIR [--rows N] [--columns N] [--cardinality N]
+"""
+import argparse
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+from docx import Document
+from openpyxl import Workbook
+
+# Cell types cycled through for the extra columns
+CELL_TYPES = ('int', 'float', 'text', 'date', 'bool')
+
+def make_frame_columns(rows, columns, cardinality, seed=0):
+    """Columns of a synthetic sheet as {name: numpy array}. 'id' is a unique
+    key, 'category' has `cardinality` distinct values and the remaining
+    columns cycle through CELL_TYPES, with about 5% blank cells."""
+    rng = np.random.default_rng(seed)
+    data = {
+        'id': np.arange(1, rows + 1),
+        'category': np.array([f'cat_{i}' for i in range(cardinality)], dtype=object)[
+            rng.integers(0, cardinality, rows)],
+    }
+    start = datetime(2020, 1, 1)
+    for i in range(max(columns - 2, 0)):
+        kind = CELL_TYPES[i % len(CELL_TYPES)]
+        if kind == 'int':
+            values = rng.integers(0, 1_000_000, rows).astype(object)
+        elif kind == 'float':
+            values = rng.normal(1000, 250, rows).round(2).astype(object)
+        elif kind == 'text':
+            values = np.array([f'Κείμενο {n}' for n in rng.integers(0, rows * 2 or 1, rows)], dtype=object)
+        elif kind == 'date':
+            values = np.array([start + timedelta(days=int(d)) for d in rng.integers(0, 3650, rows)],
+                              dtype=object)
+        else:
+            values = (rng.random(rows) < 0.5).astype(object)
+        values[rng.random(rows) < 0.05] = None
+        data[f'{kind}_{i}'] = values
+    return data
+
+def write_workbook(path, data):
+    """Write {name: values} as a single-sheet .xlsx with a header row"""
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('Sheet1')
+    names = list(data)
+    ws.append(names)
+    for row in zip(*(data[name] for name in names)):
+        ws.append([value.item() if isinstance(value, np.generic) else value for value in row])
+    wb.save(path)
+    return path
+
+def make_workbook_pair(folder, rows, columns=8, cardinality=20, seed=0):
+    """Write a workbook and a changed copy of it for compare and join. The
+    copy drops about 10% of the rows, changes a column in another 10% and
+    adds 5% new ids. Returns the two paths."""
+    data = make_frame_columns(rows, columns, cardinality, seed)
+    first = write_workbook(os.path.join(folder, f'left_{rows}x{columns}.xlsx'), data)
+
+    rng = np.random.default_rng(seed + 1)
+    keep = rng.random(rows) >= 0.1
+    changed = {name: values[keep].copy() for name, values in data.items()}
+    modified = rng.random(int(keep.sum())) < 0.1
+    changed['category'][modified] = 'changed'
+    extra = max(rows // 20, 1)
+    new_rows = make_frame_columns(extra, columns, cardinality, seed + 2)
+    new_rows['id'] = new_rows['id'] + rows
+    for name in changed:
+        changed[name] = np.concatenate([changed[name], new_rows[name]])
+    second = write_workbook(os.path.join(folder, f'right_{rows}x{columns}.xlsx'), changed)
+    return first, second
+
+def _add_split_placeholder(paragraph, placeholder):
+    """Add a placeholder split over three runs, the way Word often saves them"""
+    paragraph.add_run(placeholder[:2])
+    paragraph.add_run(placeholder[2:-2]).bold = True
+    paragraph.add_run(placeholder[-2:])
+
+def make_template(path, placeholders, paragraphs=20):
+    """Write a .docx using each placeholder in body paragraphs, a table, the
+    header and the footer, with every placeholder split across runs"""
+    doc = Document()
+    section = doc.sections[0]
+    _add_split_placeholder(section.header.paragraphs[0], placeholders[0])
+    _add_split_placeholder(section.footer.paragraphs[0], placeholders[-1])
+
+    for i in range(paragraphs):
+        paragraph = doc.add_paragraph(f'Παράγραφος {i}: ')
+        _add_split_placeholder(paragraph, placeholders[i % len(placeholders)])
+        paragraph.add_run(' και ένα κείμενο που δεν αλλάζει.')
+
+    table = doc.add_table(rows=len(placeholders), cols=2)
+    for row, placeholder in zip(table.rows, placeholders):
+        row.cells[0].text = placeholder.strip('{}')
+        _add_split_placeholder(row.cells[1].paragraphs[0], placeholder)
+    doc.save(path)
+    return path
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('output_dir')
+    parser.add_argument('--rows', type=int, default=10_000)
+    parser.add_argument('--columns', type=int, default=8)
+    parser.add_argument('--cardinality', type=int, default=20)
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    paths = make_workbook_pair(args.output_dir, args.rows, args.columns, args.cardinality)
+    columns = list(make_frame_columns(1, args.columns, 1))
+    template = make_template(os.path.join(args.output_dir, 'template.docx'),
+                             [f'{{{name}}}' for name in columns])
+    for path in (*paths, template):
+        print(path)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,294 @@
+"""Time the tools on synthetic inputs and report wall time, peak RSS and
+rows/sec as JSON.
+
+Every case runs in a fresh interpreter inside an empty working directory,
+so the workbook cache and upload folders start cold and peak RSS belongs to
+that case alone. The first run of a case is reported as cold_seconds; later
+runs hit the workbook cache.
+
+Usage:
+    python benchmarks/run.py --rows 1000,10000,100000 --output results.json
+    python benchmarks/run.py --baseline previous.json   # exit 1 on regressions
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+import generate
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _placeholders(columns):
+    return [f'{{{name}}}' for name in columns]
+
+def bench_compare(m, client, inputs):
+    def run():
+        output_path = os.path.join(m.workspaces.create(), 'comparison_result.xlsx')
+        m.compare_files(inputs['left'], inputs['right'], 'id', 'id', output_path)
+    return run
+
+def bench_join(m, client, inputs):
+    def run():
+        output_path = os.path.join(m.workspaces.create(), 'joined_result.xlsx')
+        m.join_files(inputs['left'], inputs['right'], 'id', 'id', 'inner', output_path=output_path)
+    return run
+
+def _form_route(client, url, content, fields):
+    def run():
+        response = client.post(url, data={'file': (io.BytesIO(content), 'left.xlsx'), **fields})
+        if '/download/' not in response.get_data(as_text=True):
+            raise RuntimeError(f'{url} failed')
+    return run
+
+def bench_split(m, client, inputs):
+    with open(inputs['left'], 'rb') as f:
+        content = f.read()
+    return _form_route(client, '/split', content, {'column': 'category'})
+
+def bench_filter(m, client, inputs):
+    with open(inputs['left'], 'rb') as f:
+        content = f.read()
+    return _form_route(client, '/filter', content, {'column': 'category', 'value': 'cat_0'})
+
+def bench_generate_sql(m, client, inputs):
+    with open(inputs['left'], 'rb') as f:
+        reference = client.post('/upload', data={'file': (f, 'left.xlsx')}).json['filename']
+    mapping = {name: name for name in inputs['columns'] if name != 'id'}
+
+    def run():
+        response = client.post('/generate-sql', data={
+            'filename': reference, 'original_filename': 'left.xlsx', 'table_name': 'bench',
+            'key_column': 'id', 'key_column_name': 'id', **mapping})
+        if '/download/' not in response.get_data(as_text=True):
+            raise RuntimeError('/generate-sql failed')
+    return run
+
+def bench_placeholders(m, client, inputs):
+    from docx import Document
+    with open(inputs['template'], 'rb') as f:
+        template = f.read()
+    placeholders = _placeholders(inputs['columns'])
+    rows = inputs['rows']
+
+    def run():
+        for i in range(rows):
+            doc = Document(io.BytesIO(template))
+            found = m.extract_placeholders(doc)
+            m.replace_placeholders(doc, {ph: f'value {i}' for ph in found or placeholders})
+    return run
+
+def bench_generate(m, client, inputs, **options):
+    # Every repeat renders every row, not documents cached by the one before
+    m.app.config['MERGE_CACHE_DISK'] = 0
+    with open(inputs['left'], 'rb') as excel, open(inputs['template'], 'rb') as word:
+        uploaded = client.post('/upload-xls-docx', data={
+            'excel': (excel, 'left.xlsx'), 'word': (word, 'template.docx')}).json
+    mappings = {ph: ph.strip('{}') for ph in uploaded['placeholders']}
+
+    def run():
+        response = client.post('/generate', json={
+            'excel_file': uploaded['excel_file'], 'word_file': uploaded['word_file'],
+            'mappings': mappings, 'key_column': 'id', **options})
+        if response.status_code != 200 or not response.get_data():
+            raise RuntimeError('/generate failed')
+        response.close()
+    return run
+
+def bench_generate_combined(m, client, inputs):
+    return bench_generate(m, client, inputs, combine=True)
+
+def bench_generate_rerun(m, client, inputs):
+    """Re-runs of a merge whose documents are all cached already"""
+    run = bench_generate(m, client, inputs)
+    m.app.config['MERGE_CACHE_DISK'] = 2 * 1024 ** 3
+    run()
+    return run
+
+CASES = {
+    'compare': bench_compare,
+    'join': bench_join,
+    'split': bench_split,
+    'filter': bench_filter,
+    'generate_sql': bench_generate_sql,
+    'placeholders': bench_placeholders,
+    'generate': bench_generate,
+    'generate_combined': bench_generate_combined,
+    'generate_rerun': bench_generate_rerun,
+}
+# Cases rendering one document per row run at --merge-rows instead of --rows
+MERGE_CASES = {'placeholders', 'generate', 'generate_combined', 'generate_rerun'}
+
+def _peak_rss_mb():
+    """Peak RSS of this process and of its largest child, in MB"""
+    if resource is None:
+        return None, None
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    unit = 1 if sys.platform == 'darwin' else 1024
+    return tuple(round(resource.getrusage(who).ru_maxrss * unit / 1024 ** 2, 1)
+                 for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN))
+
+def run_worker(case, inputs, repeat):
+    """Time one case in this process and print its result as JSON"""
+    sys.path.insert(0, REPO_ROOT)
+    import app as excel_tools
+    excel_tools.app.config['MAX_CONTENT_LENGTH'] = None
+    client = excel_tools.app.test_client()
+    run = CASES[case](excel_tools, client, inputs)
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+
+    wall = statistics.median(times)
+    peak_rss, peak_child_rss = _peak_rss_mb()
+    print(json.dumps({
+        'wall_seconds': round(wall, 4),
+        'cold_seconds': round(times[0], 4),
+        'runs': [round(t, 4) for t in times],
+        'peak_rss_mb': peak_rss,
+        'peak_child_rss_mb': peak_child_rss,
+        'rows_per_second': round(inputs['rows'] / wall, 1) if wall else None,
+    }))
+
+def prepare_inputs(data_dir, rows, columns, cardinality):
+    """Generate (or reuse) the workbooks and template for one size"""
+    folder = os.path.join(data_dir, f'{rows}x{columns}c{cardinality}')
+    os.makedirs(folder, exist_ok=True)
+    left = os.path.join(folder, f'left_{rows}x{columns}.xlsx')
+    right = os.path.join(folder, f'right_{rows}x{columns}.xlsx')
+    if not (os.path.exists(left) and os.path.exists(right)):
+        generate.make_workbook_pair(folder, rows, columns, cardinality)
+    column_names = list(generate.make_frame_columns(1, columns, 1))
+    template = os.path.join(folder, 'template.docx')
+    if not os.path.exists(template):
+        generate.make_template(template, _placeholders(column_names))
+    return {'left': left, 'right': right, 'template': template,
+            'rows': rows, 'columns': column_names}
+
+def run_case(case, inputs, repeat, timeout):
+    """Run a case in a fresh interpreter and working directory"""
+    with tempfile.TemporaryDirectory(prefix=f'bench-{case}-') as workdir:
+        command = [sys.executable, os.path.abspath(__file__), '--worker', case,
+                   '--inputs', json.dumps(inputs), '--repeat', str(repeat)]
+        try:
+            completed = subprocess.run(command, cwd=workdir, capture_output=True, text=True,
+                                       timeout=timeout)
+        except subprocess.TimeoutExpired:
+            return {'error': f'timed out after {timeout}s'}
+    if completed.returncode != 0:
+        return {'error': completed.stderr.strip().splitlines()[-1] if completed.stderr.strip()
+                else f'exit code {completed.returncode}'}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def find_regressions(results, baseline, threshold):
+    """Results slower than the matching baseline entry by more than threshold"""
+    previous = {(r['case'], r['rows'], r['columns']): r for r in baseline['results']
+                if 'wall_seconds' in r}
+    regressions = []
+    for result in results:
+        before = previous.get((result['case'], result['rows'], result['columns']))
+        if before and 'wall_seconds' in result and \
+                result['wall_seconds'] > before['wall_seconds'] * (1 + threshold):
+            regressions.append({'case': result['case'], 'rows': result['rows'],
+                                'before': before['wall_seconds'], 'after': result['wall_seconds']})
+    return regressions
+
+def _int_list(value):
+    return [int(item) for item in value.split(',') if item]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--cases', default=','.join(CASES),
+                        help=f'comma-separated subset of: {", ".join(CASES)}')
+    parser.add_argument('--rows', type=_int_list, default=[1000, 10_000, 100_000],
+                        help='comma-separated row counts, e.g. 1000,100000,1000000')
+    parser.add_argument('--columns', type=int, default=8)
+    parser.add_argument('--cardinality', type=int, default=20,
+                        help='distinct values of the split/filter column')
+    parser.add_argument('--merge-rows', type=int, default=200,
+                        help='documents rendered by the placeholders and generate cases')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--timeout', type=int, default=3600, help='seconds per case')
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'excel-tools-bench'),
+                        help='where generated inputs are kept between runs')
+    parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    parser.add_argument('--baseline', help='JSON report of an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='slowdown over the baseline reported as a regression')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    parser.add_argument('--inputs', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, json.loads(args.inputs), args.repeat)
+        return
+
+    cases = [case for case in args.cases.split(',') if case]
+    unknown = set(cases) - set(CASES)
+    if unknown:
+        parser.error(f'unknown cases: {", ".join(sorted(unknown))}')
+
+    results = []
+    for case in cases:
+        for rows in ([args.merge_rows] if case in MERGE_CASES else args.rows):
+            inputs = prepare_inputs(args.data_dir, rows, args.columns, args.cardinality)
+            result = {'case': case, 'rows': rows, 'columns': args.columns,
+                      'cardinality': args.cardinality,
+                      **run_case(case, inputs, args.repeat, args.timeout)}
+            results.append(result)
+            print(f"{case:>14} {rows:>9} rows  "
+                  + (f"{result['wall_seconds']:>9.3f}s  {result['rows_per_second']:>11.1f} rows/s  "
+                     f"{result['peak_rss_mb']} MB" if 'error' not in result else result['error']),
+                  file=sys.stderr)
+
+    report = {
+        'meta': {
+            'commit': _git_commit(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'repeat': args.repeat,
+        },
+        'results': results,
+    }
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = find_regressions(results, json.load(f), args.threshold)
+        report['regressions'] = regressions
+        for regression in regressions:
+            print(f"regression: {regression['case']} at {regression['rows']} rows "
+                  f"{regression['before']}s -> {regression['after']}s", file=sys.stderr)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    sys.exit(1 if regressions else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""Measure the cold start of the app with python -X importtime and fail when
+it exceeds a time budget.
+
+Every run is a fresh interpreter in an empty working directory that imports
+the app and serves the home page. The report gives the import time, the time
+to that first page, the slowest top-level imports and any heavy library
+(pandas, numpy, openpyxl, python-docx, ...) loaded on the way, which fails
+the check too: template-only pages must not need them.
+
+Usage:
+    python benchmarks/startup.py                    # best of 5 runs, 400ms budget
+    python benchmarks/startup.py --budget 300 --output startup.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Libraries only the tools themselves need
+HEAVY_MODULES = ('pandas', 'numpy', 'openpyxl', 'docx', 'docx2pdf', 'pyarrow', 'xlsxwriter')
+
+_PROBE = f"""
+import json, sys, time
+sys.path.insert(0, {REPO_ROOT!r})
+import app
+start = time.perf_counter()
+response = app.app.test_client().get('/')
+assert response.status_code == 200, response.status_code
+print(json.dumps({{'first_page_ms': (time.perf_counter() - start) * 1000,
+                   'heavy_modules': [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))
+"""
+
+def parse_importtime(stderr):
+    """(module, self_us, cumulative_us, depth) for each -X importtime line"""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        entries.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return entries
+
+def run_once():
+    with tempfile.TemporaryDirectory(prefix='bench-startup-') as workdir:
+        completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', _PROBE], cwd=workdir,
+                                   capture_output=True, text=True, check=True)
+    entries = parse_importtime(completed.stderr)
+    end = next(i for i, entry in enumerate(entries) if entry[0] == 'app' and entry[3] == 0)
+    # Modules are listed after their imports, so the direct imports of app.py
+    # are the entries one level down since the previous top-level one
+    start = max((i for i in range(end) if entries[i][3] == 0), default=-1) + 1
+    slowest = sorted((entry for entry in entries[start:end] if entry[3] == 1), key=lambda entry: -entry[2])
+    app_entry = entries[end]
+    return {'import_ms': app_entry[2] / 1000,
+            'slowest_imports': [[name, cumulative / 1000] for name, _, cumulative, _ in slowest[:10]],
+            **json.loads(completed.stdout.strip().splitlines()[-1])}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--budget', type=float, default=400, help='milliseconds allowed for import app')
+    parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    args = parser.parse_args()
+
+    run_once()  # Writes the bytecode caches, which a deployed app has
+    runs = [run_once() for _ in range(args.repeat)]
+    best = min(runs, key=lambda run: run['import_ms'])
+    report = {
+        'meta': {'python': platform.python_version(), 'platform': platform.platform(),
+                 'cpu_count': os.cpu_count(), 'repeat': args.repeat},
+        'budget_ms': args.budget,
+        'import_ms': best['import_ms'],
+        'median_import_ms': statistics.median(run['import_ms'] for run in runs),
+        'first_page_ms': best['first_page_ms'],
+        'heavy_modules': sorted({m for run in runs for m in run['heavy_modules']}),
+        'slowest_imports': best['slowest_imports'],
+    }
+
+    failures = []
+    if report['import_ms'] > args.budget:
+        failures.append(f"import app took {report['import_ms']:.0f}ms, over the {args.budget:.0f}ms budget")
+    if report['heavy_modules']:
+        failures.append(f"serving a page imported {', '.join(report['heavy_modules'])}")
+    report['failures'] = failures
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    print(f"import app {report['import_ms']:.0f}ms (median {report['median_import_ms']:.0f}ms), "
+          f"first page {report['first_page_ms']:.1f}ms", file=sys.stderr)
+    for failure in failures:
+        print(f'failed: {failure}', file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+# Production server settings: gunicorn --config gunicorn.conf.py app:app
+#
+# Every value can be overridden from the environment. Heavy requests are
+# additionally limited per process by HEAVY_REQUEST_SLOTS in app.py, so the
+# remaining threads of each worker keep serving the quick endpoints.
+import gc
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+
+# Load the app once in the master, and its libraries in when_ready below
+# (app.py imports them lazily); the forked workers share those pages
+# copy-on-write
+preload_app = True
+
+# Threads suit the I/O-bound routes (uploads, downloads, job polling) and
+# pandas releases the GIL for much of its work. gevent can be chosen with
+# GUNICORN_WORKER_CLASS=gevent if it is installed.
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+# Each worker holds its own workbook cache (WORKBOOK_CACHE_MEMORY), so the
+# count is bounded by memory as much as by CPUs
+workers = int(os.environ.get('WEB_CONCURRENCY', min((os.cpu_count() or 1) + 1, 4)))
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+
+# A worker silent this long is restarted. Synchronous merges and filters of
+# large files may run for minutes; the pages use background jobs for those.
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 300))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 60))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+
+# Recycling workers bounds memory growth, but kills the background jobs they
+# are running, so it is off unless asked for
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 0))
+max_requests_jitter = max_requests // 10
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-')
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+
+def when_ready(server):
+    """Warm the preloaded app in the master, just before the first fork"""
+    from app import warm_up
+    server.log.info('Warm-up took %.2fs', warm_up())
+    # Objects created so far are never collected, so the collector does not
+    # touch (and copy) their pages in every worker. None of them is a lock,
+    # thread or executor: app.py makes those per worker (ProcessLocal).
+    gc.freeze()
@@ -0,0 +1,77 @@
+import pandas as pd
+
+
+def test_modified_cells_ignore_dtype_differences(app):
+    # One text cell makes pandas read file 2's column as object
+    df1 = pd.DataFrame({'id': range(100), 'count': range(100), 'note': [None] * 100})
+    df2 = pd.DataFrame({'id': range(100), 'count': [*range(99), 'x'], 'note': [None] * 100})
+    df2.loc[50, 'count'] = '51'
+    assert df1['count'].dtype == 'int64' and df2['count'].dtype == object
+
+    *_, modified = app._compare_frames(df1, df2, ['id'], ['id'])
+
+    assert modified['id'].tolist() == [50, 99]
+    assert modified['Τιμή αρχείου 2'].tolist() == ['51', 'x']
+
+
+def test_modified_cells_compare_floats_text_and_blanks(app):
+    df1 = pd.DataFrame({'id': [1, 2, 3, 4], 'value': [1.0, None, 'a', 2.5]})
+    df2 = pd.DataFrame({'id': [1, 2, 3, 4], 'value': ['1', None, 'b', 2.5]})
+
+    *_, modified = app._compare_frames(df1, df2, ['id'], ['id'])
+
+    assert modified['id'].tolist() == [3]
+
+
+def test_compare_files_with_mixed_dtypes(app, tmp_path):
+    rows = 1800
+    pd.DataFrame({'id': range(rows), 'amount': range(rows)}).to_excel(tmp_path / 'a.xlsx', index=False)
+    amounts = [str(i + 1) if i % 36 == 0 else i for i in range(rows)]
+    pd.DataFrame({'id': range(rows), 'amount': amounts}).to_excel(tmp_path / 'b.xlsx', index=False)
+
+    path = app.compare_files(str(tmp_path / 'a.xlsx'), str(tmp_path / 'b.xlsx'), 'id', 'id',
+                             str(tmp_path / 'result.xlsx'))
+
+    modified = pd.read_excel(path, sheet_name='Διαφορές')
+    assert len(modified) == 50
+
+
+def _sheets(path):
+    return {name: frame.sort_values(list(frame.columns[:1])).reset_index(drop=True)
+            for name, frame in pd.read_excel(path, sheet_name=None).items()}
+
+
+def test_partitioned_compare_streams_inputs(app, tmp_path, monkeypatch):
+    rows = 3000
+    pd.DataFrame({'id': range(rows), 'name': [f'n{i}' for i in range(rows)]}).to_excel(
+        tmp_path / 'a.xlsx', index=False)
+    ids = range(100, rows + 100)
+    pd.DataFrame({'id': ids, 'name': [f'n{i}' if i % 10 else 'x' for i in ids]}).to_csv(tmp_path / 'b.csv', index=False)
+    a, b = str(tmp_path / 'a.xlsx'), str(tmp_path / 'b.csv')
+    expected = _sheets(app.compare_files(a, b, 'id', 'id', str(tmp_path / 'whole.xlsx')))
+    app.workbook_cache._memory.clear()
+    for name in app.os.listdir(app.workbook_cache.folder):
+        app.os.remove(app.os.path.join(app.workbook_cache.folder, name))
+
+    monkeypatch.setitem(app.app.config, 'COMPARE_MEMORY_BUDGET', 100_000)
+    path = app.compare_files(a, b, 'id', 'id', str(tmp_path / 'parts.xlsx'), output_format='xlsx')
+
+    for name, frame in _sheets(path).items():
+        pd.testing.assert_frame_equal(frame, expected[name], check_dtype=False)
+    # Nothing was parsed whole into the workbook cache
+    assert not app.workbook_cache._memory
+    cached = [name for name in app.os.listdir(app.workbook_cache.folder) if name.endswith(('.pkl', '.parquet'))]
+    assert not cached
+
+
+def test_blank_keys_are_in_one_file_only(app):
+    df1 = pd.DataFrame({'id': [1, None], 'part': ['a', None], 'value': ['x', 'y']})
+    df2 = pd.DataFrame({'id': [1, None], 'part': ['a', None], 'value': ['x', 'z']})
+
+    for keys in (['id'], ['id', 'part']):
+        only1, only2, common, modified = app._compare_frames(df1, df2, keys, keys)
+
+        assert only1['value'].tolist() == ['y']
+        assert only2['value'].tolist() == ['z']
+        assert common['value'].tolist() == ['x']
+        assert modified.empty
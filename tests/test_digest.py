@@ -0,0 +1,39 @@
+import hashlib
+import os
+
+
+def _counting_sha256(monkeypatch, app):
+    calls = []
+    original = hashlib.sha256
+
+    def sha256(*args):
+        calls.append(args)
+        return original(*args)
+
+    monkeypatch.setattr(app.hashlib, 'sha256', sha256)
+    return calls
+
+
+def test_stored_uploads_take_the_digest_from_their_name(app):
+    digest = 'a' * 64
+    path = os.path.join(app.workspaces.inputs, f'{digest}.csv')
+    with open(path, 'wb') as f:
+        f.write(b'id\n1\n')
+    # The name is trusted: the content is not read to check it
+    assert app.file_digest(path) == digest
+    assert app.file_digest(os.path.relpath(path)) == digest
+
+
+def test_other_paths_are_hashed_once_per_version(app, tmp_path, monkeypatch):
+    path = tmp_path / 'data.csv'
+    path.write_bytes(b'id\n1\n')
+    expected = hashlib.sha256(b'id\n1\n').hexdigest()
+    calls = _counting_sha256(monkeypatch, app)
+    assert app.file_digest(str(path)) == expected
+    assert app.file_digest(str(path)) == expected
+    assert len(calls) == 1
+
+    path.write_bytes(b'id\n1\n2\n')
+    os.utime(path, ns=(0, 0))
+    assert app.file_digest(str(path)) != expected
+    assert len(calls) == 2
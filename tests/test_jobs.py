@@ -0,0 +1,34 @@
+import os
+import time
+
+
+def _wait(app, job_id):
+    for _ in range(200):
+        job = app.job_store.get(job_id)
+        if job['status'] in ('finished', 'failed'):
+            return job
+        time.sleep(0.05)
+    raise AssertionError('the job did not end')
+
+
+def test_sweep_keeps_the_workspace_of_a_running_job(app):
+    def job(progress):
+        path = app.job_output_path('.txt')
+        old = time.time() - 2 * app.app.config['RESULT_TTL']
+        os.utime(os.path.dirname(path), (old, old))
+        app.workspaces.sweep(time.time() - app.app.config['RESULT_TTL'])
+        with open(path, 'w') as f:
+            f.write('done')
+        return path, 'result.txt'
+
+    job = _wait(app, app.submit_job('test', job))
+
+    assert job['status'] == 'finished', job['error']
+    with open(job['result_path']) as f:
+        assert f.read() == 'done'
+
+    # Once the job has ended its workspace expires like any other
+    old = time.time() - 2 * app.app.config['RESULT_TTL']
+    os.utime(os.path.dirname(job['result_path']), (old, old))
+    app.workspaces.sweep(time.time() - app.app.config['RESULT_TTL'])
+    assert not os.path.exists(job['result_path'])
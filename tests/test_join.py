@@ -0,0 +1,87 @@
+import pandas as pd
+import pytest
+
+
+@pytest.fixture
+def inputs(tmp_path):
+    rows = 2000
+    pd.DataFrame({'id': range(rows), 'a': [f'a{i}' for i in range(rows)]}).to_excel(
+        tmp_path / 'a.xlsx', index=False)
+    ids = [*range(500, rows + 500), 600, 601]
+    pd.DataFrame({'id': ids, 'b': range(len(ids))}).to_csv(tmp_path / 'b.csv', index=False)
+    return str(tmp_path / 'a.xlsx'), str(tmp_path / 'b.csv')
+
+
+def _read(path):
+    return pd.read_excel(path).sort_values(['id', 'b']).reset_index(drop=True)
+
+
+@pytest.mark.parametrize('how', ['inner', 'left', 'outer', 'anti'])
+def test_partitioned_join_matches_single_pass(app, inputs, tmp_path, monkeypatch, how):
+    expected = _read(app.join_files(*inputs, 'id', 'id', how, output_path=str(tmp_path / 'whole.xlsx'),
+                                    output_format='xlsx')) if how != 'anti' else None
+    app.workbook_cache._memory.clear()
+
+    monkeypatch.setitem(app.app.config, 'JOIN_MEMORY_BUDGET', 50_000)
+    path = app.join_files(*inputs, 'id', 'id', how, output_path=str(tmp_path / 'parts.xlsx'),
+                          output_format='xlsx')
+
+    if how == 'anti':
+        assert len(pd.read_excel(path)) == 500
+    else:
+        pd.testing.assert_frame_equal(_read(path), expected, check_dtype=False)
+    assert not app.workbook_cache._memory
+
+
+def test_partitioned_join_reports_fan_out(app, inputs, tmp_path, monkeypatch):
+    monkeypatch.setitem(app.app.config, 'JOIN_MEMORY_BUDGET', 50_000)
+    a, b = inputs
+    doubled = tmp_path / 'c.csv'
+    pd.concat([pd.read_excel(a)] * 2).to_csv(doubled, index=False)
+
+    with pytest.raises(app.JoinFanOut) as error:
+        app.join_files(str(doubled), b, 'id', 'id', output_path=str(tmp_path / 'out.xlsx'))
+    assert error.value.estimated_rows == 2 * (1500 + 2)
+
+
+def _upload(client, path):
+    with open(path, 'rb') as f:
+        response = client.post('/upload', data={'file': (f, path.rsplit('/', 1)[-1])},
+                               content_type='multipart/form-data')
+    return response.get_json()['filename']
+
+
+@pytest.mark.parametrize('route', ['/compare', '/join'])
+def test_sync_result_is_sent_from_another_working_directory(app, client, inputs, route):
+    # The tests run outside the app root, where relative paths resolve elsewhere
+    assert app.os.getcwd() != app.app.root_path
+    file1, file2 = (_upload(client, path) for path in inputs)
+
+    response = client.post(route, json={'file1': file1, 'file2': file2, 'col1': 'id', 'col2': 'id'})
+
+    assert response.status_code == 200, response.get_json()
+    assert response.data[:2] == b'PK'
+    response.close()
+
+
+@pytest.mark.parametrize('budget', [None, 500])
+@pytest.mark.parametrize('how, rows', [('inner', [(1, 'x', 'p')]),
+                                       ('left', [(1, 'x', 'p'), (None, 'y', None)]),
+                                       ('right', [(1, 'x', 'p'), (None, None, 'q')]),
+                                       ('outer', [(1, 'x', 'p'), (None, 'y', None), (None, None, 'q')]),
+                                       ('anti', [(None, 'y')])])
+def test_blank_keys_never_match(app, tmp_path, monkeypatch, budget, how, rows):
+    if budget:
+        monkeypatch.setitem(app.app.config, 'JOIN_MEMORY_BUDGET', budget)
+    pd.DataFrame({'id': [1, None], 'a': ['x', 'y']}).to_csv(tmp_path / 'a.csv', index=False)
+    pd.DataFrame({'id': [1, None], 'b': ['p', 'q']}).to_csv(tmp_path / 'b.csv', index=False)
+    path = app.join_files(str(tmp_path / 'a.csv'), str(tmp_path / 'b.csv'), 'id', 'id', how,
+                          output_path=str(tmp_path / 'out.xlsx'), output_format='xlsx')
+    result = pd.read_excel(path).astype(object)
+    found = [tuple(None if pd.isna(v) else v for v in row) for row in result.itertuples(index=False)]
+    # Partitions are written one after the other, so only the set of rows is fixed
+    assert sorted(found, key=repr) == sorted(rows, key=repr)
+
+    left = app._with_join_keys(pd.DataFrame({'id': [1, None]}), ['id'], ())
+    right = app._with_join_keys(pd.DataFrame({'id': [1, None]}), ['id'], ())
+    assert app.join_row_counts(left, right, ['__key0']) == [1, 1, 1, 2, 2]
@@ -0,0 +1,65 @@
+import os
+import time
+
+import pytest
+
+
+@pytest.fixture
+def cache(app, tmp_path):
+    return app.MergeCache(str(tmp_path / 'merge_cache'), str(tmp_path / 'jobs.db'), 10 ** 9)
+
+
+ROWS = [('1', {'{name}': 'a'}), ('2', {'{name}': 'b'})]
+MAPPINGS = {'{name}': 'name'}
+SOURCE = [0, 0, ['id', 'name']]
+FORMATS = {'docx': True}
+
+
+def _run(cache, template=b'template', rows=ROWS, source=SOURCE):
+    plan = cache.plan(template, rows, MAPPINGS, 'id', FORMATS, source)
+    cache.save_manifest(plan, rows)
+    return plan
+
+
+def test_rerun_compares_with_the_last_run_of_the_same_merge(cache):
+    _run(cache)
+    changed = [ROWS[0], ('2', {'{name}': 'c'}), ('3', {'{name}': 'd'})]
+    summary = cache.plan(b'template', changed, MAPPINGS, 'id', FORMATS, SOURCE)['summary']
+    assert summary['added'] == 1 and summary['changed'] == 1 and summary['unchanged'] == 1
+
+
+@pytest.mark.parametrize('other', [{'template': b'other template'},
+                                   {'source': ['Sheet2', 0, ['id', 'name']]},
+                                   {'source': [0, 0, ['id', 'name', 'email']]}])
+def test_other_template_or_sheet_is_another_merge(cache, other):
+    first = _run(cache)
+    plan = cache.plan(other.get('template', b'template'), ROWS, MAPPINGS, 'id', FORMATS,
+                      other.get('source', SOURCE))
+    assert plan['merge_id'] != first['merge_id']
+    assert plan['summary']['added'] == len(ROWS)
+
+
+def test_sweep_deletes_documents_and_manifests_not_used_since_cutoff(cache, tmp_path):
+    plan = _run(cache)
+    cache.store(plan['hashes'][0], b'old', None)
+    cache.store(plan['hashes'][1], b'recent', None)
+    old = cache._path(plan['hashes'][0], 'docx')
+    os.utime(old, (time.time() - 7200, time.time() - 7200))
+    cache.sweep(time.time() - 3600)
+    assert not os.path.exists(old)
+    assert os.path.exists(cache._path(plan['hashes'][1], 'docx'))
+    assert cache.plan(b'template', ROWS, MAPPINGS, 'id', FORMATS, SOURCE)['summary']['unchanged'] == 2
+    cache.sweep(time.time() + 1)
+    assert os.listdir(cache.folder) == []
+    assert cache.plan(b'template', ROWS, MAPPINGS, 'id', FORMATS, SOURCE)['summary']['added'] == 2
+
+
+def test_eviction_leaves_documents_being_written(cache, tmp_path):
+    cache.max_disk = 1
+    writing = os.path.join(cache.folder, 'abc.docx.0123.tmp')
+    with open(writing, 'wb') as f:
+        f.write(b'x' * 100)
+    plan = _run(cache)
+    cache.store(plan['hashes'][0], b'document', None)
+    cache.save_manifest(plan, ROWS)
+    assert os.listdir(cache.folder) == ['abc.docx.0123.tmp']
@@ -0,0 +1,194 @@
+import io
+import os
+import subprocess
+import zipfile
+
+import docx
+import pandas as pd
+import pytest
+
+
+class FakeConverter:
+    """Stand-in for SofficeConverter that writes a small PDF per document"""
+
+    def __init__(self, log):
+        self.log = log
+        self.healthy_result = True
+
+    def start(self):
+        self.log.append('start')
+
+    def stop(self):
+        self.log.append('stop')
+
+    def healthy(self):
+        return self.healthy_result
+
+    def convert(self, docx_paths, output_dir):
+        self.log.append(('convert', len(docx_paths)))
+        for path in docx_paths:
+            name = os.path.splitext(os.path.basename(path))[0] + '.pdf'
+            with open(os.path.join(output_dir, name), 'wb') as f:
+                f.write(b'%PDF-' + str(os.path.getsize(path)).encode())
+
+
+@pytest.fixture
+def log():
+    return []
+
+
+@pytest.fixture
+def pool(app, log, monkeypatch):
+    converters = []
+
+    def factory():
+        converters.append(FakeConverter(log))
+        return converters[-1]
+
+    pool = app.ConverterPool(1, 4, factory)
+    pool.converters = converters
+    monkeypatch.setattr(app, '_converter_pool', pool)
+    return pool
+
+
+@pytest.fixture
+def merge(client):
+    workbook = io.BytesIO()
+    pd.DataFrame({'id': range(1, 8), 'name': [f'name {i}' for i in range(1, 8)]}).to_excel(workbook, index=False)
+    workbook.seek(0)
+    template = io.BytesIO()
+    document = docx.Document()
+    document.add_paragraph('Dear {name}')
+    document.save(template)
+    template.seek(0)
+    upload = client.post('/upload-xls-docx', data={'excel': (workbook, 'data.xlsx'), 'word': (template, 't.docx')},
+                         content_type='multipart/form-data').get_json()
+    return {'excel_file': upload['excel_file'], 'word_file': upload['word_file'],
+            'mappings': {'{name}': 'name'}, 'key_column': 'id'}
+
+
+def _generate(client, body):
+    response = client.post('/generate', json=body)
+    data = response.data
+    response.close()
+    return response, data
+
+
+def test_pdf_per_record(app, client, pool, merge, log, monkeypatch):
+    monkeypatch.setitem(app.app.config, 'MERGE_CACHE_DISK', 0)
+    response, data = _generate(client, {**merge, 'export_formats': {'pdf': True}})
+
+    assert response.status_code == 200
+    names = zipfile.ZipFile(io.BytesIO(data)).namelist()
+    assert sorted(names) == sorted(f'{i}.pdf' for i in range(1, 8))
+    assert sum(entry[1] for entry in log if entry[0] == 'convert') == 7
+
+
+def test_docx_and_pdf(app, client, pool, merge, monkeypatch):
+    monkeypatch.setitem(app.app.config, 'MERGE_CACHE_DISK', 0)
+    response, data = _generate(client, {**merge, 'export_formats': {'docx': True, 'pdf': True}})
+
+    archive = zipfile.ZipFile(io.BytesIO(data))
+    assert sorted(archive.namelist()) == sorted([*(f'{i}.docx' for i in range(1, 8)),
+                                                 *(f'{i}.pdf' for i in range(1, 8))])
+    assert archive.read('1.pdf').startswith(b'%PDF-')
+
+
+def test_combined_pdf(client, pool, merge, log):
+    response, data = _generate(client, {**merge, 'export_formats': {'pdf': True}, 'combine': True})
+
+    assert response.status_code == 200
+    assert response.headers['Content-Disposition'] == 'attachment; filename=merged_documents.pdf'
+    assert data.startswith(b'%PDF-')
+    assert [entry for entry in log if entry[0] == 'convert'] == [('convert', 1)]
+
+
+def _batch(tmp_path, name, count=2):
+    folder = tmp_path / name
+    folder.mkdir()
+    paths = []
+    for i in range(count):
+        path = folder / f'{i}.docx'
+        path.write_bytes(b'docx')
+        paths.append(str(path))
+    return paths, str(folder)
+
+
+def test_converter_starts_once_and_is_reused(pool, log, tmp_path):
+    for name in ('a', 'b'):
+        paths = pool.submit(*_batch(tmp_path, name)).result(timeout=10)
+        assert all(os.path.exists(path) for path in paths)
+
+    assert log == ['start', ('convert', 2), ('convert', 2)]
+
+
+def test_timeout_fails_the_batch_and_restarts_the_converter(pool, log, tmp_path, monkeypatch):
+    pool.submit(*_batch(tmp_path, 'a')).result(timeout=10)
+
+    def hang(docx_paths, output_dir):
+        raise TimeoutError('Η μετατροπή σε PDF δεν ολοκληρώθηκε εγκαίρως')
+    monkeypatch.setattr(pool.converters[0], 'convert', hang)
+    with pytest.raises(TimeoutError):
+        pool.submit(*_batch(tmp_path, 'b')).result(timeout=10)
+    monkeypatch.undo()
+
+    pool.submit(*_batch(tmp_path, 'c')).result(timeout=10)
+    assert log == ['start', ('convert', 2), 'stop', 'start', ('convert', 2)]
+
+
+def test_unhealthy_converter_is_restarted(pool, log, tmp_path):
+    pool.submit(*_batch(tmp_path, 'a')).result(timeout=10)
+    pool.converters[0].healthy_result = False
+
+    pool.submit(*_batch(tmp_path, 'b')).result(timeout=10)
+
+    assert log == ['start', ('convert', 2), 'stop', 'start', ('convert', 2)]
+
+
+def test_missing_pdf_fails_the_batch(pool, tmp_path, monkeypatch):
+    pool.submit(*_batch(tmp_path, 'a')).result(timeout=10)
+    monkeypatch.setattr(pool.converters[0], 'convert', lambda docx_paths, output_dir: None)
+
+    with pytest.raises(RuntimeError, match='2 από 2'):
+        pool.submit(*_batch(tmp_path, 'b')).result(timeout=10)
+
+
+def test_command_line_conversion_timeout_raises(app, tmp_path, monkeypatch):
+    converter = app.SofficeConverter('soffice', 1)
+    converter.use_uno = False
+
+    def run(command, **kwargs):
+        raise subprocess.TimeoutExpired(command, kwargs['timeout'])
+    monkeypatch.setattr(app.subprocess, 'run', run)
+
+    with pytest.raises(TimeoutError):
+        converter.convert(*_batch(tmp_path, 'a'))
+
+
+@pytest.mark.parametrize('level', ['x', 10, -1, 4.5, True])
+def test_generate_rejects_bad_compresslevel(client, merge, level):
+    response = client.post('/generate', json={**merge, 'export_formats': {'docx': True}, 'compresslevel': level})
+    assert response.status_code == 400
+    assert 'συμπίεσης' in response.get_json()['error']
+
+
+def test_generate_without_libreoffice_fails_before_streaming(app, client, merge, monkeypatch):
+    monkeypatch.setattr(app.platform, 'system', lambda: 'Linux')
+    monkeypatch.setattr(app, '_converter_pool', None)
+    monkeypatch.setattr(app.shutil, 'which', lambda name: None)
+    for body in ({}, {'async': True}):
+        response = client.post('/generate', json={**merge, **body, 'export_formats': {'pdf': True}})
+        assert response.status_code == 503
+        assert 'LibreOffice' in response.get_json()['error']
+
+
+def test_chunks_render_in_forkserver_processes(app):
+    document = docx.Document()
+    document.add_paragraph('Dear {name}')
+    template = io.BytesIO()
+    document.save(template)
+    chunks = [[(str(i), {'{name}': f'name {i}'})] for i in range(3)]
+    outputs = list(app._render_chunks(template.getvalue(), chunks, {'docx': True}, 2))
+    assert [[name for name, _, _ in chunk] for chunk in outputs] == [['0'], ['1'], ['2']]
+    assert 'name 2' in docx.Document(io.BytesIO(outputs[2][0][1])).paragraphs[0].text
+    assert app._merge_process_context().get_start_method() == 'forkserver'
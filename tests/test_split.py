@@ -0,0 +1,32 @@
+import io
+
+import pandas as pd
+import pytest
+
+
+@pytest.fixture
+def upload(client):
+    buffer = io.BytesIO()
+    pd.DataFrame({'city': ['a', 'b', 'a'], 'n': [1, 2, 3]}).to_excel(buffer, index=False)
+    buffer.seek(0)
+    return client.post('/upload', data={'file': (buffer, 'data.xlsx')},
+                       content_type='multipart/form-data').get_json()['filename']
+
+
+@pytest.mark.parametrize('level', ['12', '-5', 'x'])
+@pytest.mark.parametrize('asynchronous', [False, True])
+def test_split_rejects_bad_compresslevel(client, upload, level, asynchronous):
+    form = {'filename': upload, 'column': 'city', 'compresslevel': level}
+    if asynchronous:
+        form['async'] = '1'
+    response = client.post('/split', data=form)
+
+    assert response.status_code == (400 if asynchronous else 200)
+    error = response.get_json()['error'] if asynchronous else response.get_data(as_text=True)
+    assert 'Μη έγκυρο επίπεδο συμπίεσης' in error
+
+
+def test_split_accepts_a_compresslevel(client, upload):
+    response = client.post('/split', data={'filename': upload, 'column': 'city', 'compresslevel': '0'})
+
+    assert 'διαχωρίστηκε σε 2' in response.get_data(as_text=True)
@@ -0,0 +1,71 @@
+import io
+
+import pandas as pd
+import pytest
+
+
+@pytest.fixture
+def frame():
+    # The blank key makes pandas read the id column as float64
+    return pd.DataFrame({'id': [1, None, 3], 'name': ["O'Neil", 'b', None], 'qty': [2.0, 1.5, None]})
+
+
+def test_integral_floats_render_as_integers(app, frame):
+    assert app.sql_literals(frame['id']).tolist() == ['1', 'NULL', '3']
+    assert app.sql_literals(frame['qty']).tolist() == ['2', '1.5', 'NULL']
+    assert app.sql_literals(frame['name']).tolist() == ["'O''Neil'", "'b'", 'NULL']
+
+
+def test_upsert_skips_rows_without_key(app, frame):
+    statements = list(app.iter_batched_statements(frame, 't', 'id', 'id', {'name': 'name'}, 'upsert', 10))
+
+    assert statements == ["INSERT INTO t (id, name) VALUES\n(1, 'O''Neil'),\n(3, NULL)\n"
+                          "ON DUPLICATE KEY UPDATE name = VALUES(name);"]
+
+
+def test_case_update_skips_rows_without_key(app, frame):
+    (statement,) = app.iter_batched_statements(frame, 't', 'id', 'id', {'name': 'name'}, 'case', 10)
+
+    assert 'NULL THEN' not in statement
+    assert statement.endswith('WHERE id IN (1, 3);')
+
+
+def test_update_statements_skip_rows_without_key(app, frame):
+    statements = app.build_update_statements(frame, 't', 'id', 'id', {'qty': 'qty'})
+
+    assert statements.to_dict() == {0: 'UPDATE t SET qty=2 WHERE id=1;', 2: 'UPDATE t SET qty=NULL WHERE id=3;'}
+
+
+def test_sql_script_reports_skipped_rows(app, client, frame):
+    buffer = io.BytesIO()
+    frame.to_excel(buffer, index=False)
+    buffer.seek(0)
+    filename = client.post('/upload', data={'file': (buffer, 'a.xlsx')},
+                           content_type='multipart/form-data').get_json()['filename']
+
+    response = client.post('/generate-sql', data={
+        'filename': filename, 'table_name': 't', 'key_column': 'id', 'key_column_name': 'id',
+        'name': 'name', 'output': 'sql'})
+
+    lines = response.get_data(as_text=True).splitlines()
+    assert lines[0] == '-- Παραλείφθηκαν 1 γραμμές χωρίς τιμή στη στήλη κλειδιού'
+    assert lines[1:] == ["UPDATE t SET name='O''Neil' WHERE id=1;", 'UPDATE t SET name=NULL WHERE id=3;']
+
+
+@pytest.mark.parametrize('dialect', ['postgres', 'sqlite'])
+def test_upsert_uses_on_conflict_outside_mysql(app, frame, dialect):
+    (statement,) = app.iter_batched_statements(frame, 't', 'id', 'id', {'name': 'name', 'qty': 'qty'},
+                                               'upsert', 10, dialect)
+
+    assert statement.endswith('ON CONFLICT (id) DO UPDATE SET name = EXCLUDED.name, qty = EXCLUDED.qty;')
+
+
+@pytest.mark.parametrize('fields, error', [({'mode': 'cse'}, 'Άγνωστος τύπος εντολών'),
+                                           ({'dialect': 'oracle'}, 'Άγνωστη βάση δεδομένων'),
+                                           ({'mode': 'upsert', 'dialect': 'ansi'}, 'upsert')])
+def test_generate_sql_rejects_unknown_mode_and_dialect(client, fields, error):
+    response = client.post('/generate-sql', data={
+        'filename': 'unused.xlsx', 'table_name': 't', 'key_column': 'id', 'key_column_name': 'id', **fields})
+
+    assert response.status_code == 200
+    assert error in response.get_data(as_text=True)
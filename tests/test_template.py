@@ -0,0 +1,37 @@
+import io
+import zipfile
+import xml.etree.ElementTree as ET
+
+import docx
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls, qn
+
+
+def _template():
+    doc = docx.Document()
+    paragraph = doc.add_paragraph('Όνομα: {name}')
+    # The same placeholder in a hyperlink tooltip and a field code
+    paragraph._p.append(parse_xml(
+        f'<w:hyperlink {nsdecls("w")} w:anchor="top" w:tooltip="{{name}}">'
+        '<w:r><w:t>σύνδεσμος</w:t></w:r></w:hyperlink>'))
+    paragraph._p.append(parse_xml(
+        f'<w:r {nsdecls("w")}><w:instrText xml:space="preserve"> REF {{name}} </w:instrText></w:r>'))
+    out = io.BytesIO()
+    doc.save(out)
+    return out.getvalue()
+
+
+def test_only_text_runs_get_line_break_markup(app):
+    value = 'Α "β" \'γ\' <δ>\nε\tζ'
+    for rendered in (app.CompiledTemplate(_template()).render({'{name}': value}),
+                     app.CompiledTemplate(_template()).render_combined([{'{name}': value}])):
+        with zipfile.ZipFile(io.BytesIO(rendered)) as zipf:
+            root = ET.fromstring(zipf.read('word/document.xml'))
+
+        # Parsers normalise whitespace in attribute values
+        assert root.find(f'.//{qn("w:hyperlink")}').get(qn('w:tooltip')) == 'Α "β" \'γ\' <δ> ε ζ'
+        assert root.find(f'.//{qn("w:instrText")}').text == f' REF {value} '
+        paragraph = root.find(f'.//{qn("w:p")}')
+        assert ''.join(t.text for t in paragraph.iter(qn('w:t'))) == 'Όνομα: Α "β" \'γ\' <δ>εζσύνδεσμος'
+        assert len(list(paragraph.iter(qn('w:br')))) == 1
+        assert len(list(paragraph.iter(qn('w:tab')))) == 1
@@ -0,0 +1,28 @@
+import hashlib
+
+import pytest
+
+CONTENT = b'id,name\n1,a\n2,b\n'
+
+
+def _send(client, sha256=None):
+    session = client.post('/uploads', json={'filename': 'data.csv', 'size': len(CONTENT)}).get_json()
+    response = client.put(session['upload_url'], data=CONTENT, headers={
+        'Content-Type': 'application/octet-stream',
+        'Content-Range': f'bytes 0-{len(CONTENT) - 1}/{len(CONTENT)}'})
+    assert response.status_code == 200
+    return client.post(session['complete_url'], json={} if sha256 is None else {'sha256': sha256})
+
+
+def test_complete_checks_the_whole_file_checksum(client):
+    digest = hashlib.sha256(CONTENT).hexdigest()
+    response = _send(client, digest.upper())
+    assert response.status_code == 200
+    assert response.get_json()['filename'] == f'{digest}.csv'
+    assert _send(client).status_code == 200
+
+
+@pytest.mark.parametrize('sha256, status', [('0' * 64, 409), ('not a checksum', 400)])
+def test_complete_rejects_a_wrong_checksum(client, sha256, status):
+    response = _send(client, sha256)
+    assert response.status_code == status
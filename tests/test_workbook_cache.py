@@ -0,0 +1,20 @@
+import os
+import time
+
+import pandas as pd
+
+
+def test_disk_eviction_keeps_temp_files_and_notes(app, tmp_path):
+    cache = app.WorkbookCache(str(tmp_path), 4, 10 ** 9, 1)
+    writing = tmp_path / 'b.pkl.0123.tmp'
+    writing.write_bytes(b'x' * 1000)
+    abandoned = tmp_path / 'c.pkl.4567.tmp'
+    abandoned.write_bytes(b'x')
+    old = time.time() - 2 * cache.STALE_TEMP_SECONDS
+    os.utime(abandoned, (old, old))
+    cache.put_json('a', 'types', {'id': 'int64'})
+
+    cache.put('a', pd.DataFrame({'id': range(100)}))
+
+    assert sorted(os.listdir(tmp_path)) == ['a.types.json', 'b.pkl.0123.tmp']
+    assert cache.get_json('a', 'types') == {'id': 'int64'}
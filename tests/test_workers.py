@@ -0,0 +1,28 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_import_and_warm_up_start_no_threads(tmp_path):
+    # What the gunicorn master runs before it forks the workers
+    code = ('import threading, app; app.warm_up(); '
+            'print(threading.active_count(), list(app.job_executor._objects), list(app._heavy_slots._objects))')
+    output = subprocess.run([sys.executable, '-c', code], cwd=tmp_path, env={**os.environ, 'PYTHONPATH': ROOT},
+                            capture_output=True, text=True, check=True).stdout
+    assert output.split() == ['1', '[]', '[]']
+
+
+def test_forked_workers_make_their_own_slots_and_locks(app):
+    slots = app._heavy_slots.get()
+    lock = app.workbook_cache._lock.get()
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        fresh = app._heavy_slots.get() is not slots and app.workbook_cache._lock.get() is not lock
+        os.write(write, b'1' if fresh else b'0')
+        os._exit(0)
+    os.waitpid(pid, 0)
+    assert os.read(read, 1) == b'1'
+    assert app._heavy_slots.get() is slots